@@ -1,6 +1,6 @@
 from django.contrib import admin
 from linguatec_lexicon.models import (Entry, Example, VerbalConjugation)
-from . import models
+from . import cache, models
 
 
 def custom_titled_filter(title):
@@ -24,6 +24,22 @@ class GramaticalCategoryAdmin(admin.ModelAdmin):
     list_display = ('abbreviation', 'title',)
 
 
+class DeleteInvalidatesCacheMixin:
+    """
+    Invalidate cached responses when objects are deleted (entries and
+    examples don't have delete receivers, see models.bump_data_version).
+
+    """
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cache.bump_data_version_on_commit()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        cache.bump_data_version_on_commit()
+
+
 class EntryInline(admin.TabularInline):
     model = Entry
     extra = 0
@@ -53,7 +69,7 @@ class VerbalConjugationInline(admin.StackedInline):
 
 
 @admin.register(models.Entry)
-class EntryAdmin(admin.ModelAdmin):
+class EntryAdmin(DeleteInvalidatesCacheMixin, admin.ModelAdmin):
     list_display = ('word', 'translation', 'variation')
     search_fields = ('word__term',)
     list_filter = ('word__lexicon',
@@ -70,7 +86,7 @@ class EntryAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.Example)
-class ExampleAdmin(admin.ModelAdmin):
+class ExampleAdmin(DeleteInvalidatesCacheMixin, admin.ModelAdmin):
     list_display = ('phrase', 'entry',)
     search_fields = ('entry__word__term',)
     list_filter = (('entry__word__lexicon', custom_titled_filter('Lexicon name')),
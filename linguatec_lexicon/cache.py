@@ -0,0 +1,117 @@
+"""
+Cache of the serialized responses of the search endpoints.
+
+It uses Django's cache framework (any backend: locmem, file based,
+memcached...) and it can be configured with these settings:
+
+    LINGUATEC_LEXICON_CACHE: alias of the cache (default: 'default').
+    LINGUATEC_LEXICON_CACHE_TIMEOUT: seconds to keep a response (default: 3600).
+
+Cached responses are never invalidated one by one: the key of every
+response includes a global data version which is bumped when the lexicon
+data changes (imports and saves, once per transaction), so the stale
+responses are not read anymore and they expire by timeout.
+
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'linguatec_lexicon'
+DATA_VERSION_KEY = KEY_PREFIX + ':data_version'
+HITS_KEY = KEY_PREFIX + ':hits'
+MISSES_KEY = KEY_PREFIX + ':misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'LINGUATEC_LEXICON_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'LINGUATEC_LEXICON_CACHE_TIMEOUT', 3600)
+
+
+def _increment(key):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the key is missing (first use or evicted)
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def get_data_version():
+    version = get_cache().get(DATA_VERSION_KEY)
+    if version is None:
+        # start from a timestamp instead of zero so a version evicted
+        # from the cache is not reused by the responses already cached
+        get_cache().add(DATA_VERSION_KEY, int(time.time()), timeout=None)
+        version = get_cache().get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every cached response."""
+    get_data_version()
+    return _increment(DATA_VERSION_KEY)
+
+
+def bump_data_version_on_commit(using=None):
+    """
+    Invalidate every cached response once the current transaction is
+    committed (right now in autocommit mode), so changes of several rows
+    on the same transaction only bump the version once.
+
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        bump_data_version()
+    elif not any(func is bump_data_version for _, func in connection.run_on_commit):
+        # pending callbacks are discarded on rollback, so it's scheduled again
+        transaction.on_commit(bump_data_version, using)
+
+
+def normalize_query(query):
+    """Searches are case insensitive so equivalent queries share the cache."""
+    if query is None:
+        return query
+    return query.strip().lower()
+
+
+def make_key(endpoint, query, lex, limit, offset, *options):
+    """
+    Return the key of a response (options are other params which change
+    it, e.g. the base URL of the hyperlinks of the serialized data).
+
+    """
+    params = json.dumps([endpoint, normalize_query(query), lex, limit, offset, options, get_data_version()],
+                        sort_keys=True)
+    return '{}:response:{}'.format(KEY_PREFIX, hashlib.md5(params.encode('utf-8')).hexdigest())
+
+
+def get_response(key):
+    data = get_cache().get(key)
+    _increment(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def set_response(key, data):
+    get_cache().set(key, data, get_timeout())
+
+
+def get_stats():
+    cache = get_cache()
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+        'data_version': get_data_version(),
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
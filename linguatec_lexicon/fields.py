@@ -0,0 +1,29 @@
+import json
+
+from django.db import models
+
+
+class JSONTextField(models.TextField):
+    """
+    Store a JSON serializable value as text, so it works with every
+    database backend (django.contrib.postgres JSONField requires PostgreSQL).
+
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return json.loads(value)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return json.dumps(value)
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.value_from_object(obj))
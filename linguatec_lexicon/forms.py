@@ -1,7 +1,10 @@
 from django import forms
 from django.core import validators
 
+from .models import Lexicon
+
 
 class ValidatorForm(forms.Form):
+    lexicon = forms.ModelChoiceField(queryset=Lexicon.objects.all())
     input_file = forms.FileField(
         validators=[validators.FileExtensionValidator(allowed_extensions=["xlsx"])])
@@ -0,0 +1,1026 @@
+"""
+Importers of lexicon data from Excel files used by the management
+commands (importdata, importvariation), the data validator jobs and
+the tests.
+
+An importer validates the rows of the input file keeping the valid data
+in memory, so it can be written into the database afterwards:
+
+    importer = DataImporter(lexicon)
+    errors = list(importer.validate(importer.read_rows('vocabulary.xlsx')))
+    if not errors:
+        importer.write()
+
+"""
+import hashlib
+import itertools
+import json
+import operator
+import re
+
+import openpyxl
+import pandas as pd
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from linguatec_lexicon import cache
+from linguatec_lexicon.models import (
+    Entry, Example, GramaticalCategory, VerbalConjugation, Word)
+from linguatec_lexicon.utils import can_fork, map_shards, normalize_term, shard
+
+# files which can be read row by row (see DataImporter.read_rows)
+STREAM_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# columns A to F
+INPUT_COLUMNS = 6
+
+# minimal similarity of the suggested words (same as Word.objects.search)
+SUGGESTION_MIN_SIMILARITY = 0.3
+SUGGESTION_LIMIT = 4
+
+# words of a string for pg_trgm (alphanumeric characters)
+TRIGRAM_WORD_RE = re.compile(r'[^\W_]+')
+
+# similar words of several terms at once (PostgreSQL), see VariationImporter.suggest_words
+SUGGESTIONS_SQL = """
+SELECT q.query, w.term FROM unnest(%s::text[], %s::text[]) AS q(query, regex)
+CROSS JOIN LATERAL (
+    SELECT term, similarity(term_normalized, q.query) AS similarity
+    FROM {table}
+    WHERE lexicon_id = %s AND term_normalized ~ ('\\y' || q.regex || '\\y')
+        AND similarity(term_normalized, q.query) > %s
+    ORDER BY similarity DESC, term
+    LIMIT %s
+) AS w
+ORDER BY q.query, w.similarity DESC, w.term
+"""
+
+
+class ImporterError(Exception):
+    """The data cannot be imported (e.g. gramatical categories are missing)."""
+
+
+class RowError:
+    """
+    Error found validating a row of the input file.
+
+    `row` is the position of the row on the input file (used to sort
+    errors) and `suggestions` are the similar words of a word which has
+    not been found (only for `code` 'not_found').
+
+    """
+
+    def __init__(self, word, column, message, row=None, code=None, suggestions=None):
+        self.word = word
+        self.column = column
+        self.message = message
+        self.row = row
+        self.code = code
+        self.suggestions = suggestions
+
+    def __repr__(self):
+        return '<RowError {} {}: {}>'.format(self.column, self.word, self.message)
+
+    def as_dict(self):
+        data = {
+            "word": self.word,
+            "column": self.column,
+            "message": self.message,
+        }
+        if self.code == 'not_found':
+            data["suggestions"] = self.suggestions
+        return data
+
+
+def load_gramcats():
+    """Load a fresh copy of the GramaticalCategories registry and check that they are initialized."""
+    GramaticalCategory.objects.clear_cache()
+    if not GramaticalCategory.objects.get_registry():
+        raise ImporterError(
+            "There isn't any GramaticalCategory in the database. "
+            "Gramatical Categories should be initialized before importing "
+            "data for example running manage.py importgramcat."
+        )
+
+
+def batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def summarize_diff(diff):
+    """Return the number of words of each kind of change of DataImporter.diff_incremental."""
+    return {key: value if isinstance(value, int) else len(value) for key, value in diff.items()}
+
+
+def normalize_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+
+def clean_word_contents(word):
+    """Contents of the entries of a validated word (see word_digest)."""
+    contents = []
+    for entry in word.clean_entries:
+        conjugation = getattr(entry, 'clean_conjugation', None)
+        contents.append((
+            entry.translation,
+            [gramcat.abbreviation for gramcat in entry.clean_gramcats],
+            [example.phrase for example in entry.clean_examples],
+            conjugation.raw if conjugation is not None else None,
+        ))
+    return contents
+
+
+def word_digest(contents):
+    """
+    Hash of the entries of a word as a list of (translation, gramcats,
+    examples, raw conjugation).
+
+    """
+    contents = [
+        (translation, sorted(set(gramcats)), examples, conjugation)
+        for translation, gramcats, examples, conjugation in contents
+    ]
+    return hashlib.sha1(json.dumps(contents).encode('utf-8')).hexdigest()
+
+
+def is_empty_row(row):
+    # TODO how to ignore empty rows in an elegant way?
+    return pd.isnull(row) or pd.isna(row[1]) or pd.isnull(row[1]) or row[1] == ''
+
+
+def is_verb(gramcats):
+    for gramcat in gramcats:
+        if (gramcat.abbreviation.startswith('v.')
+                or gramcat.abbreviation in ['expr.', 'per. vl.', 'loc. vl.']):
+            return True
+    return False
+
+
+def trigrams(value):
+    """
+    Extract the trigrams of a string as PostgreSQL pg_trgm does: words
+    are sequences of alphanumeric characters (without '_').
+
+    """
+    result = set()
+    for word in TRIGRAM_WORD_RE.findall(value.lower()):
+        padded = '  ' + word + ' '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def trigram_similarity(a, b):
+    trigrams_a = trigrams(a)
+    trigrams_b = trigrams(b)
+    if not trigrams_a or not trigrams_b:
+        return 0
+    return len(trigrams_a & trigrams_b) / len(trigrams_a | trigrams_b)
+
+
+class BaseImporter:
+    # progress_callback is called with the number of rows processed every:
+    progress_interval = 500
+
+    def __init__(self, lexicon, jobs=1, progress_callback=None):
+        if jobs < 1:
+            raise ImporterError('Number of jobs should be a positive integer.')
+
+        load_gramcats()
+        self.lexicon = lexicon
+        # workers are forked, rows are validated serially where it isn't available
+        self.jobs = jobs if can_fork() else 1
+        self.progress_callback = progress_callback
+        self.reset()
+
+    def report_progress(self, count_rows, done=False):
+        if self.progress_callback is not None and (done or count_rows % self.progress_interval == 0):
+            self.progress_callback(count_rows)
+
+    def add_error(self, word, column, message, **kwargs):
+        error = RowError(word, column, message, row=self.current_row, **kwargs)
+        self.errors.append(error)
+        return error
+
+    def reset(self):
+        self.errors = []
+        self.count_rows = 0
+        self.current_row = None
+
+    def validate(self, rows):
+        """
+        Validate the rows and yield the errors found (in the same order
+        as the rows), valid data is kept to be written afterwards.
+
+        Rows are tuples whose first element is the position of the row
+        on the input file (see read_rows).
+
+        """
+        self.reset()
+        if self.jobs > 1:
+            yield from self.validate_parallel(rows)
+        else:
+            yield from self.validate_rows(rows)
+
+    def validate_rows(self, rows):
+        for row in rows:
+            count_errors = len(self.errors)
+            self.current_row = row[0]
+            self.validate_row(row)
+            yield from self.errors[count_errors:]
+        self.report_progress(self.count_rows, done=True)
+
+    def validate_parallel(self, rows):
+        """
+        Validate the rows on a pool of processes. Rows are sharded by
+        word term and results are merged in the same order as the serial
+        path.
+
+        NOTE: every row is loaded in memory to shard them (unlike the
+        serial path which reads them one by one).
+
+        """
+        rows = self.prepare_parallel_rows(rows)
+        count_rows = len(rows)
+        shards = shard(rows, key=self.get_row_term, count=self.jobs)
+        del rows
+
+        errors = []
+        results = []
+        for shard_errors, shard_result in map_shards(self.validate_shard, shards, self.jobs):
+            errors.extend(shard_errors)
+            results.append(shard_result)
+        self.merge_results(results)
+
+        # sort is stable so errors of the same row keep their order
+        errors.sort(key=lambda error: error.row)
+        self.errors = errors
+        self.count_rows = count_rows
+        self.report_progress(count_rows, done=True)
+        return errors
+
+    def validate_shard(self, rows):
+        """Validate some rows (run by a worker process)."""
+        # progress is reported by the parent process and a worker can
+        # validate several shards, so results of previous ones are cleared
+        self.progress_callback = None
+        self.reset()
+        errors = list(self.validate_rows(rows))
+        return errors, self.get_shard_result()
+
+
+class DataImporter(BaseImporter):
+    """
+    Importer of the words of a lexicon: each row contains the word
+    (column A), gramatical categories (B), translations (C), examples (E)
+    and verbal conjugations (F). Several values of a column are separated
+    by '//' and rows of the same word are merged.
+
+    """
+
+    def __init__(self, lexicon, allow_partial=False, batch_size=500, jobs=1, progress_callback=None):
+        super().__init__(lexicon, jobs=jobs, progress_callback=progress_callback)
+        if batch_size < 1:
+            raise ImporterError('Batch size should be a positive integer.')
+
+        self.allow_partial = allow_partial
+        self.batch_size = batch_size
+        self.warnings = []
+
+    def read_rows(self, input_file, stream=True):
+        """
+        Return an iterable of the rows of every sheet of the input file
+        as tuples: a row index followed by the value of columns A to F.
+
+        XLSX files are read row by row (unless `stream` is False), other
+        formats are loaded in memory by pandas.
+
+        """
+        if stream and input_file.lower().endswith(STREAM_EXTENSIONS):
+            return self.iter_xlsx_rows(input_file)
+        return self.read_data_frame(input_file).itertuples(name=None)
+
+    def read_data_frame(self, input_file):
+        df = pd.DataFrame()
+
+        xlsx = pd.ExcelFile(input_file)
+
+        for sheet in xlsx.sheet_names:
+            # we define na_values and keep_default_na because defaults na_values
+            # includes empty string. We don't want that pandas replaces empty
+            # cells with 'nan'
+            partial = xlsx.parse(sheet, header=None, usecols='A:F')
+            # names=['colA', 'colB', 'colC', 'colD', 'colE', 'colF'])
+            df = df.append(partial, ignore_index=True, sort=False)
+
+        df_obj = df.select_dtypes(['object'])
+        df[df_obj.columns] = df_obj.apply(lambda x: x.str.strip())
+        df = df.fillna('')  # replace NaN with blank string
+
+        return df
+
+    def iter_xlsx_rows(self, input_file):
+        """
+        Yield the rows with the same format of `read_data_frame().itertuples()`
+        (stripped strings, empty cells as blank strings). Empty rows are
+        skipped.
+
+        The workbook is read in read-only mode, so only the current row
+        is kept in memory.
+
+        """
+        workbook = openpyxl.load_workbook(input_file, read_only=True, data_only=True)
+        try:
+            index = 0
+            for sheet in workbook.worksheets:
+                # the dimensions stored on the file can be wrong (e.g. the whole
+                # sheet), so read only the rows that actually exist
+                sheet.reset_dimensions()
+                for values in sheet.iter_rows(max_col=INPUT_COLUMNS, values_only=True):
+                    index += 1
+                    # sheets can have (a lot of) formatted but empty rows
+                    if not any(value is not None for value in values):
+                        continue
+                    values = [normalize_cell(value) for value in values]
+                    values += [''] * (INPUT_COLUMNS - len(values))
+                    yield (index - 1, *values)
+        finally:
+            workbook.close()
+
+    def reset(self):
+        super().reset()
+        self.cleaned_data = {}
+
+    def validate_row(self, row):
+        # filter empty rows
+        if is_empty_row(row):
+            return
+
+        self.populate_row(row)
+
+        self.count_rows += 1
+        self.report_progress(self.count_rows)
+
+    def get_row_term(self, row):
+        return row[1]
+
+    def prepare_parallel_rows(self, rows):
+        rows = [row for row in rows if not is_empty_row(row)]
+        self.terms = dict.fromkeys(row[1] for row in rows)  # sorted by first occurrence
+        return rows
+
+    def get_shard_result(self):
+        # model instances are expensive to pickle, so only their values are
+        # returned: (term, [(translation, gramcats, examples, conjugation)])
+        result = []
+        for term, word in self.cleaned_data.items():
+            entries = []
+            for entry in word.clean_entries:
+                conjugation = getattr(entry, 'clean_conjugation', None)
+                entries.append((
+                    entry.translation,
+                    [gramcat.abbreviation for gramcat in entry.clean_gramcats],
+                    [example.phrase for example in entry.clean_examples],
+                    (conjugation.raw, conjugation.parsed) if conjugation is not None else None,
+                ))
+            result.append((term, entries))
+        return result
+
+    def merge_results(self, results):
+        words = {}
+        for shard_words in results:
+            for term, entries in shard_words:
+                words[term] = self.build_word(term, entries)
+        self.cleaned_data = {term: words[term] for term in self.terms}
+
+    def build_word(self, term, entries):
+        """Build a validated word from the values returned by a worker."""
+        word = Word(term=term)
+        word.clean_entries = []
+        for translation, abbrs, phrases, conjugation in entries:
+            entry = Entry(word=word, translation=translation)
+            entry.clean_gramcats = [GramaticalCategory.objects.get_by_abbreviation(abbr) for abbr in abbrs]
+            entry.clean_examples = [Example(phrase=phrase) for phrase in phrases]
+            if conjugation is not None:
+                raw, parsed = conjugation
+                entry.clean_conjugation = VerbalConjugation(raw=raw, parsed=parsed)
+            word.clean_entries.append(entry)
+        return word
+
+    def get_or_create_word(self, term):
+        try:
+            return (False, self.cleaned_data[term])
+        except KeyError:
+            new_word = Word(term=term)
+            new_word.clean_entries = []
+            return (True, new_word)
+
+    def populate_word(self, w_str):
+        # avoid duplicated word.term
+        created, word = self.get_or_create_word(w_str)
+        if created:
+            self.cleaned_data[word.term] = word
+
+        return word
+
+    def populate_gramcats(self, word, g_str):
+        gramcats = []
+        if not g_str:
+            self.add_error(word.term, "B", "missing gramatical category")
+        else:
+            for abbr in g_str.split("//"):
+                abbr = abbr.strip()
+                try:
+                    gramcats.append(
+                        GramaticalCategory.objects.get_by_abbreviation(abbr))
+                except GramaticalCategory.DoesNotExist:
+                    self.add_error(word.term, "B", "unkown gramatical category '{}'".format(abbr))
+        word.is_verb = is_verb(gramcats)
+        return gramcats
+
+    def populate_entries(self, word, gramcats, entries_str):
+        for translation in entries_str.split('//'):
+            entry = Entry(word=word, translation=translation.strip())
+            entry.clean_gramcats = gramcats
+            entry.clean_examples = []
+            word.clean_entries.append(entry)
+
+    def populate_examples(self, word, ex_str):
+        if pd.isnull(ex_str) or ex_str == '':
+            return
+
+        ex_strs = [x.strip() for x in ex_str.split('//')]
+        if len(word.clean_entries) < len(ex_strs):
+            self.add_error(word.term, "E", "there are more examples '{}' than entries'{}'".format(
+                len(ex_strs), len(word.clean_entries)))
+            # invalid format, don't try to extract it!
+            return
+
+        for i, value in enumerate(ex_strs):  # subelement
+            we = word.clean_entries[i]  # word entry
+            if value:
+                # TODO could be several examples separated by ';'
+                we.clean_examples.append(Example(phrase=value))
+
+    def populate_verbal_conjugation(self, word, gramcats, conjugation_str):
+        # check if word is a verb
+        if conjugation_str and not word.is_verb:
+            gramcats = [x.abbreviation for x in gramcats]
+            self.add_error(word.term, "F", "only verbs can have verbal conjugation data (found {})".format(gramcats))
+            return
+
+        raw_conjugations = [x.strip()
+                            for x in conjugation_str.split('//')]
+
+        # check number of conjugations VS number of entries
+        if len(word.clean_entries) < len(raw_conjugations):
+            self.add_error(word.term, "F", "there are more conjugations '{}' than entries'{}'".format(
+                len(word.clean_entries), len(conjugation_str)))
+            # invalid format, don't try to extract it!
+            return
+
+        for i, raw_conjugation in enumerate(raw_conjugations):
+            if raw_conjugation:
+                conjugation = VerbalConjugation(raw=raw_conjugation)
+                try:
+                    # parsed content is validated and stored at once
+                    # (bulk_create doesn't call save())
+                    conjugation.parsed = conjugation.parse(strict=True)
+                except ValidationError as e:
+                    if not self.allow_partial:
+                        self.add_error(word.term, "F", str(e.message))
+                        continue
+                    # workaround issue 66 allow partial conjugations (or unformated data)
+                    conjugation.parsed = conjugation.parse_partial()
+                word.clean_entries[i].clean_conjugation = conjugation
+
+    def populate_row(self, row):
+        # column A is word (required)
+        word = self.populate_word(row[1])
+
+        # column B is gramcat (required)
+        gramcats = self.populate_gramcats(word, row[2])
+
+        # column C is entry (required)
+        self.populate_entries(word, gramcats, row[3])
+
+        # column E is example (optional)
+        try:
+            ex_str = row[5]
+        except IndexError:
+            return
+        self.populate_examples(word, ex_str)
+
+        # column F is verb conjugation
+        try:
+            conjugation_str = row[6]
+        except IndexError:
+            return
+        self.populate_verbal_conjugation(word, gramcats, conjugation_str)
+
+    def bulk_create(self, model, objs):
+        """
+        Insert objs in batches of `batch_size` and make sure that every
+        object has its primary key set (required to link related objects).
+
+        """
+        if not objs:
+            return
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+            return
+
+        # Backends like SQLite don't return the ids of the inserted rows.
+        # This method is called inside a transaction, so the new rows are
+        # the ones with a greater pk and they are sorted by insertion order.
+        last_pk = model.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        new_pks = model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)
+        for obj, pk in zip(objs, new_pks):
+            obj.pk = pk
+
+    def resolve_model_words(self, conjugations):
+        """
+        Link the conjugations that follow a model verb to its Word
+        (conjugations referencing a missing word are added to warnings).
+
+        """
+        conjugations = [c for c in conjugations if c.model_word is not None]
+        if not conjugations:
+            return
+
+        # model word can be imported on this execution or previously
+        terms = dict(Word.objects.filter(lexicon=self.lexicon).values_list('term', 'pk'))
+        for conjugation in conjugations:
+            conjugation.model_word_ref_id = terms.get(conjugation.model_word)
+            if conjugation.model_word_ref_id is None:
+                self.warnings.append(RowError(
+                    conjugation.entry.word.term, "F", "model word '{}' not found".format(conjugation.model_word)))
+
+    def insert(self, words, existing_words=()):
+        """
+        Insert words and their related objects. Existing words are
+        already stored, so only their related objects are inserted.
+
+        Return the number of inserted (words, entries, entry gramcats,
+        examples, conjugations).
+
+        """
+        entries = []
+        examples = []
+        conjugations = []
+        entry_gramcats = []
+        EntryGramcat = Entry.gramcats.through
+
+        for word in words:
+            word.lexicon_id = self.lexicon.pk
+        self.bulk_create(Word, words)
+
+        for word in itertools.chain(words, existing_words):
+            for entry in word.clean_entries:
+                entry.word_id = word.pk
+                entries.append(entry)
+        self.bulk_create(Entry, entries)
+
+        for entry in entries:
+            for gramcat in entry.clean_gramcats:
+                entry_gramcats.append(
+                    EntryGramcat(entry_id=entry.pk, gramaticalcategory_id=gramcat.pk))
+
+            for example in entry.clean_examples:
+                example.entry_id = entry.pk
+                examples.append(example)
+
+            conjugation = getattr(entry, 'clean_conjugation', None)
+            if conjugation is not None:
+                conjugation.entry = entry
+                conjugations.append(conjugation)
+
+        self.resolve_model_words(conjugations)
+
+        EntryGramcat.objects.bulk_create(entry_gramcats, batch_size=self.batch_size)
+        Example.objects.bulk_create(examples, batch_size=self.batch_size)
+        VerbalConjugation.objects.bulk_create(conjugations, batch_size=self.batch_size)
+
+        return len(words), len(entries), len(entry_gramcats), len(examples), len(conjugations)
+
+    def write(self):
+        """
+        Insert the validated words into the database and return the number
+        of inserted (words, entries, entry gramcats, examples, conjugations).
+
+        """
+        self.warnings = []
+        words = list(self.cleaned_data.values())
+        with transaction.atomic():
+            counts = self.insert(words)
+
+        # bulk_create doesn't send post_save signals
+        cache.bump_data_version()
+        return counts
+
+    def load_stored_digests(self):
+        """
+        Return {term: (pk, digest)} of the words of the lexicon computed
+        from their common entries (entries of diatopic variations are
+        managed by VariationImporter).
+
+        """
+        words = dict(Word.objects.filter(lexicon=self.lexicon).values_list('pk', 'term'))
+        entries_filter = {'entry__word__lexicon': self.lexicon, 'entry__variation__isnull': True}
+
+        gramcats = {}
+        qs = Entry.gramcats.through.objects.filter(**entries_filter).values_list(
+            'entry_id', 'gramaticalcategory__abbreviation')
+        for entry_id, abbr in qs:
+            gramcats.setdefault(entry_id, []).append(abbr)
+
+        examples = {}
+        qs = Example.objects.filter(**entries_filter).order_by('pk').values_list('entry_id', 'phrase')
+        for entry_id, phrase in qs:
+            examples.setdefault(entry_id, []).append(phrase)
+
+        conjugations = dict(VerbalConjugation.objects.filter(**entries_filter).values_list('entry_id', 'raw'))
+
+        contents = {pk: [] for pk in words}
+        qs = Entry.objects.filter(word__lexicon=self.lexicon, variation__isnull=True).order_by('pk').values_list(
+            'pk', 'word_id', 'translation')
+        for entry_id, word_id, translation in qs:
+            contents[word_id].append((translation, gramcats.get(entry_id, []),
+                                      examples.get(entry_id, []), conjugations.get(entry_id)))
+
+        return {term: (pk, word_digest(contents[pk])) for pk, term in words.items()}
+
+    def diff_incremental(self):
+        """
+        Compare the validated words with the stored ones and return the
+        changes without writing them: words to add and to update, pks of
+        the words to delete and of the emptied ones (missing on the input
+        file but kept because they have entries of a diatopic variation,
+        so only their common entries are deleted) and the number of
+        unchanged words.
+
+        """
+        stored = self.load_stored_digests()
+        added = []
+        updated = []
+        unchanged = 0
+        for term, word in self.cleaned_data.items():
+            try:
+                pk, digest = stored.pop(term)
+            except KeyError:
+                added.append(word)
+                continue
+
+            if digest == word_digest(clean_word_contents(word)):
+                unchanged += 1
+            else:
+                word.pk = pk
+                updated.append(word)
+
+        missing = sorted(pk for pk, _ in stored.values())
+        emptied = set()
+        for pks in batches(missing, self.batch_size):
+            emptied.update(Entry.objects.filter(word_id__in=pks, variation__isnull=False).values_list(
+                'word_id', flat=True))
+
+        return {
+            'added': added,
+            'updated': updated,
+            'deleted': [pk for pk in missing if pk not in emptied],
+            'emptied': sorted(emptied),
+            'unchanged': unchanged,
+        }
+
+    def write_incremental(self):
+        """
+        Write only the differences with the stored words (see
+        diff_incremental): new words are inserted, common entries of
+        changed words are replaced and words missing on the input file
+        are deleted (the input file is the whole lexicon).
+
+        Return a summary of the changes.
+
+        """
+        self.warnings = []
+        diff = self.diff_incremental()
+        added, updated, deleted, emptied = diff['added'], diff['updated'], diff['deleted'], diff['emptied']
+
+        with transaction.atomic():
+            # queryset deletes: entries, examples, conjugations and entry
+            # gramcats have no delete receivers so related rows are deleted
+            # with a query per batch (the data version is bumped below)
+            count_deleted = 0
+            for pks in batches([word.pk for word in updated] + emptied + deleted, self.batch_size):
+                count_deleted += Entry.objects.filter(word_id__in=pks, variation__isnull=True).delete()[0]
+            for pks in batches(deleted, self.batch_size):
+                count_deleted += Word.objects.filter(pk__in=pks).delete()[0]
+
+            count_inserted = sum(self.insert(added, updated))
+
+        if added or updated or deleted or emptied:
+            # bulk_create doesn't send post_save signals
+            cache.bump_data_version()
+
+        summary = summarize_diff(diff)
+        summary.update(inserted_rows=count_inserted, deleted_rows=count_deleted)
+        return summary
+
+
+class VariationImporter(BaseImporter):
+    """
+    Importer of the entries of a diatopic variation: each row contains a
+    word already imported (column A), gramatical categories (B, entries
+    of the word are used by default) and translations (C).
+
+    """
+
+    def __init__(self, lexicon, variation=None, jobs=1, progress_callback=None):
+        super().__init__(lexicon, jobs=jobs, progress_callback=progress_callback)
+        self.variation = variation
+        self.load_words()
+
+    def validate(self, rows):
+        """
+        Validate the rows (see BaseImporter.validate), similar words of
+        the terms not found are suggested at once after reading every row.
+
+        """
+        errors = list(super().validate(rows))
+        self.suggest_words([error for error in errors if error.code == 'not_found'])
+        yield from errors
+
+    def read_rows(self, input_file):
+        """
+        Return an iterable of the rows of every sheet of the input file
+        as tuples: (position, sheet name, row number, term, gramcats, translations).
+
+        """
+        xlsx = pd.read_excel(input_file, sheet_name=None, header=None, usecols="A:C",
+                             names=['term', 'gramcats', 'translations'])
+        position = 0
+        for sheet_name, sheet in xlsx.items():
+            for index, term, gramcats, translations in sheet.itertuples(name=None):
+                yield (position, sheet_name, index + 1, term, gramcats, translations)
+                position += 1
+
+    def load_words(self):
+        """
+        Load the terms of the lexicon in memory (a single query) to
+        resolve the rows of the input file without hitting the database.
+
+        """
+        self.words = {}
+        self.normalized_words = {}
+        aliases = {}
+        qs = Word.objects.filter(lexicon=self.lexicon).values_list('pk', 'term', 'term_normalized')
+        for pk, term, term_normalized in qs:
+            self.words[term] = (pk, term)
+
+            # several terms can share normalized term (e.g. 'solo' and 'sólo')
+            # so they are only resolved by exact match
+            if term_normalized in self.normalized_words:
+                self.normalized_words[term_normalized] = None
+            else:
+                self.normalized_words[term_normalized] = (pk, term)
+
+            # handle cases where only masculine form has been included
+            # instead of both. e.g. delicado --> delicado/a
+            if term_normalized.endswith('/a'):
+                aliases[term_normalized[:-2]] = (pk, term)
+
+        for alias, word in aliases.items():
+            self.normalized_words.setdefault(alias, word)
+
+        self.default_gramcats = None
+        self.terms_by_token = None
+
+    def reset(self):
+        super().reset()
+        self.cleaned_data = []
+
+    def validate_row(self, row):
+        self.count_rows += 1
+        self.report_progress(self.count_rows)
+
+        _, sheet_name, row_number, term, gramcats_raw, translations_raw = row
+        word = self.retrieve_word(row_number, term)
+        if word is None:
+            return
+
+        try:
+            gramcats = self.retrieve_gramcats(word, gramcats_raw)
+            self.populate_entries(word, gramcats, translations_raw)
+        except ValidationError as e:
+            message = e.message % e.params if e.params else e.message
+            self.add_error(word.term, "{}!{}".format(sheet_name, e.code), message)
+            return
+
+        word.row = self.current_row
+        self.cleaned_data.append(word)
+
+    def get_row_term(self, row):
+        return row[3]
+
+    def prepare_parallel_rows(self, rows):
+        # load data used by the workers before forking them
+        self.load_default_gramcats()
+        return list(rows)
+
+    def get_shard_result(self):
+        # model instances are expensive to pickle (see DataImporter)
+        return [
+            (word.row, word.pk, word.term,
+             [(entry.translation, [gramcat.abbreviation for gramcat in entry.clean_gramcats])
+              for entry in word.clean_entries])
+            for word in self.cleaned_data
+        ]
+
+    def merge_results(self, results):
+        self.cleaned_data = [
+            self.build_word(*values)
+            for values in sorted(itertools.chain.from_iterable(results), key=operator.itemgetter(0))
+        ]
+
+    def build_word(self, row, pk, term, entries):
+        """Build a validated word from the values returned by a worker."""
+        word = Word(pk=pk, term=term, lexicon=self.lexicon)
+        word.row = row
+        word.clean_entries = []
+        for translation, abbrs in entries:
+            entry = Entry(word=word, translation=translation, variation=self.variation)
+            entry.clean_gramcats = [GramaticalCategory.objects.get_by_abbreviation(abbr) for abbr in abbrs]
+            word.clean_entries.append(entry)
+        return word
+
+    def populate_entries(self, word, gramcats, translations_raw):
+        word.clean_entries = []
+
+        try:
+            translations_list = translations_raw.split('//')
+        except AttributeError:
+            # e.g. empty cell is translated as float(nan)
+            message = 'Word %(word)s contains empty or invalid translations.'
+            raise ValidationError(message, code='C', params={'word': word.term})
+
+        for translation in translations_list:
+            entry = Entry(word=word, translation=translation.strip(),
+                          variation=self.variation)
+            entry.clean_gramcats = gramcats
+            word.clean_entries.append(entry)
+
+    def retrieve_gramcats(self, word, gramcats_raw):
+        clean_gramcats = self.parse_or_get_default_gramcats(word, gramcats_raw)
+
+        gramcats = []
+        for abbr in clean_gramcats:
+            try:
+                gramcats.append(
+                    GramaticalCategory.objects.get_by_abbreviation(abbr))
+            except GramaticalCategory.DoesNotExist:
+                message = "unkown gramatical category %(value)s"
+                raise ValidationError(message, code='B', params={'value': abbr})
+
+        return gramcats
+
+    def parse_or_get_default_gramcats(self, word, gramcats_raw):
+        if pd.isnull(gramcats_raw):
+            # provide default value
+            clean_gramcats = self.get_default_gramcats(word)
+            if len(clean_gramcats) == 0:
+                message = "missing gramatical category"
+                raise ValidationError(message, code='B')
+            return clean_gramcats
+
+        clean_gramcats = [abbr.strip() for abbr in gramcats_raw.split("//")]
+        return clean_gramcats
+
+    def load_default_gramcats(self):
+        # load them at once for the whole lexicon
+        self.default_gramcats = {}
+        qs = Entry.objects.filter(word__lexicon=self.lexicon).values_list('word_id', 'gramcats__abbreviation')
+        for word_id, abbr in qs:
+            self.default_gramcats.setdefault(word_id, set()).add(abbr)
+
+    def get_default_gramcats(self, word):
+        """Gramatical categories of the entries of the word (same as Word.gramcats)."""
+        if self.default_gramcats is None:
+            # only when required
+            self.load_default_gramcats()
+
+        return self.default_gramcats.get(word.pk, set())
+
+    def retrieve_word(self, row_number, term_raw):
+        # 1) exact match
+        try:
+            term = term_raw.strip()
+        except AttributeError:
+            # e.g. empty cell is translated as float(nan)
+            self.add_error(term_raw, "A", 'Empty or invalid value at row {}.'.format(row_number))
+            return None
+
+        # 2) ignoring case and accents (e.g. arbol --> árbol) and handle
+        # cases where only masculine form has been included instead of
+        # both. e.g. delicado --> delicado/a
+        found = self.words.get(term) or self.normalized_words.get(normalize_term(term))
+        if found is None:
+            # 3) trigam similarity (only as suggestion, see suggest_words)
+            self.add_error(term, "A", 'Word "{}" not found in the database.'.format(term),
+                           code='not_found')
+            return None
+
+        pk, term_found = found
+        return Word(pk=pk, term=term_found, lexicon=self.lexicon)
+
+    def get_terms_by_token(self):
+        """Index the terms of the lexicon by each word of its normalized term."""
+        if self.terms_by_token is None:
+            self.terms_by_token = {}
+            for term in self.words:
+                normalized = normalize_term(term)
+                for token in set(TRIGRAM_WORD_RE.findall(normalized)):
+                    self.terms_by_token.setdefault(token, []).append((normalized, term))
+        return self.terms_by_token
+
+    def suggest_words(self, errors):
+        """
+        Look for similar words of the terms not found in the database
+        and add them to the errors.
+
+        Suggestions match Word.objects.search() criteria: words that
+        contain the term as a whole word (ignoring case and accents),
+        sorted by trigram similarity.
+
+        """
+        queries = {}
+        for error in errors:
+            query = Word.objects.normalize_query(error.word)
+            if TRIGRAM_WORD_RE.search(query):
+                queries.setdefault(query, []).append(error)
+        if not queries:
+            return
+
+        if connection.vendor == 'postgresql':
+            suggestions = self.find_similar_words_postgresql(queries)
+        else:
+            suggestions = self.find_similar_words(queries)
+
+        for query, terms in suggestions.items():
+            for error in queries[query]:
+                error.suggestions = ', '.join(terms)
+                error.message += ' Did you mean: {}?'.format(error.suggestions)
+
+    def find_similar_words_postgresql(self, queries):
+        """Return the similar terms of every query with a single query to the database."""
+        queries = list(queries)
+        sql = SUGGESTIONS_SQL.format(table=connection.ops.quote_name(Word._meta.db_table))
+        params = [queries, [re.escape(query) for query in queries], self.lexicon.pk,
+                  SUGGESTION_MIN_SIMILARITY, SUGGESTION_LIMIT]
+
+        suggestions = {}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for query, term in cursor.fetchall():
+                suggestions.setdefault(query, []).append(term)
+        return suggestions
+
+    def find_similar_words(self, queries):
+        """
+        Return the similar terms of every query computed in memory for
+        the backends without pg_trgm (e.g. SQLite). Trigrams are
+        extracted like pg_trgm does, but its word characters depend on
+        the database locale, so results may differ on non-ASCII letters.
+
+        """
+        terms_by_token = self.get_terms_by_token()
+        suggestions = {}
+        for query in queries:
+            token = TRIGRAM_WORD_RE.search(query).group()
+            regex = re.compile(r'\b{}\b'.format(re.escape(query)))
+            candidates = []
+            for normalized, term in terms_by_token.get(token, []):
+                if not regex.search(normalized):
+                    continue
+                similarity = trigram_similarity(normalized, query)
+                if similarity > SUGGESTION_MIN_SIMILARITY:
+                    candidates.append((-similarity, term))
+            if candidates:
+                suggestions[query] = [term for _, term in sorted(candidates)[:SUGGESTION_LIMIT]]
+        return suggestions
+
+    def write(self):
+        """Save the validated entries and return the number of (entries, words)."""
+        count_entries = 0
+        with transaction.atomic():
+            for word in self.cleaned_data:
+                for entry in word.clean_entries:
+                    entry.save()
+                    entry.gramcats.set(entry.clean_gramcats)
+                    count_entries += 1
+        return count_entries, len(self.cleaned_data)
@@ -0,0 +1,191 @@
+"""
+Background execution of the importer commands (e.g. validation of the
+files uploaded on the data validator) so requests aren't blocked.
+
+Jobs are stored on the database (ImportJob) to poll their progress and
+results from any process. They are run by a pool of threads of the
+process which created them or, to not lose them on restarts of the web
+server, by the `runimportjobs` command. It can be configured with these
+settings:
+
+    LINGUATEC_LEXICON_JOB_WORKERS: number of threads (default: 2), if
+        it's 0 jobs are run synchronously when they are submitted and if
+        it's None they are left pending to be run by `runimportjobs`.
+    LINGUATEC_LEXICON_JOB_TIMEOUT: seconds after which pending or running
+        jobs are considered lost and marked as failed (default: 3600).
+    LINGUATEC_LEXICON_JOB_RETENTION: seconds finished jobs are kept
+        (default: 7 days).
+
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from linguatec_lexicon.importers import DataImporter, ImporterError, VariationImporter
+from linguatec_lexicon.models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_workers():
+    return getattr(settings, 'LINGUATEC_LEXICON_JOB_WORKERS', 2)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_workers(), thread_name_prefix='linguatec-job')
+    return _executor
+
+
+def get_timeout():
+    return getattr(settings, 'LINGUATEC_LEXICON_JOB_TIMEOUT', 3600)
+
+
+def get_retention():
+    return getattr(settings, 'LINGUATEC_LEXICON_JOB_RETENTION', 7 * 24 * 3600)
+
+
+def submit(job):
+    """Run the job in background (once the current transaction is committed)."""
+    cleanup()
+    workers = get_workers()
+    if workers is None:
+        # run by runimportjobs command
+        return
+    if workers == 0:
+        run(job.pk)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run_in_thread, job.pk))
+
+
+def shutdown(wait=True):
+    """Stop the pool of threads, waiting for the submitted jobs unless wait is False."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def run_in_thread(job_id):
+    # nobody checks the future, so errors are logged here
+    try:
+        run(job_id)
+    except Exception:
+        logger.exception("Import job %s failed", job_id)
+    finally:
+        # connections are thread local so they aren't closed by request_finished
+        connections.close_all()
+
+
+def update_progress(job_id, count_rows):
+    ImportJob.objects.filter(pk=job_id).update(progress=count_rows)
+
+
+def get_importer(job):
+    progress_callback = partial(update_progress, job.pk)
+    if job.command == 'importvariation':
+        return VariationImporter(job.lexicon, variation=job.variation, progress_callback=progress_callback)
+    return DataImporter(job.lexicon, progress_callback=progress_callback)
+
+
+def remove_input_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def cleanup():
+    """
+    Mark as failed the jobs pending or running for longer than the timeout
+    (e.g. lost on a restart of the process which was running them), remove
+    their input files and delete the jobs finished before the retention.
+
+    Return the number of (expired, deleted) jobs.
+
+    """
+    now = timezone.now()
+    limit = now - timedelta(seconds=get_timeout())
+    stale = ImportJob.objects.filter(
+        Q(status=ImportJob.STATUS_PENDING, created__lt=limit) |
+        Q(status=ImportJob.STATUS_RUNNING, started__lt=limit)
+    )
+    count_expired = 0
+    for pk, status, input_file in stale.values_list('pk', 'status', 'input_file'):
+        # status is checked again in case the job has just finished
+        expired = ImportJob.objects.filter(pk=pk, status=status).update(
+            status=ImportJob.STATUS_FAILED, message='The job was lost or timed out.', finished=now)
+        if expired:
+            remove_input_file(input_file)
+            count_expired += 1
+
+    count_deleted, _ = ImportJob.objects.filter(
+        finished__lt=now - timedelta(seconds=get_retention())).delete()
+    return count_expired, count_deleted
+
+
+def run_pending():
+    """Run the pending jobs (oldest first) and return how many were run."""
+    count = 0
+    qs = ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).order_by('created')
+    while True:
+        job_id = qs.values_list('pk', flat=True).first()
+        if job_id is None:
+            return count
+        if run(job_id):
+            count += 1
+
+
+def run(job_id):
+    """Run the job unless it isn't pending anymore (return whether it was run)."""
+    # claim the job, so it's run once even by several workers
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.STATUS_PENDING).update(
+        status=ImportJob.STATUS_RUNNING, started=timezone.now())
+    if not claimed:
+        return False
+
+    # once claimed, the job always ends as finished or failed
+    status, errors, message = ImportJob.STATUS_FAILED, None, ''
+    input_file = None
+    try:
+        job = ImportJob.objects.select_related('lexicon', 'variation').get(pk=job_id)
+        input_file = job.input_file
+        importer = get_importer(job)
+        errors = [error.as_dict() for error in importer.validate(importer.read_rows(input_file))]
+        if not errors and not job.dry_run:
+            importer.write()
+        status = ImportJob.STATUS_FINISHED
+    except ImporterError as e:
+        message = str(e)
+    except Exception as e:
+        logger.exception("Import job %s failed", job_id)
+        message = str(e)
+    finally:
+        if input_file is not None:
+            remove_input_file(input_file)
+        try:
+            save_result(job_id, status, errors, message)
+        except Exception:
+            logger.exception("Result of import job %s couldn't be saved", job_id)
+            save_result(job_id, ImportJob.STATUS_FAILED, None, "The result of the job couldn't be saved.")
+    return True
+
+
+def save_result(job_id, status, errors, message):
+    # progress isn't overwritten (it's updated by the importer)
+    ImportJob.objects.filter(pk=job_id).update(
+        status=status, errors=errors, message=message, finished=timezone.now())
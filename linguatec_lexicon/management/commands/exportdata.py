@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
 
 from linguatec_lexicon.models import (
     Entry, Example, Lexicon, VerbalConjugation, Word)
@@ -7,14 +8,6 @@ import csv
 import os.path
 
 
-def get_src_language_from_lexicon_code(lex_code):
-    return lex_code[:2]
-
-
-def get_dst_language_from_lexicon_code(lex_code):
-    return lex_code[3:]
-
-
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
@@ -25,16 +18,22 @@ class Command(BaseCommand):
             'output_file', type=str,
             help='Name of file where data will be written to. (must be a csv file)'
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=500, dest='batch_size',
+            help="Number of words retrieved from the database on each query (default: 500).",
+        )
 
     def handle(self, *args, **options):
         self.lexicon_code = options['lexicon_code']
         self.output_file = options['output_file']
+        self.batch_size = options['batch_size']
+
+        if self.batch_size < 1:
+            raise CommandError('Error: --batch-size should be a positive integer.')
+
         # check that a lexicon with that code exist
         try:
-            src = get_src_language_from_lexicon_code(self.lexicon_code)
-            dst = get_dst_language_from_lexicon_code(self.lexicon_code)
-
-            self.lexicon = Lexicon.objects.get(src_language=src, dst_language=dst)
+            self.lexicon = Lexicon.objects.get_by_code(self.lexicon_code)
         except Lexicon.DoesNotExist:
             raise CommandError('Error: There is not a lexicon with that code: ' + self.lexicon_code)
 
@@ -44,10 +43,62 @@ class Command(BaseCommand):
 
         self.write_to_csv_file()
 
-    def write_to_csv_file(self):
+    def iter_words(self):
+        """
+        Yield the words of the lexicon sorted by term, loading them in
+        batches with their entries (without variation) and related objects
+        prefetched. Django ignores prefetch_related() on iterator(), so
+        batches are retrieved using the last term as a cursor.
+
+        """
+        entries = Entry.objects.filter(variation=None).select_related('conjugation')
+        qs = Word.objects.filter(lexicon=self.lexicon).order_by('term').prefetch_related(
+            Prefetch('entries', queryset=entries),
+            'entries__gramcats',
+            Prefetch('entries__examples', queryset=Example.objects.order_by('pk')),
+        )
 
-        word_list = list(Word.objects.filter(lexicon=self.lexicon).order_by('term'))
+        last_term = None
+        while True:
+            batch = qs if last_term is None else qs.filter(term__gt=last_term)
+            batch = list(batch[:self.batch_size])
+            if not batch:
+                break
+            yield from batch
+            last_term = batch[-1].term
+
+    def build_row(self, word):
+        entries = word.entries.all()
+
+        to_write = {
+            'word': word.term,
+            'translation': ' // '.join(entry.translation for entry in entries),
+            'gramcats': ' // '.join(sorted(set(
+                gramcat.abbreviation for entry in entries for gramcat in entry.gramcats.all()))),
+        }
+
+        examples = []
+        verbal_conjugations = []
+        for entry in entries:
+            examples.append(' ; '.join(example.phrase for example in entry.examples.all()))
+            try:
+                verbal_conjugations.append(entry.conjugation.raw)
+            except VerbalConjugation.DoesNotExist:
+                verbal_conjugations.append('')
+
+        to_write['example'] = self.join_by_entry(examples)
+        to_write['verbal conjugation'] = self.join_by_entry(verbal_conjugations)
+
+        return to_write
+
+    @staticmethod
+    def join_by_entry(values):
+        """Join values keeping the position of its entry (trailing empty values are removed)."""
+        while values and values[-1] == '':
+            values.pop()
+        return '// '.join(values)
 
+    def write_to_csv_file(self):
         with open(self.output_file, 'w') as outfile:
 
             fieldnames = [
@@ -61,48 +112,5 @@ class Command(BaseCommand):
 
             writer = csv.DictWriter(outfile, fieldnames=fieldnames, delimiter=';')
 
-            for word in word_list:
-
-                to_write = {'word': word.term}
-
-                entry_list = Entry.objects.filter(word=word, variation=None)
-
-                to_write['translation'] = ' // '.join(entry_list.values_list('translation', flat=True))
-
-                to_write['gramcats'] = ' // '.join(entry_list.values_list('gramcats__abbreviation', flat=True)
-                                                   .distinct().order_by('gramcats__abbreviation'))
-
-                to_write['example'] = ''
-                to_write['verbal conjugation'] = ''
-                number_of_examples = 0
-                number_of_verbal_conjugation = 0
-
-                for entry in entry_list:
-                    examples = ' ; '.join(Example.objects.filter(entry=entry)
-                                          .values_list('phrase', flat=True))
-                    if examples != '':
-                        number_of_examples += 1
-
-                    to_write['example'] += examples + '// '
-
-                    verbal_conjugations = ' ; '.join(VerbalConjugation.objects.filter(entry=entry)
-                                                     .values_list('raw', flat=True))
-
-                    if verbal_conjugations != '':
-                        number_of_verbal_conjugation += 1
-
-                    to_write['verbal conjugation'] += verbal_conjugations + '// '
-
-                if number_of_examples == 0:
-                    to_write['example'] = ''
-                else:
-                    while to_write['example'][-3:] == '// ':
-                        to_write['example'] = to_write['example'][:-3]
-
-                if number_of_verbal_conjugation == 0:
-                    to_write['verbal conjugation'] = ''
-                else:
-                    while to_write['verbal conjugation'][-3:] == '// ':
-                        to_write['verbal conjugation'] = to_write['verbal conjugation'][:-3]
-
-                writer.writerow(to_write)
+            for word in self.iter_words():
+                writer.writerow(self.build_row(word))
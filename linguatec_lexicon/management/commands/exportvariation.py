@@ -1,20 +1,13 @@
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
 
 from linguatec_lexicon.models import (
-    Entry, Lexicon, DiatopicVariation, Word)
+    DiatopicVariation, Entry, Lexicon, Word)
 
 import csv
 import os.path
 
 
-def get_src_language_from_lexicon_code(lex_code):
-    return lex_code[:2]
-
-
-def get_dst_language_from_lexicon_code(lex_code):
-    return lex_code[3:]
-
-
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
@@ -31,17 +24,23 @@ class Command(BaseCommand):
             'output_file', type=str,
             help='Name of file where data will be written to. (must be a csv file)'
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=500, dest='batch_size',
+            help="Number of words retrieved from the database on each query (default: 500).",
+        )
 
     def handle(self, *args, **options):
         self.lexicon_code = options['lexicon_code']
         self.variation_name = options['variation_name']
         self.output_file = options['output_file']
+        self.batch_size = options['batch_size']
+
+        if self.batch_size < 1:
+            raise CommandError('Error: --batch-size should be a positive integer.')
+
         # check that a lexicon with that code exist
         try:
-            src = get_src_language_from_lexicon_code(self.lexicon_code)
-            dst = get_dst_language_from_lexicon_code(self.lexicon_code)
-
-            self.lexicon = Lexicon.objects.get(src_language=src, dst_language=dst)
+            self.lexicon = Lexicon.objects.get_by_code(self.lexicon_code)
         except Lexicon.DoesNotExist:
             raise CommandError('Error: There is not a lexicon with that code: ' + self.lexicon_code)
 
@@ -56,14 +55,40 @@ class Command(BaseCommand):
 
         self.write_to_csv_file()
 
-    def write_to_csv_file(self):
-
-        entry_list = Entry.objects.filter(variation=self.variation).values('word__term').distinct().order_by('word__term')
+    def iter_words(self):
+        """
+        Yield the words of the lexicon with entries of the variation
+        sorted by term, loading them in batches with those entries and
+        their gramcats prefetched (using the last term as a cursor).
+
+        """
+        entries = Entry.objects.filter(variation=self.variation)
+        qs = Word.objects.filter(
+            lexicon=self.lexicon, entries__variation=self.variation,
+        ).distinct().order_by('term').prefetch_related(
+            Prefetch('entries', queryset=entries),
+            'entries__gramcats',
+        )
 
-        word_list = []
-        for entry in entry_list:
-            word_list.append(Word.objects.get(term=entry['word__term']))
+        last_term = None
+        while True:
+            batch = qs if last_term is None else qs.filter(term__gt=last_term)
+            batch = list(batch[:self.batch_size])
+            if not batch:
+                break
+            yield from batch
+            last_term = batch[-1].term
+
+    def build_row(self, word):
+        entries = word.entries.all()
+        return {
+            'word': word.term,
+            'gramcats': ' // '.join(sorted(set(
+                gramcat.abbreviation for entry in entries for gramcat in entry.gramcats.all()))),
+            'translation': ' // '.join(entry.translation for entry in entries),
+        }
 
+    def write_to_csv_file(self):
         with open(self.output_file, 'w') as outfile:
 
             fieldnames = [
@@ -74,15 +99,5 @@ class Command(BaseCommand):
 
             writer = csv.DictWriter(outfile, fieldnames=fieldnames, delimiter=';')
 
-            for word in word_list:
-
-                to_write = {'word': word.term}
-
-                to_write['gramcats'] = ' // '.join(Entry.objects.filter(word=word, variation=self.variation)
-                                                   .values_list('gramcats__abbreviation', flat=True)
-                                                   .distinct().order_by('gramcats__abbreviation'))
-
-                to_write['translation'] = ' // '.join(Entry.objects.filter(word=word, variation=self.variation)    
-                                                      .values_list('translation', flat=True))
-
-                writer.writerow(to_write)
+            for word in self.iter_words():
+                writer.writerow(self.build_row(word))
@@ -1,12 +1,11 @@
 import json
-import pandas as pd
+import time
 
-from django.core.exceptions import ValidationError
+import pandas as pd
 from django.core.management.base import BaseCommand, CommandError
 
-from linguatec_lexicon.models import (
-    Entry, Example, Lexicon, GramaticalCategory, VerbalConjugation, Word)
-from linguatec_lexicon.validators import validate_column_verb_conjugation
+from linguatec_lexicon.importers import DataImporter, ImporterError, summarize_diff
+from linguatec_lexicon.models import Lexicon
 
 
 def split_data_frame_list(df, target_column):
@@ -43,21 +42,6 @@ def extract_gramcats(db):
     return gramcats
 
 
-def is_verb(gramcats):
-    for gramcat in gramcats:
-        if (gramcat.abbreviation.startswith('v.')
-                or gramcat.abbreviation in ['expr.', 'per. vl.', 'loc. vl.']):
-            return True
-    return False
-
-
-def get_src_language_from_lexicon_code(lex_code):
-    return lex_code[:2]
-
-def get_dst_language_from_lexicon_code(lex_code):
-    return lex_code[3:]
-
-
 class Command(BaseCommand):
 
     def add_arguments(self, parser):
@@ -74,6 +58,23 @@ class Command(BaseCommand):
             '--allow-partial', action='store_true', dest='allow_partial',
             help="Allow verbs with partial or unknown format conjugations. USE WITH CAUTION",
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=500, dest='batch_size',
+            help="Number of objects inserted into the database on each query (default: 500).",
+        )
+        parser.add_argument(
+            '--no-stream', action='store_false', dest='stream',
+            help="Load the whole input file in memory (pandas) instead of reading it row by row.",
+        )
+        parser.add_argument(
+            '--incremental', action='store_true', dest='incremental',
+            help="Update a lexicon already imported writing only the words which have changed "
+                 "(words missing on the input file are deleted).",
+        )
+        parser.add_argument(
+            '--jobs', type=int, default=1, dest='jobs',
+            help="Number of processes used to validate the input file (default: 1).",
+        )
 
     def handle(self, *args, **options):
         self.dry_run = options['dry_run']
@@ -81,233 +82,96 @@ class Command(BaseCommand):
         self.input_file = options['input_file']
         self.allow_partial = options['allow_partial']
         self.lexicon_code = options['lexicon_code']
+        self.batch_size = options['batch_size']
+        self.stream = options.get('stream', True)
+        self.jobs = options.get('jobs', 1)
+        self.incremental = options.get('incremental', False)
+
+        if self.batch_size < 1:
+            raise CommandError('Error: --batch-size should be a positive integer.')
 
-        # check that GramaticalCategories are initialized
-        if not GramaticalCategory.objects.all().exists():
-            raise CommandError(
-                "There isn't any GramaticalCategory in the database. "
-                "Gramatical Categories should be initialized before importing "
-                "data for example running manage.py importgramcat."
-            )
+        if self.jobs < 1:
+            raise CommandError('Error: --jobs should be a positive integer.')
 
         # check that a lexicon with that code exist
         try:
-            src = get_src_language_from_lexicon_code(self.lexicon_code)
-            dst = get_dst_language_from_lexicon_code(self.lexicon_code)
-
-            self.lexicon = Lexicon.objects.get(src_language = src, dst_language = dst)
+            self.lexicon = Lexicon.objects.get_by_code(self.lexicon_code)
         except Lexicon.DoesNotExist:
             raise CommandError('Error: There is not a lexicon with that code: ' + self.lexicon_code)
 
-        self.stdout.write("INFO\tinput file: %s\n" % self.input_file)
+        try:
+            self.importer = DataImporter(self.lexicon, allow_partial=self.allow_partial,
+                                         batch_size=self.batch_size, jobs=self.jobs)
+        except ImporterError as e:
+            raise CommandError(str(e))
+
+        if self.importer.jobs < self.jobs:
+            self.stdout.write(self.style.WARNING(
+                "Processes can't be forked on this platform, rows are validated by a single process."))
 
-        db = self.read_input_file()
+        self.stdout.write("INFO\tinput file: %s\n" % self.input_file)
 
         # TODO add arg to print (or not gramcats)
-        #gramcats = extract_gramcats(db)
+        #gramcats = extract_gramcats(self.importer.read_data_frame(self.input_file))
 
-        self.populate_models(db)
+        rows = self.importer.read_rows(self.input_file, stream=self.stream)
+        self.errors = list(self.importer.validate(rows))
 
         if self.errors:
             self.stdout.write(self.style.ERROR(
                 "Detected {} errors!".format(len(self.errors))))
             if self.verbosity >= 2:
                 for error in self.errors:
-                    self.stdout.write(self.style.ERROR(json.dumps(error)))
+                    self.stdout.write(self.style.ERROR(json.dumps(error.as_dict())))
 
+        elif self.incremental:
+            # Write only the changes into the database (or preview them)
+            self.write_incremental()
         elif not self.dry_run:
             # Write data into the database
             self.write_to_database()
 
-    def read_input_file(self):
-        df = pd.DataFrame()
-
-        xlsx = pd.ExcelFile(self.input_file)
-
-        for sheet in xlsx.sheet_names:
-            # we define na_values and keep_default_na because defaults na_values
-            # includes empty string. We don't want that pandas replaces empty
-            # cells with 'nan'
-            partial = xlsx.parse(sheet, header=None, usecols='A:F')
-            # names=['colA', 'colB', 'colC', 'colD', 'colE', 'colF'])
-            df = df.append(partial, ignore_index=True, sort=False)
+    def write_warnings(self):
+        warnings = self.importer.warnings
+        if warnings:
+            self.stdout.write(self.style.WARNING(
+                "Found {} verbal conjugations referencing a missing model word "
+                "(run updateconjugations after importing them).".format(len(warnings))))
+            if self.verbosity >= 2:
+                for warning in warnings:
+                    self.stdout.write(self.style.WARNING(json.dumps(warning.as_dict())))
 
-        df_obj = df.select_dtypes(['object'])
-        df[df_obj.columns] = df_obj.apply(lambda x: x.str.strip())
-        df = df.fillna('')  # replace NaN with blank string
+    def write_to_database(self):
+        start = time.perf_counter()
 
-        return df
+        count_words, count_entries, count_gramcats, count_examples, count_conjugations = self.importer.write()
+        self.write_warnings()
 
-    def get_or_create_word(self, term):
-        try:
-            return (False, self.cleaned_data[term])
-        except KeyError:
-            new_word = Word(term=term)
-            new_word.clean_entries = []
-            return (True, new_word)
-
-    def populate_word(self, w_str):
-        # avoid duplicated word.term
-        created, word = self.get_or_create_word(w_str)
-        if created:
-            self.cleaned_data[word.term] = word
-
-        return word
-
-    def populate_gramcats(self, word, g_str):
-        gramcats = []
-        if not g_str:
-            self.errors.append({
-                "word": word.term,
-                "column": "B",
-                "message": "missing gramatical category"
-            })
-        else:
-            for abbr in g_str.split("//"):
-                abbr = abbr.strip()
-                try:
-                    gramcats.append(
-                        GramaticalCategory.objects.get(abbreviation=abbr))
-                except GramaticalCategory.DoesNotExist:
-                    self.errors.append({
-                        "word": word.term,
-                        "column": "B",
-                        "message": "unkown gramatical category '{}'".format(abbr)
-                    })
-        word.is_verb = is_verb(gramcats)
-        return gramcats
-
-    def populate_entries(self, word, gramcats, entries_str):
-        for translation in entries_str.split('//'):
-            entry = Entry(word=word, translation=translation.strip())
-            entry.clean_gramcats = gramcats
-            entry.clean_examples = []
-            word.clean_entries.append(entry)
-
-    def populate_examples(self, word, ex_str):
-        if pd.isnull(ex_str) or ex_str == '':
-            return
-
-        ex_strs = [x.strip() for x in ex_str.split('//')]
-        if len(word.clean_entries) < len(ex_strs):
-            self.errors.append({
-                "word": word.term,
-                "column": "E",
-                "message": "there are more examples '{}' than entries'{}'".format(
-                    len(ex_strs), len(word.clean_entries))
-            })
-            # invalid format, don't try to extract it!
-            return
+        elapsed = time.perf_counter() - start
+        count_rows = count_words + count_entries + count_gramcats + count_examples + count_conjugations
+        self.stdout.write("Imported: %s words, %s entries, %s examples" %
+                          (count_words, count_entries, count_examples))
+        self.stdout.write("Inserted %d rows in %.2f seconds (%d rows/s)" %
+                          (count_rows, elapsed, count_rows / elapsed if elapsed else count_rows))
 
-        for i, value in enumerate(ex_strs):  # subelement
-            we = word.clean_entries[i]  # word entry
-            if value:
-                # TODO could be several examples separated by ';'
-                we.clean_examples.append(Example(phrase=value))
-
-    def populate_verbal_conjugation(self, word, gramcats, conjugation_str):
-        # check if word is a verb
-        if conjugation_str and not word.is_verb:
-            gramcats = [x.abbreviation for x in gramcats]
-            self.errors.append({
-                "word": word.term,
-                "column": "F",
-                "message": "only verbs can have verbal conjugation data (found {})".format(gramcats),
-            })
+    def write_incremental(self):
+        if self.dry_run:
+            summary = summarize_diff(self.importer.diff_incremental())
+            self.write_incremental_summary("Incremental import (dry run)", summary)
             return
 
-        raw_conjugations = [x.strip()
-                            for x in conjugation_str.split('//')]
-
-        # check number of conjugations VS number of entries
-        if len(word.clean_entries) < len(raw_conjugations):
-            self.errors.append({
-                "word": word.term,
-                "column": "F",
-                "message": "there are more conjugations '{}' than entries'{}'".format(
-                    len(word.clean_entries), len(conjugation_str))
-            })
-            # invalid format, don't try to extract it!
-            return
+        start = time.perf_counter()
 
-        for i, raw_conjugation in enumerate(raw_conjugations):
-            if raw_conjugation:
-                try:
-                    validate_column_verb_conjugation(raw_conjugation)
-                except ValidationError as e:
-                    if not self.allow_partial:
-                        self.errors.append({
-                            "word": word.term,
-                            "column": "F",
-                            "message": str(e.message),
-                        })
-                    partial = True
-                else:
-                    partial = False
-                # workaround issue 66 allow partial conjugations (or unformated data)
-                if not partial or partial and self.allow_partial:
-                    word.clean_entries[i].clean_conjugation = VerbalConjugation(
-                        raw=raw_conjugation)
-
-    def populate_models(self, db):
-        self.errors = []
-        self.cleaned_data = {}
-        for row in db.itertuples(name=None):
-            # itertuples by default return the index as the first element of the tuple.
-
-            # filter empty rows
-            # TODO how to ignore empty rows in an elegant way?
-            if pd.isnull(row) or pd.isna(row[1]) or pd.isnull(row[1]) or row[1] == '':
-                continue
-
-            # column A is word (required)
-            word = self.populate_word(row[1])
-
-            # column B is gramcat (required)
-            gramcats = self.populate_gramcats(word, row[2])
-
-            # column C is entry (required)
-            self.populate_entries(word, gramcats, row[3])
-
-            # column E is example (optional)
-            try:
-                ex_str = row[5]
-            except IndexError:
-                continue
-            self.populate_examples(word, ex_str)
-
-            # column F is verb conjugation
-            try:
-                conjugation_str = row[6]
-            except IndexError:
-                continue
-            self.populate_verbal_conjugation(word, gramcats, conjugation_str)
+        summary = self.importer.write_incremental()
+        self.write_warnings()
 
-    def write_to_database(self):
-        count_words = 0
-        count_entries = 0
-        count_examples = 0
-        for _, word in self.cleaned_data.items():
-            word.lexicon_id = self.lexicon.pk
-            word.save()
-            count_words += 1
-
-            for entry in word.clean_entries:
-                entry.word_id = word.pk
-                entry.save()
-                entry.gramcats.set(entry.clean_gramcats)
-                count_entries += 1
-
-                for example in entry.clean_examples:
-                    example.entry_id = entry.pk
-                    example.save()
-                    count_examples += 1
-
-                try:
-                    entry.clean_conjugation.entry_id = entry.pk
-                    entry.clean_conjugation.save()
-                except AttributeError:
-                    pass
+        elapsed = time.perf_counter() - start
+        self.write_incremental_summary("Incremental import", summary)
+        self.stdout.write("Inserted %d rows and deleted %d rows in %.2f seconds" %
+                          (summary['inserted_rows'], summary['deleted_rows'], elapsed))
 
-        self.stdout.write("Imported: %s words, %s entries, %s examples" %
-                          (count_words, count_entries, count_examples))
+    def write_incremental_summary(self, title, summary):
+        # emptied words are kept because they have entries of diatopic variations
+        self.stdout.write("%s: %d words added, %d updated, %d deleted, %d emptied, %d unchanged" % (
+            title, summary['added'], summary['updated'], summary['deleted'], summary['emptied'],
+            summary['unchanged']))
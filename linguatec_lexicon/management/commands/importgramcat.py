@@ -1,6 +1,7 @@
 import pandas as pd
 from django.core.management.base import BaseCommand, CommandError
 
+from linguatec_lexicon import cache
 from linguatec_lexicon.models import GramaticalCategory
 
 
@@ -34,6 +35,10 @@ class Command(BaseCommand):
 
         self.loaddata(csv_files)
 
+        # bulk_create doesn't send post_save signals
+        GramaticalCategory.objects.clear_cache()
+        cache.bump_data_version()
+
         if self.verbosity >= 1:
             self.stdout.write(
                 "Imported %d object(s) from %d file(s)"
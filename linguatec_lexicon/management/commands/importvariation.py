@@ -1,20 +1,10 @@
 import json
 import os
 
-import pandas as pd
-from django.core.exceptions import ValidationError
 from django.core.management.base import BaseCommand, CommandError
 
-from linguatec_lexicon.models import (DiatopicVariation, Entry,
-                                      GramaticalCategory, Word, Lexicon)
-
-
-def get_src_language_from_lexicon_code(lex_code):
-    return lex_code[:2]
-
-
-def get_dst_language_from_lexicon_code(lex_code):
-    return lex_code[3:]
+from linguatec_lexicon.importers import ImporterError, VariationImporter
+from linguatec_lexicon.models import DiatopicVariation, Lexicon
 
 
 class Command(BaseCommand):
@@ -34,6 +24,10 @@ class Command(BaseCommand):
             '--dry-run', action='store_true', dest='dry_run',
             help="Just validate input file; don't actually import to database.",
         )
+        parser.add_argument(
+            '--jobs', type=int, default=1, dest='jobs',
+            help="Number of processes used to validate the input file (default: 1).",
+        )
 
     def clean_variation(self, value):
         if self.dry_run:
@@ -51,6 +45,10 @@ class Command(BaseCommand):
         self.dry_run = options['dry_run']
         self.verbosity = options['verbosity']
         self.lexicon_code = options['lexicon_code']
+        self.jobs = options.get('jobs', 1)
+
+        if self.jobs < 1:
+            raise CommandError('Error: --jobs should be a positive integer.')
 
         # validate input_file
         _, file_extension = os.path.splitext(self.input_file)
@@ -60,161 +58,42 @@ class Command(BaseCommand):
 
         self.variation = self.clean_variation(options['variation'])
 
-        # check that GramaticalCategories are initialized
-        if not GramaticalCategory.objects.all().exists():
-            raise CommandError(
-                "There isn't any GramaticalCategory in the database. "
-                "Gramatical Categories should be initialized before importing "
-                "data for example running manage.py importgramcat."
-            )
-
         # check that a lexicon with that code exist
         try:
-            src = get_src_language_from_lexicon_code(self.lexicon_code)
-            dst = get_dst_language_from_lexicon_code(self.lexicon_code)
-
-            self.lexicon = Lexicon.objects.get(src_language = src, dst_language = dst)
+            self.lexicon = Lexicon.objects.get_by_code(self.lexicon_code)
         except Lexicon.DoesNotExist:
             raise CommandError('Error: There is not a lexicon with that code: ' + self.lexicon_code)
 
+        try:
+            self.importer = VariationImporter(self.lexicon, variation=self.variation, jobs=self.jobs)
+        except ImporterError as e:
+            raise CommandError(str(e))
+
+        if self.importer.jobs < self.jobs:
+            self.stdout.write(self.style.WARNING(
+                "Processes can't be forked on this platform, rows are validated by a single process."))
 
-        self.xlsx = pd.read_excel(self.input_file, sheet_name=None, header=None, usecols="A:C",
-                                  names=['term', 'gramcats', 'translations'])
-        self.populate_models()
+        self.errors = list(self.importer.validate(self.importer.read_rows(self.input_file)))
 
         if self.errors:
             self.stdout.write(self.style.ERROR(
                 "Detected {} errors!".format(len(self.errors))))
             if self.verbosity > 2:
                 for error in self.errors:
-                    self.stdout.write(self.style.ERROR(json.dumps(error)))
+                    self.stdout.write(self.style.ERROR(json.dumps(error.as_dict())))
         else:
             if not self.dry_run:
                 # Write data into the database
-                self.write_to_database()
+                count_entries, count_words = self.importer.write()
+                self.stdout.write("Imported: {} entries of {} words.".format(count_entries, count_words))
             self.stdout.write(self.style.SUCCESS(
                 'Successfully imported file "{}" of diatopic variation "{}"'.format(self.input_file, options['variation'])))
 
         if self.verbosity > 1:
             self.stdout.write(
                 "Excel stats: {} rows | {} valid rows | {} invalid rows".format(
-                    sum([len(sheet.index) for sheet in self.xlsx.values()]),
-                    len(self.cleaned_data),
+                    self.importer.count_rows,
+                    len(self.importer.cleaned_data),
                     len(self.errors),
                 )
             )
-
-    def populate_models(self):
-        self.errors = []
-        self.cleaned_data = []
-
-        for sheet_name, sheet in self.xlsx.items():
-            for row in sheet.itertuples():
-                word = self.retrieve_word(row.Index + 1, row.term)
-                if word is None:
-                    continue
-
-                try:
-                    gramcats = self.retrieve_gramcats(word, row.gramcats)
-                    self.populate_entries(word, gramcats, row.translations)
-                except ValidationError as e:
-                    message = e.message % e.params if e.params else e.message
-                    self.errors.append({
-                        "word": word.term,
-                        "column": "{}!{}".format(sheet_name, e.code),
-                        "message": message,
-                    })
-                    continue
-
-                self.cleaned_data.append(word)
-
-    def populate_entries(self, word, gramcats, translations_raw):
-        word.clean_entries = []
-
-        try:
-            translations_list = translations_raw.split('//')
-        except AttributeError:
-            # e.g. empty cell is translated as float(nan)
-            message = 'Word %(word)s contains empty or invalid translations.'
-            raise ValidationError(message, code='C', params={'word': word.term})
-
-        for translation in translations_list:
-            entry = Entry(word=word, translation=translation.strip(),
-                          variation=self.variation)
-            entry.clean_gramcats = gramcats
-            word.clean_entries.append(entry)
-
-    def retrieve_gramcats(self, word, gramcats_raw):
-        clean_gramcats = self.parse_or_get_default_gramcats(word, gramcats_raw)
-
-        gramcats = []
-        for abbr in clean_gramcats:
-            try:
-                gramcats.append(
-                    GramaticalCategory.objects.get(abbreviation=abbr))
-            except GramaticalCategory.DoesNotExist:
-                message = "unkown gramatical category %(value)s"
-                raise ValidationError(message, code='B', params={'value': abbr})
-
-        return gramcats
-
-    def parse_or_get_default_gramcats(self, word, gramcats_raw):
-        if pd.isnull(gramcats_raw):
-            # provide default value
-            clean_gramcats = word.gramcats()
-            if len(clean_gramcats) == 0:
-                message = "missing gramatical category"
-                raise ValidationError(message, code='B')
-            return clean_gramcats
-
-        clean_gramcats = [abbr.strip() for abbr in gramcats_raw.split("//")]
-        return clean_gramcats
-
-    def retrieve_word(self, row_number, term_raw):
-        # 1) exact match
-        try:
-            term = term_raw.strip()
-        except AttributeError:
-            # e.g. empty cell is translated as float(nan)
-            self.errors.append({
-                "word": term_raw,
-                "column": "A",
-                "message": 'Empty or invalid value at row {}.'.format(row_number)
-            })
-            return None
-        try:
-            return Word.objects.get(term=term, lexicon=self.lexicon)
-        except Word.DoesNotExist:
-            pass
-
-        # 2) handle cases where only masculine form has been included
-        # instead of both. e.g. delicado --> delicado/a
-        try:
-            return Word.objects.get(term=term + "/a", lexicon=self.lexicon)
-        except Word.DoesNotExist:
-            # 3) trigam similarity (only as suggestion)
-            message = 'Word "{}" not found in the database.'.format(term)
-            suggestions = None
-            qs = Word.objects.search(term,self.lexicon.code)[:4]
-            if qs.exists():
-                suggestions = ', '.join(qs.values_list('term', flat=True))
-                message += ' Did you mean: {}?'.format(suggestions)
-
-            self.errors.append({
-                "word": term,
-                "column": "A",
-                "message": message,
-                "suggestions": suggestions
-            })
-
-
-    def write_to_database(self):
-        count_entries = 0
-        for word in self.cleaned_data:
-            for entry in word.clean_entries:
-                entry.save()
-                entry.gramcats.set(entry.clean_gramcats)
-                count_entries += 1
-
-        self.stdout.write("Imported: {} entries of {} words.".format(
-            count_entries, len(self.cleaned_data)))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from linguatec_lexicon import jobs
+
+
+class Command(BaseCommand):
+    help = ('Runs the pending import jobs (e.g. files uploaded on the data validators) '
+            'when LINGUATEC_LEXICON_JOB_WORKERS is None, and expires the lost ones')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true', dest='once',
+            help="Run the pending jobs and exit instead of waiting for new ones.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5, dest='interval',
+            help="Seconds between checks for new jobs (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        once = options['once']
+        interval = options['interval']
+
+        if interval <= 0:
+            raise CommandError('Error: --interval should be a positive number.')
+
+        while True:
+            count_expired, count_deleted = jobs.cleanup()
+            count_run = jobs.run_pending()
+            if self.verbosity >= 1 and (once or count_run or count_expired or count_deleted):
+                self.stdout.write("Run {} jobs ({} expired, {} deleted)".format(
+                    count_run, count_expired, count_deleted))
+            if once:
+                break
+            time.sleep(interval)
+            # long running process: reconnect if the connection was closed by the server
+            close_old_connections()
@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from linguatec_lexicon import cache
+from linguatec_lexicon.models import VerbalConjugation, Word
+
+
+class Command(BaseCommand):
+    help = ('Updates parsed content of verbal conjugations, links them to their '
+            'model word and reports dangling references')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500, dest='batch_size',
+            help="Number of conjugations processed on each query (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+
+        if self.batch_size < 1:
+            raise CommandError('Error: --batch-size should be a positive integer.')
+
+        self.terms_by_lexicon = {}
+        self.dangling = []
+        count_updated = 0
+        count_conjugations = 0
+
+        qs = VerbalConjugation.objects.select_related('entry__word').order_by('pk')
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            count_conjugations += len(batch)
+
+            updated = [c for c in batch if self.update_conjugation(c)]
+            VerbalConjugation.objects.bulk_update(updated, ['parsed', 'model_word_ref'])
+            count_updated += len(updated)
+
+        # bulk_update doesn't send post_save signals
+        if count_updated:
+            cache.bump_data_version()
+
+        self.stdout.write("Processed {} conjugations: {} updated, {} dangling references.".format(
+            count_conjugations, count_updated, len(self.dangling)))
+
+        if self.dangling and self.verbosity >= 1:
+            for conjugation in self.dangling:
+                self.stdout.write(self.style.WARNING(json.dumps({
+                    "word": conjugation.entry.word.term,
+                    "entry": conjugation.entry_id,
+                    "model_word": conjugation.model_word,
+                })))
+
+    def get_lexicon_terms(self, lexicon_id):
+        try:
+            return self.terms_by_lexicon[lexicon_id]
+        except KeyError:
+            terms = dict(Word.objects.filter(lexicon_id=lexicon_id).values_list('term', 'pk'))
+            self.terms_by_lexicon[lexicon_id] = terms
+            return terms
+
+    def update_conjugation(self, conjugation):
+        """Update parsed content and the reference to the model word. Return True if they have changed."""
+        parsed = conjugation.parse_partial()
+        changed = parsed != conjugation.parsed
+        conjugation.parsed = parsed
+
+        model_word_id = None
+        if conjugation.model_word is not None:
+            terms = self.get_lexicon_terms(conjugation.entry.word.lexicon_id)
+            model_word_id = terms.get(conjugation.model_word)
+            if model_word_id is None:
+                self.dangling.append(conjugation)
+
+        if model_word_id != conjugation.model_word_ref_id:
+            conjugation.model_word_ref_id = model_word_id
+            changed = True
+
+        return changed
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.13 on 2026-10-17 16:24
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# copy of VerbalConjugation.KEYWORD_MODEL and validators.validate_verb_reference_to_model
+# regex (migrations shouldn't depend on code that may change)
+KEYWORD_MODEL = "modelo. conjug."
+MODEL_REGEX = re.compile(r'^(\w+)\s*\((\w+( \w+)?)\)$')
+
+
+def resolve_model_word_refs(apps, schema_editor):
+    VerbalConjugation = apps.get_model('linguatec_lexicon', 'VerbalConjugation')
+    Word = apps.get_model('linguatec_lexicon', 'Word')
+
+    terms_by_lexicon = {}
+    updated = []
+    qs = VerbalConjugation.objects.filter(raw__icontains=KEYWORD_MODEL).select_related('entry__word')
+    for conjugation in qs.iterator():
+        model_raw = conjugation.raw.lower().split(KEYWORD_MODEL)[1].strip()
+        match = MODEL_REGEX.match(model_raw)
+        if match is None:
+            continue
+        model_word = match.group(2)
+
+        lexicon_id = conjugation.entry.word.lexicon_id
+        if lexicon_id not in terms_by_lexicon:
+            terms_by_lexicon[lexicon_id] = dict(
+                Word.objects.filter(lexicon_id=lexicon_id).values_list('term', 'pk'))
+
+        conjugation.model_word_ref_id = terms_by_lexicon[lexicon_id].get(model_word)
+        if conjugation.model_word_ref_id is not None:
+            updated.append(conjugation)
+
+    VerbalConjugation.objects.bulk_update(updated, ['model_word_ref'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0014_auto_20201216_1248'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='verbalconjugation',
+            name='model_word_ref',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='linguatec_lexicon.Word'),
+        ),
+        migrations.RunPython(resolve_model_word_refs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.13 on 2026-10-17 17:05
+
+from django.db import migrations
+import linguatec_lexicon.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0015_verbalconjugation_model_word_ref'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='verbalconjugation',
+            name='parsed',
+            field=linguatec_lexicon.fields.JSONTextField(editable=False, null=True),
+        ),
+    ]
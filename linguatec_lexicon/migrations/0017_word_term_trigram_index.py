@@ -0,0 +1,30 @@
+# Generated by Django 2.2.13 on 2026-10-17 18:10
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # trigram index (used by search iregex and search_near % operator) requires PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS linguatec_lexicon_word_term_trgm "
+        "ON linguatec_lexicon_word USING gin (term gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS linguatec_lexicon_word_term_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0016_verbalconjugation_parsed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
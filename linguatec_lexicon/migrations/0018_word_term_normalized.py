@@ -0,0 +1,74 @@
+# Generated by Django 2.2.13 on 2026-10-17 19:02
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+COMBINING_TILDE = '\u0303'
+
+
+def normalize_term(term):
+    # frozen copy of linguatec_lexicon.utils.normalize_term
+    decomposed = unicodedata.normalize('NFD', term.lower())
+    chars = []
+    for char in decomposed:
+        if unicodedata.combining(char) and not (char == COMBINING_TILDE and chars and chars[-1] == 'n'):
+            continue
+        chars.append(char)
+    return unicodedata.normalize('NFC', ''.join(chars))
+
+
+def populate_term_normalized(apps, schema_editor):
+    Word = apps.get_model('linguatec_lexicon', 'Word')
+
+    qs = Word.objects.order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(qs.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        for word in batch:
+            word.term_normalized = normalize_term(word.term)
+        Word.objects.bulk_update(batch, ['term_normalized'])
+
+
+def create_trigram_index(apps, schema_editor):
+    # searches are performed over normalized term (see 0017_word_term_trigram_index)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS linguatec_lexicon_word_term_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS linguatec_lexicon_word_term_normalized_trgm "
+        "ON linguatec_lexicon_word USING gin (term_normalized gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS linguatec_lexicon_word_term_normalized_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS linguatec_lexicon_word_term_trgm "
+        "ON linguatec_lexicon_word USING gin (term gin_trgm_ops)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0017_word_term_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='term_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_term_normalized, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
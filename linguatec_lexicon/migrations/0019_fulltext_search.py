@@ -0,0 +1,95 @@
+# Generated by Django 2.2.13 on 2026-10-17 19:40
+
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations
+
+
+# (table, indexed column) of the full-text search (see WordManager.search_fulltext)
+FULLTEXT_COLUMNS = [
+    ('linguatec_lexicon_entry', 'translation'),
+    ('linguatec_lexicon_example', 'phrase'),
+]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, column in FULLTEXT_COLUMNS:
+        if vendor == 'postgresql':
+            create_search_vector(schema_editor, table, column)
+        elif vendor == 'sqlite':
+            create_fts5_table(schema_editor, table, column)
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, column in FULLTEXT_COLUMNS:
+        if vendor == 'postgresql':
+            schema_editor.execute("DROP TRIGGER IF EXISTS {0}_search ON {0}".format(table))
+            schema_editor.execute("DROP FUNCTION IF EXISTS {0}_search_update()".format(table))
+            schema_editor.execute("ALTER TABLE {0} DROP COLUMN IF EXISTS {1}_search".format(table, column))
+        elif vendor == 'sqlite':
+            for action in ['insert', 'delete', 'update']:
+                schema_editor.execute("DROP TRIGGER IF EXISTS {}_fts_{}".format(table, action))
+            schema_editor.execute("DROP TABLE IF EXISTS {}_fts".format(table))
+
+
+def create_search_vector(schema_editor, table, column):
+    """
+    Add a stored search vector column `<column>_search` (kept up to date
+    by a trigger, so bulk inserts are covered too) and its GIN index.
+
+    """
+    vector = "to_tsvector('simple', unaccent(coalesce({}, '')))"
+    schema_editor.execute("ALTER TABLE {} ADD COLUMN {}_search tsvector".format(table, column))
+    schema_editor.execute(
+        "CREATE FUNCTION {0}_search_update() RETURNS trigger AS $$ "
+        "BEGIN NEW.{1}_search := {2}; RETURN NEW; END "
+        "$$ LANGUAGE plpgsql".format(table, column, vector.format('NEW.' + column))
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER {0}_search BEFORE INSERT OR UPDATE ON {0} "
+        "FOR EACH ROW EXECUTE PROCEDURE {0}_search_update()".format(table)
+    )
+    schema_editor.execute("UPDATE {0} SET {1}_search = {2}".format(table, column, vector.format(column)))
+    schema_editor.execute(
+        "CREATE INDEX {0}_{1}_search ON {0} USING gin ({1}_search)".format(table, column))
+
+
+def create_fts5_table(schema_editor, table, column):
+    """
+    Create an external content FTS5 table `<table>_fts` synced by triggers.
+
+    NOTE: SQLite migrations which rebuild the table drop its triggers,
+    they are recreated on post_migrate (see models.create_fulltext_triggers).
+
+    """
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE {0}_fts USING fts5({1}, content='{0}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')".format(table, column)
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER {0}_fts_insert AFTER INSERT ON {0} BEGIN "
+        "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, new.{1}); END".format(table, column)
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER {0}_fts_delete AFTER DELETE ON {0} BEGIN "
+        "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, old.{1}); END".format(table, column)
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER {0}_fts_update AFTER UPDATE ON {0} BEGIN "
+        "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, old.{1}); "
+        "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, new.{1}); END".format(table, column)
+    )
+    schema_editor.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0018_word_term_normalized'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
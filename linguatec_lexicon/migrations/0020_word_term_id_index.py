@@ -0,0 +1,17 @@
+# Generated by Django 2.2.13 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0019_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='word',
+            index=models.Index(fields=['term', 'id'], name='word-term-id'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.13 on 2026-10-17 20:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import linguatec_lexicon.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linguatec_lexicon', '0020_word_term_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('command', models.CharField(choices=[('importdata', 'importdata'), ('importvariation', 'importvariation')], max_length=32)),
+                ('dry_run', models.BooleanField(default=True)),
+                ('input_file', models.CharField(max_length=255)),
+                ('input_name', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('finished', 'finished'), ('failed', 'failed')], default='pending', max_length=16)),
+                ('progress', models.PositiveIntegerField(default=0)),
+                ('errors', linguatec_lexicon.fields.JSONTextField(editable=False, null=True)),
+                ('message', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(editable=False, null=True)),
+                ('finished', models.DateTimeField(editable=False, null=True)),
+                ('lexicon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='linguatec_lexicon.Lexicon')),
+                ('variation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='linguatec_lexicon.DiatopicVariation')),
+            ],
+        ),
+    ]
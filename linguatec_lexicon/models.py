@@ -1,11 +1,132 @@
+import bisect
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
 from django.contrib.postgres.search import TrigramSimilarity
 from django.core.exceptions import ValidationError
-from django.db import connection, models
-from django.db.models import Q
-from django.utils.functional import cached_property
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 from django.urls import reverse
 
-from linguatec_lexicon import validators
+from linguatec_lexicon import cache, validators
+from linguatec_lexicon.fields import JSONTextField
+from linguatec_lexicon.utils import normalize_term
+
+
+class TrigramNear(TrigramSimilar):
+    """
+    pg_trgm % operator used by WordManager.search_near (django.contrib.postgres
+    may not be installed, so its trigram_similar lookup isn't available).
+    It has its own name to not replace trigram_similar of other apps.
+
+    """
+    lookup_name = 'trigram_near'
+
+
+models.CharField.register_lookup(TrigramNear)
+
+
+class RawSubquery(RawSQL):
+    """
+    Raw SELECT to be used as `pk__in=RawSubquery(...)`. RawSQL would be
+    parenthesized twice by the lookup, i.e. a scalar subquery.
+
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class NearQuerySet(models.QuerySet):
+    """
+    Queryset returned by WordManager.search_near: it runs its queries
+    inside WordManager.near_similarity_threshold, so the pg_trgm %
+    operator uses NEAR_MIN_SIMILARITY wherever it is evaluated.
+
+    """
+
+    def similarity_threshold(self):
+        return self.model.objects.db_manager(self.db).near_similarity_threshold()
+
+    def _fetch_all(self):
+        if self._result_cache is not None:
+            return super()._fetch_all()
+        with self.similarity_threshold():
+            super()._fetch_all()
+
+    def _iterator(self, use_chunked_fetch, chunk_size):
+        with self.similarity_threshold():
+            yield from super()._iterator(use_chunked_fetch, chunk_size)
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        with self.similarity_threshold():
+            return super().count()
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        with self.similarity_threshold():
+            return super().exists()
+
+
+class LexiconManager(models.Manager):
+    """
+    Keep an in-memory registry of the lexicons indexed by code (e.g.
+    'es-ar'). Lexicons almost never change, so it avoids querying them
+    on every search request and it's shared by the import and export
+    commands.
+
+    Unknown codes reload the registry (the lexicon could have been
+    created by another process) at most once every
+    LINGUATEC_LEXICON_REGISTRY_RELOAD_INTERVAL seconds (default: 60), so
+    requests with bogus codes don't query the whole table.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._cache = None
+        self._reloaded_at = None
+
+    def get_registry(self):
+        """Return a dict mapping code to Lexicon."""
+        if self._cache is None:
+            self._cache = {lexicon.code: lexicon for lexicon in self.all()}
+        return self._cache
+
+    def get_by_code(self, code):
+        try:
+            return self.get_registry()[code]
+        except KeyError:
+            pass
+
+        # it could have been created by another process
+        now = time.monotonic()
+        interval = getattr(settings, 'LINGUATEC_LEXICON_REGISTRY_RELOAD_INTERVAL', 60)
+        if self._reloaded_at is None or now - self._reloaded_at >= interval:
+            self.clear_cache()
+            self._reloaded_at = now
+            try:
+                return self.get_registry()[code]
+            except KeyError:
+                pass
+
+        raise self.model.DoesNotExist(
+            "Lexicon matching code '{}' does not exist.".format(code))
+
+    def clear_cache(self):
+        """Clear out the registry (it will be loaded again on demand)."""
+        self._cache = None
+        self._reloaded_at = None
 
 
 class Lexicon(models.Model):
@@ -28,6 +149,8 @@ class Lexicon(models.Model):
     src_language = models.CharField(max_length=2)
     dst_language = models.CharField(max_length=2)
 
+    objects = LexiconManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['src_language', 'dst_language'], name='src_language-dst_language')
@@ -41,16 +164,16 @@ class Lexicon(models.Model):
         return self.name
 
 
-def get_src_language_from_lexicon_code(lex_code):
-    return lex_code[:2]
-
-
-def get_dst_language_from_lexicon_code(lex_code):
-    return lex_code[3:]
-
-
 class WordManager(models.Manager):
     TERM_PUNCTUATION_SIGNS = '¡!¿?'
+    NEAR_MIN_SIMILARITY = 0.2
+    AUTOCOMPLETE_LIMIT = 10
+    FULLTEXT_EXAMPLE_WEIGHT = 0.5
+
+    def __init__(self):
+        super().__init__()
+        self._term_indexes = {}
+        self._term_indexes_version = None
 
     def _clean_search_query(self, query):
         """Handle characters which breaks or generate issues with regex expression."""
@@ -64,38 +187,98 @@ class WordManager(models.Manager):
 
         return query
 
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create doesn't call save() neither sends pre_save signal
+        objs = list(objs)
+        for word in objs:
+            set_term_normalized(Word, word)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def normalize_query(self, query):
+        return normalize_term(query.strip().strip(self.TERM_PUNCTUATION_SIGNS).strip())
+
+    def lookup(self, queries, lex=None):
+        """
+        Return the words which match exactly (ignoring case and accents)
+        any of the queries with a single query to the database.
+
+        """
+        qs = self.filter(term_normalized__in={self.normalize_query(query) for query in queries})
+        if lex:
+            qs = qs.filter(lexicon_id=Lexicon.objects.get_by_code(lex).pk)
+        return qs.order_by('term', 'pk')
+
     def search(self, query, lex=None):
+        """
+        Return the words which contain query as a whole word ignoring
+        case and accents (matched against the term_normalized column).
+
+        Exact and prefix matches are resolved by the btree index of
+        term_normalized (on PostgreSQL its varchar_pattern_ops index is
+        created by Django for LIKE 'query%'). The word boundary regex is
+        only a recheck of the candidates and matches inside the term are
+        narrowed by LIKE '%query%' (trigram index on PostgreSQL).
+
+        """
         MIN_SIMILARITY = 0.3
-        query = self._clean_search_query(query)
+        if query is None:
+            return self.none()
+        query = normalize_term(query).strip(self.TERM_PUNCTUATION_SIGNS)
+        regex_query = self._clean_search_query(query)
 
-        # Get and use the key of the Lexicon instead of the name
         if lex is None or lex == '':
-            qs = self
+            qs = self.all()
         else:
-            src = get_src_language_from_lexicon_code(lex)
-            dst = get_dst_language_from_lexicon_code(lex)
+            qs = self.filter(lexicon_id=Lexicon.objects.get_by_code(lex).pk)
 
-            key_lex = Lexicon.objects.get(src_language=src, dst_language=dst)
-            qs = self.filter(lexicon=key_lex)
         if connection.vendor == 'postgresql':
-            iregex = r"\y{0}\y"
+            boundary = r"\y"
         elif connection.vendor == 'sqlite':
-            iregex = r"\b{0}\b"
-            return qs.filter(term__iregex=iregex.format(query))
+            boundary = r"\b"
         else:
             filter_query = (
-                Q(term=query) |
-                Q(term__startswith=query) |
-                Q(term__endswith=query)
+                Q(term_normalized=query) |
+                Q(term_normalized__startswith=query) |
+                Q(term_normalized__endswith=query)
             )
             return qs.filter(filter_query)
 
-        # sort results by trigram similarity
         qs = qs.filter(
-                term__iregex=iregex.format(query)
-            ).annotate(similarity=TrigramSimilarity('term', query)
-                       ).filter(similarity__gt=MIN_SIMILARITY).order_by('-similarity')
-        return qs
+            Q(term_normalized=query) |
+            Q(term_normalized__startswith=query,
+              term_normalized__regex=r"^{0}{1}".format(regex_query, boundary)) |
+            Q(term_normalized__contains=query,
+              term_normalized__regex=r"{1}{0}{1}".format(regex_query, boundary))
+        )
+
+        if connection.vendor == 'sqlite':
+            # there is not trigram similarity: exact match and shorter terms first
+            exact_match = Case(When(term_normalized=query, then=Value(0)), default=Value(1),
+                               output_field=IntegerField())
+            return qs.order_by(exact_match, Length('term_normalized'), 'term_normalized')
+
+        # sort results by trigram similarity
+        return qs.annotate(
+            similarity=TrigramSimilarity('term_normalized', query),
+        ).filter(similarity__gt=MIN_SIMILARITY).order_by('-similarity')
+
+    @contextmanager
+    def near_similarity_threshold(self):
+        """
+        Set the threshold of the pg_trgm % operator to NEAR_MIN_SIMILARITY
+        for the current transaction (SET LOCAL). Querysets returned by
+        search_near() already evaluate inside this block (NearQuerySet).
+
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            yield
+            return
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL pg_trgm.similarity_threshold = %s", [self.NEAR_MIN_SIMILARITY])
+            yield
 
     def search_near(self, query, lex=None):
         # https://docs.djangoproject.com/en/2.1/ref/contrib/postgres/search/#trigram-similarity
@@ -103,22 +286,157 @@ class WordManager(models.Manager):
         # TODO which is the limit of similarity:
         # 0 means totally different
         # 1 means identical
-        if lex is None or lex == '':
-            qs = self
-        else:
-            src = get_src_language_from_lexicon_code(lex)
-            dst = get_dst_language_from_lexicon_code(lex)
+        if query is None:
+            return self.none()
+        query = normalize_term(query)
 
-            key_lex = Lexicon.objects.get(src_language=src, dst_language=dst)
-            qs = self.filter(lexicon=key_lex)
+        qs = NearQuerySet(self.model, using=self._db)
+        if lex is not None and lex != '':
+            qs = qs.filter(lexicon_id=Lexicon.objects.get_by_code(lex).pk)
 
-        MIN_SIMILARITY = 0.2
-        qs = qs.annotate(
-            similarity=TrigramSimilarity('term', query),
-        ).filter(similarity__gt=MIN_SIMILARITY).order_by('-similarity')
+        # % operator allows using the trigram index (its threshold is
+        # NEAR_MIN_SIMILARITY see NearQuerySet)
+        qs = qs.filter(term_normalized__trigram_near=query).annotate(
+            similarity=TrigramSimilarity('term_normalized', query),
+        ).filter(similarity__gt=self.NEAR_MIN_SIMILARITY).order_by('-similarity')
 
         return qs
 
+    def search_fulltext(self, query, lex=None):
+        """
+        Return the words whose translations or examples contain every
+        word of query (ignoring case and accents) sorted by relevance.
+        Examples are ranked lower than translations.
+
+        It uses the full-text indexes of migration 0019_fulltext_search:
+        search vector columns on PostgreSQL and FTS5 tables on SQLite.
+
+        """
+        tokens = re.findall(r'\w+', query or '')
+        if not tokens:
+            return self.none()
+
+        if lex is None or lex == '':
+            qs = self.all()
+        else:
+            qs = self.filter(lexicon_id=Lexicon.objects.get_by_code(lex).pk)
+
+        if connection.vendor == 'postgresql':
+            matches, rank = self._fulltext_postgresql(' '.join(tokens))
+        elif connection.vendor == 'sqlite':
+            # quote tokens to avoid parsing them as FTS5 operators
+            matches, rank = self._fulltext_sqlite(' '.join('"{}"'.format(token) for token in tokens))
+        else:
+            query = ' '.join(tokens)
+            return qs.filter(
+                Q(entries__translation__icontains=query) |
+                Q(entries__examples__phrase__icontains=query)
+            ).distinct().annotate(rank=Value(1.0, output_field=FloatField())).order_by('term_normalized')
+
+        return qs.filter(pk__in=matches).annotate(rank=rank).order_by('-rank', 'term_normalized')
+
+    def _fulltext_postgresql(self, query):
+        """Return (subquery of matching word ids, rank expression)."""
+        tsquery = "plainto_tsquery('simple', unaccent(%s))"
+        matches_sql = (
+            "SELECT e.word_id FROM linguatec_lexicon_entry e "
+            "WHERE e.translation_search @@ {0} "
+            "UNION SELECT e.word_id FROM linguatec_lexicon_example x "
+            "JOIN linguatec_lexicon_entry e ON e.id = x.entry_id "
+            "WHERE x.phrase_search @@ {0}"
+        ).format(tsquery)
+        rank_sql = (
+            "SELECT MAX(rank) FROM ("
+            "SELECT ts_rank(e.translation_search, {0}) AS rank FROM linguatec_lexicon_entry e "
+            "WHERE e.word_id = linguatec_lexicon_word.id AND e.translation_search @@ {0} "
+            "UNION ALL SELECT %s * ts_rank(x.phrase_search, {0}) FROM linguatec_lexicon_example x "
+            "JOIN linguatec_lexicon_entry e ON e.id = x.entry_id "
+            "WHERE e.word_id = linguatec_lexicon_word.id AND x.phrase_search @@ {0}"
+            ") AS ranks"
+        ).format(tsquery)
+        weight = self.FULLTEXT_EXAMPLE_WEIGHT
+        return (RawSubquery(matches_sql, [query, query]),
+                RawSQL(rank_sql, [query, query, weight, query, query], output_field=FloatField()))
+
+    def _fulltext_sqlite(self, query):
+        """Return (subquery of matching word ids, rank expression)."""
+        matches_sql = (
+            "SELECT e.word_id FROM linguatec_lexicon_entry_fts "
+            "JOIN linguatec_lexicon_entry e ON e.id = linguatec_lexicon_entry_fts.rowid "
+            "WHERE linguatec_lexicon_entry_fts MATCH %s "
+            "UNION SELECT e.word_id FROM linguatec_lexicon_example_fts "
+            "JOIN linguatec_lexicon_example x ON x.id = linguatec_lexicon_example_fts.rowid "
+            "JOIN linguatec_lexicon_entry e ON e.id = x.entry_id "
+            "WHERE linguatec_lexicon_example_fts MATCH %s"
+        )
+        # bm25() is lower for better matches
+        rank_sql = (
+            "SELECT MAX(rank) FROM ("
+            "SELECT -bm25(linguatec_lexicon_entry_fts) AS rank FROM linguatec_lexicon_entry_fts "
+            "JOIN linguatec_lexicon_entry e ON e.id = linguatec_lexicon_entry_fts.rowid "
+            "WHERE linguatec_lexicon_entry_fts MATCH %s AND e.word_id = linguatec_lexicon_word.id "
+            "UNION ALL SELECT %s * -bm25(linguatec_lexicon_example_fts) FROM linguatec_lexicon_example_fts "
+            "JOIN linguatec_lexicon_example x ON x.id = linguatec_lexicon_example_fts.rowid "
+            "JOIN linguatec_lexicon_entry e ON e.id = x.entry_id "
+            "WHERE linguatec_lexicon_example_fts MATCH %s AND e.word_id = linguatec_lexicon_word.id"
+            ") AS ranks"
+        )
+        weight = self.FULLTEXT_EXAMPLE_WEIGHT
+        return (RawSubquery(matches_sql, [query, query]),
+                RawSQL(rank_sql, [query, weight, query], output_field=FloatField()))
+
+    def get_term_index(self, lex=None):
+        """
+        Return the in-memory term index of the lexicon: a list of
+        (normalized term, term, id) sorted by normalized term. It is
+        loaded on demand and loaded again when the data version changes
+        (e.g. after an import run by another process).
+
+        """
+        version = cache.get_data_version()
+        if version != self._term_indexes_version:
+            self.clear_term_indexes()
+            self._term_indexes_version = version
+
+        lex = lex or ''
+        try:
+            return self._term_indexes[lex]
+        except KeyError:
+            pass
+
+        qs = self.all()
+        if lex:
+            qs = qs.filter(lexicon_id=Lexicon.objects.get_by_code(lex).pk)
+        index = sorted((normalized, term, pk) for pk, term, normalized in qs.values_list(
+            'pk', 'term', 'term_normalized'))
+        self._term_indexes[lex] = index
+        return index
+
+    def clear_term_indexes(self):
+        self._term_indexes = {}
+
+    def autocomplete(self, query, lex=None, limit=AUTOCOMPLETE_LIMIT):
+        """
+        Return a list of (id, term) of the words which start with query
+        ignoring case and accents (without querying the database once
+        the term index is loaded).
+
+        """
+        prefix = normalize_term((query or '').strip())
+        if not prefix:
+            return []
+
+        index = self.get_term_index(lex)
+        results = []
+        position = bisect.bisect_left(index, (prefix,))
+        while position < len(index) and len(results) < limit:
+            normalized, term, pk = index[position]
+            if not normalized.startswith(prefix):
+                break
+            results.append((pk, term))
+            position += 1
+        return results
+
 
 class Word(models.Model):
     """
@@ -128,11 +446,16 @@ class Word(models.Model):
     """
     lexicon = models.ForeignKey('Lexicon', on_delete=models.CASCADE, related_name="words")
     term = models.CharField(max_length=64)
+    term_normalized = models.CharField(max_length=64, db_index=True, editable=False)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['lexicon', 'term'], name='lexicon-term')
         ]
+        indexes = [
+            # keyset pagination of the API (see WordCursorPagination)
+            models.Index(fields=['term', 'id'], name='word-term-id'),
+        ]
 
     objects = WordManager()
 
@@ -140,6 +463,9 @@ class Word(models.Model):
         return self.term
 
     def gramcats(self):
+        if 'entries' in getattr(self, '_prefetched_objects_cache', {}):
+            # avoid extra queries when entries (and their gramcats) have been prefetched
+            return set(gramcat.abbreviation for entry in self.entries.all() for gramcat in entry.gramcats.all())
         return set(self.entries.values_list('gramcats__abbreviation', flat=True))
 
     @property
@@ -201,10 +527,43 @@ class Example(models.Model):
         return self.phrase
 
 
+class GramaticalCategoryManager(models.Manager):
+    """
+    Keep an in-memory registry of the gramatical categories indexed by
+    abbreviation. The table only holds a few hundred rows, so it is
+    loaded with a single query and importers can resolve abbreviations
+    of every row without hitting the database.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._cache = None
+
+    def get_registry(self):
+        """Return a dict mapping abbreviation to GramaticalCategory."""
+        if self._cache is None:
+            self._cache = {gramcat.abbreviation: gramcat for gramcat in self.all()}
+        return self._cache
+
+    def get_by_abbreviation(self, abbr):
+        try:
+            return self.get_registry()[abbr]
+        except KeyError:
+            raise self.model.DoesNotExist(
+                "GramaticalCategory matching abbreviation '{}' does not exist.".format(abbr))
+
+    def clear_cache(self):
+        """Clear out the registry (it will be loaded again on demand)."""
+        self._cache = None
+
+
 class GramaticalCategory(models.Model):
     abbreviation = models.CharField(unique=True, max_length=64)
     title = models.CharField(max_length=128)
 
+    objects = GramaticalCategoryManager()
+
     class Meta:
         verbose_name_plural = "gramatical categories"
 
@@ -212,15 +571,76 @@ class GramaticalCategory(models.Model):
         return self.abbreviation
 
 
+class ImportJob(models.Model):
+    """
+    Execution of an importer command (importdata or importvariation)
+    in background, see linguatec_lexicon.jobs
+
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FINISHED = 'finished'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'pending'),
+        (STATUS_RUNNING, 'running'),
+        (STATUS_FINISHED, 'finished'),
+        (STATUS_FAILED, 'failed'),
+    ]
+    COMMAND_CHOICES = [
+        ('importdata', 'importdata'),
+        ('importvariation', 'importvariation'),
+    ]
+
+    # not sequential so other's jobs cannot be guessed
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    command = models.CharField(max_length=32, choices=COMMAND_CHOICES)
+    lexicon = models.ForeignKey('Lexicon', on_delete=models.CASCADE, related_name="import_jobs")
+    variation = models.ForeignKey('DiatopicVariation', null=True, blank=True, on_delete=models.CASCADE,
+                                  related_name="+")
+    dry_run = models.BooleanField(default=True)
+    # path of the uploaded file (removed once the job is done)
+    input_file = models.CharField(max_length=255)
+    input_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # number of rows processed
+    progress = models.PositiveIntegerField(default=0)
+    errors = JSONTextField(null=True, editable=False)
+    message = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, editable=False)
+    finished = models.DateTimeField(null=True, editable=False)
+
+    def __str__(self):
+        return '{} {} ({})'.format(self.command, self.input_name, self.status)
+
+    @property
+    def is_done(self):
+        return self.status in [self.STATUS_FINISHED, self.STATUS_FAILED]
+
+
 class VerbalConjugation(models.Model):
     KEYWORD_MODEL = "modelo. conjug."
     KEYWORD_CONJUGATION = "conjug."
 
     entry = models.OneToOneField('Entry', on_delete=models.CASCADE, related_name="conjugation")
     raw = models.TextField('Raw imported content.')
-
-    @cached_property
-    def parse_raw(self):
+    # resolved on importation (or running manage.py updateconjugations)
+    model_word_ref = models.ForeignKey('Word', null=True, editable=False,
+                                       on_delete=models.SET_NULL, related_name="+")
+    # parse_raw() output stored to avoid parsing raw content on every request
+    parsed = JSONTextField(null=True, editable=False)
+
+    def parse(self, strict=False):
+        """
+        Split raw content into intro and verbal model or conjugation.
+
+        Raise ValidationError if the reference to the model verb is
+        unformated. Partial conjugations (or raw content without any
+        keyword) are kept as intro (see #66) unless strict is True, when
+        they are rejected as validators.validate_column_verb_conjugation does.
+
+        """
         beg = None
         parsed = {}
         raw_lowcase = self.raw.lower()
@@ -236,14 +656,59 @@ class VerbalConjugation(models.Model):
             try:
                 conjugation = validators.VerbalConjugationValidator()(self.raw)
             except ValidationError:
+                if strict:
+                    raise
                 beg = None
             else:
                 parsed["conjugation"] = conjugation
 
+        elif strict:
+            raise ValidationError(validators.MISSING_KEYWORD_MESSAGE)
+
         parsed["intro"] = self.raw[:beg].strip()
 
         return parsed
 
+    def parse_partial(self):
+        """
+        Parse raw content keeping it as intro when the reference to
+        the model verb is unformated (allowed on partial imports).
+
+        """
+        try:
+            return self.parse()
+        except ValidationError:
+            return {"intro": self.raw.strip()}
+
+    @property
+    def parse_raw(self):
+        # rows imported before storing parsed content (see manage.py updateconjugations)
+        if self.parsed is None:
+            self.parsed = self.parse_partial()
+        return self.parsed
+
+    def clean(self):
+        try:
+            self.parse()
+        except ValidationError as e:
+            raise ValidationError({'raw': e.messages})
+
+    def save(self, *args, **kwargs):
+        # keep parsed content and model word in sync with raw content
+        # (unformated content is stored as before, full_clean() rejects it)
+        self.parsed = self.parse_partial()
+        self.resolve_model_word()
+        super().save(*args, **kwargs)
+
+    def resolve_model_word(self):
+        """Link the conjugation to the Word of its model verb (on the same lexicon)."""
+        if self.model_word is None:
+            self.model_word_ref = None
+        else:
+            self.model_word_ref_id = Word.objects.filter(
+                lexicon__words__entries=self.entry_id, term=self.model_word,
+            ).values_list('pk', flat=True).first()
+
     @property
     def intro(self):
         return self.parse_raw.get('intro', None)
@@ -262,10 +727,97 @@ class VerbalConjugation(models.Model):
 
     @property
     def model_word_id(self):
-        if self.model_word is None:
-            return None
-        try:
-            return Word.objects.get(term=self.model_word, lexicon=self.entry.word.lexicon).pk
-        except Word.DoesNotExist:
-            # TODO log this error to detect database inconsistency
-            return None
+        return self.model_word_ref_id
+
+
+def clear_lexicon_cache(sender, **kwargs):
+    Lexicon.objects.clear_cache()
+
+
+post_save.connect(clear_lexicon_cache, sender=Lexicon)
+post_delete.connect(clear_lexicon_cache, sender=Lexicon)
+
+
+def clear_gramcat_cache(sender, **kwargs):
+    GramaticalCategory.objects.clear_cache()
+
+
+post_save.connect(clear_gramcat_cache, sender=GramaticalCategory)
+post_delete.connect(clear_gramcat_cache, sender=GramaticalCategory)
+
+
+def bump_data_version(sender, **kwargs):
+    """Invalidate the cached search responses when lexicon data changes."""
+    cache.bump_data_version_on_commit(kwargs.get('using'))
+
+
+for model in [Lexicon, Word, Region, DiatopicVariation, Entry, Example, GramaticalCategory, VerbalConjugation]:
+    post_save.connect(bump_data_version, sender=model)
+
+# delete receivers disable fast deletes (every row is loaded to send its
+# signal) so they aren't connected to the models deleted by cascade
+# (entries, examples, conjugations and their gramcats): the admin and the
+# importers bump the data version when they delete them.
+for model in [Lexicon, Word, Region, DiatopicVariation, GramaticalCategory]:
+    post_delete.connect(bump_data_version, sender=model)
+
+
+def set_term_normalized(sender, instance, **kwargs):
+    """Keep term_normalized in sync with term (also on fixtures loading)."""
+    instance.term_normalized = normalize_term(instance.term)
+
+
+pre_save.connect(set_term_normalized, sender=Word)
+
+
+# (table, indexed column) of the SQLite full-text search (see 0019_fulltext_search)
+FULLTEXT_COLUMNS = [
+    ('linguatec_lexicon_entry', 'translation'),
+    ('linguatec_lexicon_example', 'phrase'),
+]
+
+
+def fts5_triggers(table, column):
+    """Return (name, SQL) of the triggers which sync the FTS5 table of table."""
+    return [
+        ("{}_fts_insert".format(table),
+         "CREATE TRIGGER IF NOT EXISTS {0}_fts_insert AFTER INSERT ON {0} BEGIN "
+         "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, new.{1}); END".format(table, column)),
+        ("{}_fts_delete".format(table),
+         "CREATE TRIGGER IF NOT EXISTS {0}_fts_delete AFTER DELETE ON {0} BEGIN "
+         "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, old.{1}); END".format(table, column)),
+        ("{}_fts_update".format(table),
+         "CREATE TRIGGER IF NOT EXISTS {0}_fts_update AFTER UPDATE ON {0} BEGIN "
+         "INSERT INTO {0}_fts({0}_fts, rowid, {1}) VALUES ('delete', old.id, old.{1}); "
+         "INSERT INTO {0}_fts(rowid, {1}) VALUES (new.id, new.{1}); END".format(table, column)),
+    ]
+
+
+def create_fulltext_triggers(sender, app_config=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Recreate the triggers of the SQLite FTS5 tables after migrate:
+    migrations which rebuild a table (e.g. AlterField) drop its triggers.
+
+    """
+    if app_config is None or app_config.label != 'linguatec_lexicon':
+        return
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        tables = db.introspection.table_names(cursor)
+        for table, column in FULLTEXT_COLUMNS:
+            if table + '_fts' not in tables:
+                continue
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [table])
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [sql for name, sql in fts5_triggers(table, column) if name not in existing]
+            if not missing:
+                continue
+            for sql in missing:
+                cursor.execute(sql)
+            # rows changed while the triggers were missing aren't indexed
+            cursor.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+post_migrate.connect(create_fulltext_triggers)
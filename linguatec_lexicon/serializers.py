@@ -1,7 +1,8 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from .models import (DiatopicVariation, Entry, Example, GramaticalCategory,
-                     VerbalConjugation, Word, Lexicon)
+                     ImportJob, VerbalConjugation, Word, Lexicon)
 
 
 class ExampleSerializer(serializers.ModelSerializer):
@@ -32,6 +33,13 @@ class DiatopicVariationSerializer(serializers.ModelSerializer):
 
 
 class EntrySerializer(serializers.ModelSerializer):
+    """
+    Serialize an entry and its nested blocks, `expand` argument limits
+    the nested blocks (all by default) e.g. expand=['gramcats'].
+
+    """
+    EXPANDABLE_FIELDS = ('variation', 'gramcats', 'examples', 'conjugation')
+
     gramcats = GramaticalCategorySerializer(many=True, read_only=True)
     examples = ExampleSerializer(many=True, read_only=True)
     conjugation = VerbalConjugationSerializer()
@@ -42,8 +50,20 @@ class EntrySerializer(serializers.ModelSerializer):
         fields = ('id', 'variation', 'gramcats', 'translation',
                   'examples', 'conjugation')
 
+    def __init__(self, *args, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if expand is not None:
+            for name in set(self.EXPANDABLE_FIELDS) - set(expand):
+                self.fields.pop(name)
+
 
 class WordSerializer(serializers.ModelSerializer):
+    """
+    Serialize a word with its entries. The representation can be reduced
+    with `fields` (e.g. ['term', 'entries']) and `expand` (nested blocks
+    of the entries, see EntrySerializer) arguments.
+
+    """
     entries = EntrySerializer(many=True, read_only=True)
     gramcats = serializers.ListField(read_only=True)
 
@@ -51,6 +71,40 @@ class WordSerializer(serializers.ModelSerializer):
         model = Word
         fields = ('url', 'lexicon', 'term', 'gramcats', 'entries', 'admin_panel_url')
 
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None and 'entries' in self.fields:
+            self.fields['entries'] = EntrySerializer(many=True, read_only=True, expand=expand)
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """
+        Prefetch the nested objects to avoid querying them for each word
+        (only the ones serialized using the same fields and expand).
+
+        """
+        if fields is not None and not {'entries', 'gramcats'} & set(fields):
+            return queryset
+        serialize_entries = fields is None or 'entries' in fields
+        if expand is None or not serialize_entries:
+            expand = EntrySerializer.EXPANDABLE_FIELDS if serialize_entries else ()
+
+        entries = Entry.objects.all()
+        related = [path for name, path in [('conjugation', 'conjugation'), ('variation', 'variation__region')]
+                   if name in expand]
+        if related:
+            entries = entries.select_related(*related)
+        lookups = [Prefetch('entries', queryset=entries)]
+        # gramcats of the word are calculated using gramcats of its entries
+        if 'gramcats' in expand or fields is None or 'gramcats' in fields:
+            lookups.append('entries__gramcats')
+        if 'examples' in expand:
+            lookups.append('entries__examples')
+        return queryset.prefetch_related(*lookups)
+
 
 class WordNearSerializer(serializers.ModelSerializer):
     class Meta:
@@ -62,3 +116,14 @@ class LexiconSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lexicon
         fields = ('id', 'code', 'src_language', 'dst_language')
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    lexicon = serializers.SlugRelatedField(slug_field='code', read_only=True)
+    errors = serializers.JSONField(read_only=True)
+    results = serializers.HyperlinkedIdentityField(view_name='validator-job')
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'command', 'lexicon', 'dry_run', 'input_name', 'status', 'progress',
+                  'errors', 'message', 'created', 'started', 'finished', 'results')
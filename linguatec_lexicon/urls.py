@@ -8,9 +8,11 @@ router = routers.DefaultRouter()
 router.register(r'lexicons', views.LexiconViewSet)
 router.register(r'words', views.WordViewSet)
 router.register(r'gramcats', views.GramaticalCategoryViewSet)
+router.register(r'jobs', views.ImportJobViewSet)
 
 urlpatterns = [
     url(r'^', include(router.urls)),
     path('validator/', views.DataValidatorView.as_view(), name='validator'),
     path('validator-diatopic-variation/', views.DiatopicVariationValidatorView.as_view(), name='validator-variation'),
+    path('validator/jobs/<uuid:pk>/', views.ImportJobView.as_view(), name='validator-job'),
 ]
@@ -0,0 +1,63 @@
+import multiprocessing
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+COMBINING_TILDE = '\u0303'
+
+
+def normalize_term(term):
+    """
+    Fold case and accents of the term (e.g. 'Árbol' -> 'arbol') keeping
+    'ñ' because it is a letter on its own (e.g. 'año' and 'ano').
+
+    """
+    decomposed = unicodedata.normalize('NFD', term.lower())
+    chars = []
+    for char in decomposed:
+        if unicodedata.combining(char) and not (char == COMBINING_TILDE and chars and chars[-1] == 'n'):
+            continue
+        chars.append(char)
+    return unicodedata.normalize('NFC', ''.join(chars))
+
+
+def shard(items, key, count):
+    """Split items into count lists keeping together the items with the same key."""
+    shards = [[] for _ in range(count)]
+    for item in items:
+        shards[hash(key(item)) % count].append(item)
+    return shards
+
+
+# function run by the worker processes of map_shards (set by _init_worker)
+_worker_function = None
+
+
+def _init_worker(function):
+    global _worker_function
+    _worker_function = function
+
+
+def _run_worker(items):
+    return _worker_function(items)
+
+
+def can_fork():
+    """Return whether map_shards can run (fork isn't available e.g. on Windows)."""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def map_shards(function, shards, jobs):
+    """
+    Return the results of function(shard) for each shard computed on a
+    pool of `jobs` processes.
+
+    Workers are forked, so function can be a bound method which uses the
+    state loaded by the parent process (e.g. in-memory registries) but it
+    shouldn't query the database. Only the shards and the results are
+    pickled.
+
+    """
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                             initializer=_init_worker, initargs=(function,)) as executor:
+        return list(executor.map(_run_worker, shards))
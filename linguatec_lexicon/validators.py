@@ -11,6 +11,9 @@ from django.utils.translation import gettext_lazy as _
 
 logger = logging.getLogger(__name__)
 
+MISSING_KEYWORD_MESSAGE = _('Missing keyword. Verb should have '
+                            'conjugation or link to another verb as model.')
+
 
 def validate_column_verb_conjugation(value):
     """
@@ -33,8 +36,7 @@ def validate_column_verb_conjugation(value):
     elif VerbalConjugation.KEYWORD_CONJUGATION in value_lowered:
         cleaned_data['conjugation'] = VerbalConjugationValidator()(value)
     else:
-        raise ValidationError(_('Missing keyword. Verb should have '
-                                'conjugation or link to another verb as model.'))
+        raise ValidationError(MISSING_KEYWORD_MESSAGE)
 
     return cleaned_data
 
@@ -86,6 +88,7 @@ class VerbalConjugationValidator:
         GERUND: 1,
         PARTICIPLE: 1,
     }
+    STUFF_CHARS = string.punctuation + string.whitespace
     message = _('Enter a valid verbal conjugation.')
     code = 'invalid'
 
@@ -96,9 +99,11 @@ class VerbalConjugationValidator:
             self.code = code
 
     def __call__(self, value):
+        slots = self.tokenize(value)
+
         # Validate that all the moods are present
         for mood in self.MOODS:
-            if mood not in value:
+            if (mood, '') not in slots:
                 raise ValidationError(_('Verbal mood %s not found.') % mood)
 
         # Validate that conjugations are complete
@@ -106,50 +111,66 @@ class VerbalConjugationValidator:
         cleaned_data = collections.OrderedDict()
         for mood in self.MOODS:
             current_mood = collections.OrderedDict()
-            mood_value = self.extract_mood(value, mood)
             for tense in self.MOOD_TENSES[mood]:
                 count = self.MOOD_NUMBER_OF_CONJUGATIONS[mood]
                 conjugation = self.validate_number_of_conjugations(
-                    mood_value, mood, tense, count)
+                    self.extract_tense(value, mood, tense, slots), mood, tense, count)
                 current_mood[tense] = conjugation
             cleaned_data[mood] = current_mood
 
         return cleaned_data
 
-    def extract_mood(self, value, mood):
-        mood_idx = self.MOODS.index(mood)
-        next_mood = self.MOODS[mood_idx + 1] if mood_idx + \
-            1 < len(self.MOODS) else None
-        beg = value.find(mood)
-        end = value.find(next_mood) if next_mood is not None else None
+    def tokenize(self, value):
+        """
+        Split value into (mood, tense) slots in a single scan: moods and
+        tenses are searched in order, each one from the end of the
+        previous one (tenses only up to the next mood).
+
+        Return a dict mapping each (mood, tense) found to its raw
+        content. Moods without tenses (and the text between a mood and
+        its first tense) are stored as (mood, '').
 
-        return value[beg:end].lstrip(mood).strip()
+        """
+        moods = []
+        pos = 0
+        for mood in self.MOODS:
+            beg = value.find(mood, pos)
+            if beg != -1:
+                pos = beg + len(mood)
+                moods.append((mood, beg, pos))
+
+        slots = {}
+        for i, (mood, mood_beg, pos) in enumerate(moods):
+            mood_end = moods[i + 1][1] if i + 1 < len(moods) else len(value)
+            current_slot = (mood, '')
+            for tense in self.MOOD_TENSES[mood]:
+                beg = value.find(tense, pos, mood_end) if tense else -1
+                if beg != -1:
+                    slots[current_slot] = value[pos:beg]
+                    current_slot = (mood, tense)
+                    pos = beg + len(tense)
+            slots[current_slot] = value[pos:mood_end]
 
-    def extract_tense(self, value, mood, tense):
-        # TODO merge with extract_mood??
-        mood_tenses = self.MOOD_TENSES[mood]
-        tense_idx = mood_tenses.index(tense)
-        next_tense = mood_tenses[tense_idx +
-                                 1] if tense_idx + 1 < len(mood_tenses) else None
-        beg = value.find(tense) + len(tense)
-        end = value.find(next_tense, beg) if next_tense is not None else None
+        return slots
 
-        return value[beg:end].strip().rstrip(';')
+    def extract_tense(self, value, mood, tense, slots=None):
+        """Return the content of the tense (slots of value can be passed if already tokenized)."""
+        if slots is None:
+            slots = self.tokenize(value)
+        return slots.get((mood, tense), '').strip().rstrip(';')
 
     def extract_conjugation(self, value):
-        stuff_chars = string.punctuation + string.whitespace
-        conjugation = [x.strip(stuff_chars) for x in value.split(',')]
-        return conjugation
+        # stripping punctuation also removes trailing ';' of the tense
+        return [x.strip(self.STUFF_CHARS) for x in value.split(',')]
 
     def validate_number_of_conjugations(self, value, mood, tense, count):
-        value = self.extract_tense(value, mood, tense)
         conjugation = self.extract_conjugation(value)
         if len(conjugation) != count:
             raise ValidationError(
                 _('Invalid number of conjugations for %s - %s. Should be %d. %s found'
                   % (mood, tense, count, len(conjugation))))
 
-        logger.debug("%s %s: %s" % (mood, tense, conjugation))
+        logger.debug("%s %s: %s", mood, tense, conjugation)
 
         return conjugation
 
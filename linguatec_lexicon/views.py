@@ -1,24 +1,33 @@
 import json
 import os
 import tempfile
-from io import StringIO
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
 
-from django.core.management import call_command
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.shortcuts import get_object_or_404, redirect
 from django.views.generic.base import TemplateView
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from . import cache, jobs
 from .forms import ValidatorForm
-from .models import GramaticalCategory, Word, Lexicon
-from .serializers import GramaticalCategorySerializer, WordSerializer, WordNearSerializer, LexiconSerializer
+from .models import GramaticalCategory, ImportJob, Word, Lexicon
+from .serializers import (GramaticalCategorySerializer, ImportJobSerializer, WordSerializer, WordNearSerializer,
+                          LexiconSerializer)
 
 
 class DataValidatorView(TemplateView):
     template_name = "linguatec_lexicon/datavalidator.html"
     title = "Data validator"
+    command = 'importdata'
 
     def post(self, request, *args, **kwargs):
         context = self.get_context_data(**kwargs)
@@ -27,27 +36,22 @@ class DataValidatorView(TemplateView):
         if form.is_valid():
             xlsx_file = form.cleaned_data['input_file']
 
-            # store uploaded file as a temporal file
+            # store uploaded file as a temporal file (removed by the job)
             tmp_fd, tmp_file = tempfile.mkstemp(suffix='.xlsx')
-            f = os.fdopen(tmp_fd, 'wb')  # open the tmp file for writing
-            f.write(xlsx_file.read())  # write the tmp file
-            f.close()
-
-            # validate uploaded file and handle errors (if any)
-            out = self.validate(tmp_file)
-            errors = []
-            for line in out.getvalue().split('\n'):
-                try:
-                    data = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                errors.append(data)
-
-            context.update({
-                'errors': errors,
-                'input_file': xlsx_file,
-            })
-            return self.render_to_response(context)
+            with os.fdopen(tmp_fd, 'wb') as f:
+                for chunk in xlsx_file.chunks():
+                    f.write(chunk)
+
+            # validate uploaded file in background
+            job = ImportJob.objects.create(
+                command=self.command,
+                lexicon=form.cleaned_data['lexicon'],
+                dry_run=True,
+                input_file=tmp_file,
+                input_name=xlsx_file.name,
+            )
+            jobs.submit(job)
+            return redirect('validator-job', pk=job.pk)
 
         context['form'] = form
         return self.render_to_response(context)
@@ -60,24 +64,175 @@ class DataValidatorView(TemplateView):
         })
         return context
 
-    def validate(self, xlsx_file):
-        out = StringIO()
-        call_command('importdata', xlsx_file, dry_run=True, no_color=True, verbosity=3, stdout=out)
-        return out
-
 
 class DiatopicVariationValidatorView(DataValidatorView):
     title = "Diatopic variation validator"
+    command = 'importvariation'
+
 
-    def validate(self, xlsx_file):
-        out = StringIO()
-        call_command('importvariation', xlsx_file, dry_run=True, no_color=True, verbosity=3, stdout=out)
-        return out
+class ImportJobView(TemplateView):
+    """Progress and results (once finished) of a validation job."""
+    template_name = "linguatec_lexicon/importjob.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        job = get_object_or_404(ImportJob.objects.select_related('lexicon'), pk=kwargs['pk'])
+        context.update({
+            'job': job,
+            'title': 'Validation of {}'.format(job.input_name),
+            'errors': job.errors or [],
+        })
+        return context
 
 
 class DefaultLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination where the `count` param chooses how the
+    total number of items is calculated:
+    - exact (default): COUNT(*) of the whole queryset.
+    - capped: stop counting after `count_cap` items.
+    - estimate: planner estimate on PostgreSQL (capped on other backends).
+    - none: don't count (null), only next link is provided.
+    When the last page is reached the count is always exact.
+
+    """
     default_limit = 30
     max_limit = 100
+    count_query_param = 'count'
+    count_cap = 1000
+    COUNT_MODES = {
+        'exact': 'exact', 'true': 'exact', '1': 'exact',
+        'capped': 'capped',
+        'estimate': 'estimate',
+        'none': 'none', 'false': 'none', '0': 'none',
+    }
+
+    def get_count_mode(self, request, default='exact'):
+        value = request.query_params.get(self.count_query_param, '').lower()
+        return self.COUNT_MODES.get(value, default)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(request)
+        if self.count_mode == 'exact':
+            self.has_next = None
+            return super().paginate_queryset(queryset, request, view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+
+        # retrieve an extra item to know if there is a next page
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        results = results[:self.limit]
+
+        if not self.has_next and (results or not self.offset):
+            # last page: count is already known
+            self.count = self.offset + len(results)
+        else:
+            self.count = self.count_queryset(queryset, self.count_mode)
+            if self.count is not None:
+                self.count = max(self.count, self.offset + len(results) + int(self.has_next))
+        return results
+
+    def count_queryset(self, queryset, count_mode):
+        if count_mode == 'exact':
+            return self.get_count(queryset)
+        if count_mode == 'none':
+            return None
+        if count_mode == 'estimate' and connections[queryset.db].vendor == 'postgresql':
+            return self.estimate_count(queryset)
+        # ordering is not required to count (and could sort every row)
+        return queryset.order_by()[:self.count_cap].count()
+
+    def estimate_count(self, queryset):
+        """Return the number of rows estimated by PostgreSQL query planner."""
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        return plan[0]['Plan']['Plan Rows']
+
+    def get_next_link(self):
+        if self.has_next is None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+
+class WordCursorPagination(DefaultLimitOffsetPagination):
+    """
+    Limit/offset pagination which switches to keyset pagination on
+    (term, id) when the `cursor` param is passed to the list (an empty
+    value for the first page). Deep pages don't require an OFFSET scan
+    and the items are only counted if `count` param is passed.
+
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (self.cursor_query_param in request.query_params and
+                       getattr(view, 'action', None) == 'list')
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('term', 'pk')
+        self.count = self.count_queryset(queryset, self.get_count_mode(request, default='none'))
+
+        if position is not None:
+            term, pk = position
+            queryset = queryset.filter(Q(term__gt=term) | Q(term=term, pk__gt=pk))
+
+        # retrieve an extra item to know if there is a next page
+        results = list(queryset[:self.limit + 1])
+        self.next_position = None
+        if len(results) > self.limit:
+            results = results[:self.limit]
+            self.next_position = (results[-1].term, results[-1].pk)
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        response_data = OrderedDict()
+        if self.count is not None:
+            response_data['count'] = self.count
+        response_data['next'] = self.get_next_cursor_link()
+        response_data['results'] = data
+        return Response(response_data)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return None
+
+        try:
+            term, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return str(term), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
 
 
 class LexiconViewSet(viewsets.ReadOnlyModelViewSet):
@@ -93,9 +248,32 @@ class WordViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows words to be viewed.
     """
-    queryset = Word.objects.all().order_by('term')
+    queryset = Word.objects.all().order_by('term', 'pk')
     serializer_class = WordSerializer
-    pagination_class = DefaultLimitOffsetPagination
+    pagination_class = WordCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return WordSerializer.setup_eager_loading(queryset, **self.get_serializer_options())
+
+    def get_serializer_options(self):
+        """
+        Return `fields` and `expand` params as lists (None when they
+        aren't passed) e.g. ?fields=term,entries&expand=gramcats
+
+        """
+        options = {}
+        for param in ['fields', 'expand']:
+            value = self.request.query_params.get(param)
+            if value is not None:
+                value = [name.strip() for name in value.split(',') if name.strip()]
+            options[param] = value
+        return options
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is WordSerializer:
+            kwargs.update(self.get_serializer_options())
+        return super().get_serializer(*args, **kwargs)
 
     @action(detail=False)
     def near(self, request):
@@ -103,15 +281,11 @@ class WordViewSet(viewsets.ReadOnlyModelViewSet):
         query = self.request.query_params.get('q', None)
         lex = self.request.query_params.get('l', '')
         lex = lex.strip()
-        queryset = Word.objects.search_near(query, lex)
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        def get_queryset():
+            return Word.objects.search_near(query, lex)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.cached_paginated_response('near', query, lex, get_queryset)
 
     @action(detail=False)
     def search(self, request):
@@ -120,14 +294,135 @@ class WordViewSet(viewsets.ReadOnlyModelViewSet):
         if query is not None:
             query = query.strip()
         lex = lex.strip()
-        queryset = Word.objects.search(query, lex)
-        page = self.paginate_queryset(queryset)
-        if page is not None:
+
+        def get_queryset():
+            return WordSerializer.setup_eager_loading(
+                Word.objects.search(query, lex), **self.get_serializer_options())
+
+        return self.cached_paginated_response('search', query, lex, get_queryset)
+
+    @action(detail=False, methods=['get', 'post'])
+    def lookup(self, request):
+        """
+        Look up several terms at once (exact match ignoring case and
+        accents): repeated `q` params or a list `q` on the POST body.
+
+        """
+        if request.method == 'POST':
+            data = request.data
+            terms = data.getlist('q') if hasattr(data, 'getlist') else data.get('q', [])
+            lex = data.get('l', None) or request.query_params.get('l', '')
+        else:
+            terms = request.query_params.getlist('q')
+            lex = request.query_params.get('l', '')
+        if not isinstance(lex, str):
+            raise ValidationError({'l': 'Expected a lexicon code.'})
+        lex = lex.strip()
+
+        if isinstance(terms, str):
+            terms = [terms]
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            raise ValidationError({'q': 'Expected a list of terms.'})
+        max_terms = getattr(settings, 'LINGUATEC_LEXICON_LOOKUP_MAX_TERMS', 100)
+        if len(terms) > max_terms:
+            raise ValidationError({'q': 'Ensure there are no more than {} terms.'.format(max_terms)})
+
+        try:
+            queryset = Word.objects.lookup(terms, lex)
+        except Lexicon.DoesNotExist as e:
+            raise NotFound(str(e))
+
+        words_by_term = {}
+        for word in WordSerializer.setup_eager_loading(queryset, **self.get_serializer_options()):
+            words_by_term.setdefault(word.term_normalized, []).append(word)
+
+        results = []
+        for term in terms:
+            words = words_by_term.get(Word.objects.normalize_query(term), [])
+            serializer = self.get_serializer(words, many=True)
+            results.append(OrderedDict([('q', term), ('results', serializer.data)]))
+        return Response(results)
+
+    @action(detail=False)
+    def fulltext(self, request):
+        query = self.request.query_params.get('q', None)
+        lex = self.request.query_params.get('l', '')
+        lex = lex.strip()
+
+        def get_queryset():
+            return WordSerializer.setup_eager_loading(
+                Word.objects.search_fulltext(query, lex), **self.get_serializer_options())
+
+        return self.cached_paginated_response('fulltext', query, lex, get_queryset)
+
+    @action(detail=False)
+    def autocomplete(self, request):
+        query = self.request.query_params.get('q', '')
+        lex = self.request.query_params.get('l', '')
+        lex = lex.strip()
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = Word.objects.AUTOCOMPLETE_LIMIT
+        limit = max(0, min(limit, self.paginator.max_limit))
+
+        try:
+            words = Word.objects.autocomplete(query, lex, limit)
+        except Lexicon.DoesNotExist as e:
+            raise NotFound(str(e))
+
+        results = [
+            {
+                'url': reverse('word-detail', kwargs={'pk': pk}, request=request),
+                'id': pk,
+                'term': term,
+            }
+            for pk, term in words
+        ]
+        return Response(results)
+
+    @action(detail=False, url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(cache.get_stats())
+
+    def cached_paginated_response(self, endpoint, query, lex, get_queryset):
+        """
+        Return the paginated response of the queryset keeping the page
+        (count, next page flag and serialized results) on the cache.
+
+        """
+        paginator = self.paginator
+        limit = paginator.get_limit(self.request)
+        offset = paginator.get_offset(self.request)
+        count_mode = paginator.get_count_mode(self.request)
+        # serialized data includes absolute URLs (scheme and host of the request)
+        key = cache.make_key(endpoint, query, lex, limit, offset, count_mode, self.get_serializer_options(),
+                             self.request.build_absolute_uri('/'))
+
+        data = cache.get_response(key)
+        if data is None:
+            try:
+                queryset = get_queryset()
+            except Lexicon.DoesNotExist as e:
+                raise NotFound(str(e))
+            page = self.paginate_queryset(queryset)
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            data = {'count': paginator.count, 'has_next': paginator.has_next, 'results': serializer.data}
+            cache.set_response(key, data)
+            status = 'MISS'
+        else:
+            # restore paginator state to build next & previous links
+            paginator.request = self.request
+            paginator.limit = limit
+            paginator.offset = offset
+            paginator.count_mode = count_mode
+            paginator.count = data['count']
+            paginator.has_next = data['has_next']
+            status = 'HIT'
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        response = self.get_paginated_response(data['results'])
+        response['X-Cache'] = status
+        return response
 
 
 class GramaticalCategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -146,3 +441,11 @@ class GramaticalCategoryViewSet(viewsets.ReadOnlyModelViewSet):
 
         serializer = self.get_serializer(gramcat)
         return Response(serializer.data)
+
+
+class ImportJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    API endpoint to poll the status and progress of an import job.
+    """
+    queryset = ImportJob.objects.select_related('lexicon')
+    serializer_class = ImportJobSerializer
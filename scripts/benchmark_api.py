@@ -0,0 +1,317 @@
+#! /usr/bin/env python
+"""
+Benchmark of the API endpoints: latency (p50/p95) and number of SQL
+queries of each endpoint against a synthetic lexicon.
+
+A test database is created (and destroyed at the end) using the database
+defined on the settings module, so it can be run against SQLite and
+PostgreSQL (search/near endpoints require PostgreSQL trigram extension):
+
+    python scripts/benchmark_api.py --settings tests.settings_sqlite
+    python scripts/benchmark_api.py --settings tests.settings_postgres --words 10000
+
+Results are printed (or written to --output) as JSON (including the
+query plans of search and near with and without the trigram index when
+--explain is passed). When a previous
+result is passed as --baseline, the script exits with error if any
+endpoint runs more queries or its p95 latency is greater than the
+baseline one plus --tolerance.
+
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+GRAMCATS = [
+    ('s. m.', 'sustantivo masculino'),
+    ('s. f.', 'sustantivo femenino'),
+    ('adj.', 'adjetivo'),
+    ('adv.', 'adverbio'),
+    ('v. tr.', 'verbo transitivo'),
+    ('v. intr.', 'verbo intransitivo'),
+]
+VERB_GRAMCATS = ['v. tr.', 'v. intr.']
+
+SYLLABLES = ['a', 'ba', 'bi', 'ca', 'che', 'do', 'es', 'fa', 'ga', 'la', 'lo', 'ma',
+             'na', 'ño', 'pa', 'que', 'ra', 'rri', 'sa', 'ta', 'to', 'tza', 'u', 'za']
+
+CONJUGATION = (
+    "Es verbo regular de la 2ª conjugación. conjug. IND. pres. bebo, bebes, bebe, "
+    "bebemos, bebez, beben; pret. imp. bebeba, bebebas, bebeba, bebébanos, bebébaz, "
+    "bebeban; pret. indef. bebié, bebiés, bebió, bebiemos, bebiez, bebioron; fut. "
+    "beberé, beberás, beberá, beberemos, beberez, beberán; cond. beberba, beberbas, "
+    "beberba, bebérbanos, bebérbaz, beberban; SUBJ. pres. beba, bebas, beba, bebamos, "
+    "bebaz, beban; pret. imp. bebese, bebeses, bebese, bebésenos, bebésez, bebesen; "
+    "IMP. bebe, bebez; INF. beber; GER. bebendo. PART. bebito/a."
+)
+
+
+def percentile(values, percent):
+    """Return the percentile of values using the nearest-rank method."""
+    values = sorted(values)
+    rank = max(0, int(round(percent / 100 * len(values) + 0.5)) - 1)
+    return values[min(rank, len(values) - 1)]
+
+
+def random_term(rng, used):
+    while True:
+        term = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.1:
+            term += ' ' + ''.join(rng.choice(SYLLABLES) for _ in range(2))
+        if term not in used:
+            used.add(term)
+            return term
+
+
+def populate(options):
+    """Create a synthetic lexicon and return the data used to build the requests."""
+    from linguatec_lexicon.models import (
+        DiatopicVariation, Entry, Example, GramaticalCategory, Lexicon, Region,
+        VerbalConjugation, Word)
+
+    rng = random.Random(options.seed)
+    lexicon = Lexicon.objects.create(name='benchmark', src_language='es', dst_language='ar')
+    GramaticalCategory.objects.bulk_create(
+        [GramaticalCategory(abbreviation=abbr, title=title) for abbr, title in GRAMCATS])
+    gramcats = list(GramaticalCategory.objects.all())
+    verb_gramcats = [g for g in gramcats if g.abbreviation in VERB_GRAMCATS]
+
+    region = Region.objects.create(name='benchmark')
+    variations = [
+        DiatopicVariation.objects.create(name='variation {}'.format(i), abbreviation='V{}.'.format(i), region=region)
+        for i in range(options.variations)
+    ]
+
+    used = set()
+    Word.objects.bulk_create(
+        [Word(lexicon=lexicon, term=random_term(rng, used)) for _ in range(options.words)],
+        batch_size=500)
+    words = list(Word.objects.filter(lexicon=lexicon).order_by('pk'))
+
+    entries = []
+    for word in words:
+        for i in range(rng.randint(1, 2 * options.entries - 1)):
+            variation = rng.choice(variations) if variations and i > 0 and rng.random() < 0.5 else None
+            entries.append(Entry(word=word, variation=variation, translation=random_term(rng, used)))
+    Entry.objects.bulk_create(entries, batch_size=500)
+    entries = list(Entry.objects.filter(word__lexicon=lexicon).order_by('pk'))
+
+    EntryGramcat = Entry.gramcats.through
+    entry_gramcats, examples, conjugations = [], [], []
+    parsed_conjugation = VerbalConjugation(raw=CONJUGATION).parse()
+    for entry in entries:
+        is_verb = rng.random() < options.verbs
+        gramcat = rng.choice(verb_gramcats if is_verb else gramcats)
+        entry_gramcats.append(EntryGramcat(entry_id=entry.pk, gramaticalcategory_id=gramcat.pk))
+        for _ in range(rng.randint(0, 2 * options.examples)):
+            examples.append(Example(entry=entry, phrase=' '.join(
+                random_term(rng, used) for _ in range(rng.randint(3, 8)))))
+        if is_verb:
+            conjugations.append(VerbalConjugation(entry=entry, raw=CONJUGATION, parsed=parsed_conjugation))
+
+    EntryGramcat.objects.bulk_create(entry_gramcats, batch_size=500)
+    Example.objects.bulk_create(examples, batch_size=500)
+    VerbalConjugation.objects.bulk_create(conjugations, batch_size=500)
+
+    return {
+        'lexicon': lexicon.code,
+        'word_ids': [word.pk for word in words],
+        'terms': [word.term for word in words],
+        'translations': [entry.translation for entry in entries],
+        'gramcats': [gramcat.abbreviation for gramcat in gramcats],
+        'dataset': {
+            'words': len(words),
+            'entries': len(entries),
+            'examples': len(examples),
+            'conjugations': len(conjugations),
+            'variations': len(variations),
+        },
+    }
+
+
+def build_endpoints(data, rng):
+    """Return a list of (name, function returning a URL) to benchmark."""
+    lex = data['lexicon']
+    return [
+        ('words', lambda: '/api/words/'),
+        ('words-detail', lambda: '/api/words/{}/'.format(rng.choice(data['word_ids']))),
+        ('words-search', lambda: '/api/words/search/?q={}&l={}'.format(rng.choice(data['terms']), lex)),
+        ('words-search-compact', lambda: '/api/words/search/?q={}&l={}&fields=term,entries&expand='.format(
+            rng.choice(data['terms']), lex)),
+        ('words-near', lambda: '/api/words/near/?q={}&l={}'.format(rng.choice(data['terms'])[:-1], lex)),
+        ('words-fulltext', lambda: '/api/words/fulltext/?q={}&l={}'.format(rng.choice(data['translations']), lex)),
+        ('words-lookup', lambda: '/api/words/lookup/?l={}&'.format(lex) + '&'.join(
+            'q={}'.format(term) for term in rng.sample(data['terms'], 50))),
+        ('words-autocomplete', lambda: '/api/words/autocomplete/?q={}&l={}'.format(rng.choice(data['terms'])[:3], lex)),
+        ('lexicons', lambda: '/api/lexicons/'),
+        ('gramcats-show', lambda: '/api/gramcats/show/?abbr={}'.format(rng.choice(data['gramcats']))),
+    ]
+
+
+def run_benchmark(client, name, get_url, options):
+    from django.db import DatabaseError, connection
+    from django.test.utils import CaptureQueriesContext
+
+    result = {'endpoint': name}
+    try:
+        # warm up (and check that the backend supports the endpoint)
+        client.get(get_url())
+    except DatabaseError as e:
+        result['error'] = str(e)
+        return result
+
+    timings = []
+    queries = []
+    for _ in range(options.requests):
+        url = get_url()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+        if response.status_code != 200:
+            result['error'] = 'HTTP {} on {}'.format(response.status_code, url)
+            return result
+
+    result.update({
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': max(queries),
+    })
+    return result
+
+
+class Rollback(Exception):
+    pass
+
+
+def explain(data):
+    """
+    Return EXPLAIN ANALYZE output of search queries (requires PostgreSQL)
+    with and without the trigram index of Word.term_normalized (dropped
+    on a transaction which is rolled back) to compare both plans.
+
+    """
+    from django.db import connection, transaction
+    from linguatec_lexicon.models import Word
+
+    term = data['terms'][0]
+
+    def explain_queries():
+        with Word.objects.near_similarity_threshold():
+            return {
+                'words-search': Word.objects.search(term, data['lexicon']).explain(analyze=True),
+                'words-near': Word.objects.search_near(term[:-1], data['lexicon']).explain(analyze=True),
+            }
+
+    plans = {'trigram-index': explain_queries()}
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("DROP INDEX linguatec_lexicon_word_term_normalized_trgm")
+            plans['no-trigram-index'] = explain_queries()
+            raise Rollback
+    except Rollback:
+        pass
+    return plans
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline."""
+    previous = {r['endpoint']: r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in results['results']:
+        old = previous.get(result['endpoint'])
+        if old is None or 'error' in result:
+            continue
+        if result['queries'] > old['queries']:
+            regressions.append('{}: {} queries (baseline {})'.format(
+                result['endpoint'], result['queries'], old['queries']))
+        if result['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {} ms (baseline {} ms)'.format(
+                result['endpoint'], result['p95_ms'], old['p95_ms']))
+    return regressions
+
+
+def main(options):
+    import django
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    import runtests
+
+    state = runtests.setup(0, [], 1)
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        data = populate(options)
+        rng = random.Random(options.seed)
+        client = Client()
+        results = {
+            'backend': connection.vendor,
+            'django': django.get_version(),
+            'dataset': data['dataset'],
+            'results': [
+                run_benchmark(client, name, get_url, options)
+                for name, get_url in build_endpoints(data, rng)
+                if not options.endpoints or name in options.endpoints
+            ],
+        }
+        if options.explain and connection.vendor == 'postgresql':
+            results['explain'] = explain(data)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        runtests.teardown(state)
+
+    output = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints.")
+    parser.add_argument(
+        '--settings', default='tests.settings_sqlite',
+        help='Python path to settings module (default: tests.settings_sqlite).',
+    )
+    parser.add_argument('--words', type=int, default=1000, help='Number of words (default: 1000).')
+    parser.add_argument('--entries', type=int, default=2, help='Average entries per word (default: 2).')
+    parser.add_argument('--examples', type=int, default=1, help='Average examples per entry (default: 1).')
+    parser.add_argument('--verbs', type=float, default=0.2,
+                        help='Ratio of entries which are verbs with conjugation (default: 0.2).')
+    parser.add_argument('--variations', type=int, default=3, help='Number of diatopic variations (default: 3).')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint (default: 50).')
+    parser.add_argument('--endpoints', nargs='*', help='Benchmark only these endpoints.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data.')
+    parser.add_argument('--explain', action='store_true',
+                        help='Include EXPLAIN ANALYZE of search queries (PostgreSQL only).')
+    parser.add_argument('--output', help='Write JSON results to this file.')
+    parser.add_argument('--baseline', help='JSON results to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed p95 latency increase over baseline (default: 0.2).')
+    options = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = options.settings
+    main(options)
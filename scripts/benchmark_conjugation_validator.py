@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of VerbalConjugationValidator over the verbs included
+on the test fixtures. It compares the current implementation (which
+tokenizes the content once) with the previous one (which searched every
+mood and tense on the raw content) over the verbs where both return the
+same result.
+
+    python scripts/benchmark_conjugation_validator.py [-n ITERATIONS] [-r REPEAT]
+
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import string
+import sys
+import timeit
+
+import django
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(BASE_DIR, 'tests', 'fixtures')
+sys.path.insert(0, BASE_DIR)
+
+settings.configure(USE_I18N=False)
+django.setup()
+
+from linguatec_lexicon.validators import VerbalConjugationValidator  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyVerbalConjugationValidator(VerbalConjugationValidator):
+    """Implementation previous to the single pass tokenizer."""
+
+    def __call__(self, value):
+        for mood in self.MOODS:
+            if mood not in value:
+                raise ValidationError(_('Verbal mood %s not found.') % mood)
+
+        cleaned_data = collections.OrderedDict()
+        for mood in self.MOODS:
+            current_mood = collections.OrderedDict()
+            mood_value = self.extract_mood(value, mood)
+            for tense in self.MOOD_TENSES[mood]:
+                count = self.MOOD_NUMBER_OF_CONJUGATIONS[mood]
+                conjugation = self.legacy_validate_number_of_conjugations(
+                    mood_value, mood, tense, count)
+                current_mood[tense] = conjugation
+            cleaned_data[mood] = current_mood
+
+        return cleaned_data
+
+    def extract_mood(self, value, mood):
+        mood_idx = self.MOODS.index(mood)
+        next_mood = self.MOODS[mood_idx + 1] if mood_idx + 1 < len(self.MOODS) else None
+        beg = value.find(mood)
+        end = value.find(next_mood) if next_mood is not None else None
+
+        return value[beg:end].lstrip(mood).strip()
+
+    def legacy_extract_tense(self, value, mood, tense):
+        mood_tenses = self.MOOD_TENSES[mood]
+        tense_idx = mood_tenses.index(tense)
+        next_tense = mood_tenses[tense_idx + 1] if tense_idx + 1 < len(mood_tenses) else None
+        beg = value.find(tense) + len(tense)
+        end = value.find(next_tense, beg) if next_tense is not None else None
+
+        return value[beg:end].strip().rstrip(';')
+
+    def legacy_extract_conjugation(self, value):
+        stuff_chars = string.punctuation + string.whitespace
+        conjugation = [x.strip(stuff_chars) for x in value.split(',')]
+        return conjugation
+
+    def legacy_validate_number_of_conjugations(self, value, mood, tense, count):
+        value = self.legacy_extract_tense(value, mood, tense)
+        conjugation = self.legacy_extract_conjugation(value)
+        if len(conjugation) != count:
+            raise ValidationError(
+                _('Invalid number of conjugations for %s - %s. Should be %d. %s found'
+                  % (mood, tense, count, len(conjugation))))
+
+        logger.debug("%s %s: %s" % (mood, tense, conjugation))
+
+        return conjugation
+
+
+def load_conjugations():
+    values = []
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        path = os.path.join(FIXTURES_DIR, filename)
+        if filename.endswith('.xlsx'):
+            sheets = pd.read_excel(path, header=None, sheet_name=None)
+            for df in sheets.values():
+                if len(df.columns) >= 6:
+                    values.extend(x for x in df[5].dropna() if isinstance(x, str))
+        elif filename.endswith('.json'):
+            with open(path) as f:
+                data = json.load(f)
+            values.extend(obj['fields']['raw'] for obj in data
+                          if obj['model'] == 'linguatec_lexicon.verbalconjugation')
+
+    # keep full conjugations (the validator is not used for model references)
+    conjugations = []
+    for value in values:
+        for raw in value.split('//'):
+            if VerbalConjugationValidator.INDICATIVE in raw:
+                conjugations.append(raw.strip())
+    return conjugations
+
+
+def run(validator, conjugations):
+    results = []
+    for value in conjugations:
+        try:
+            results.append(validator(value))
+        except ValidationError as e:
+            results.append(e.messages)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    parser.add_argument('-r', '--repeat', type=int, default=15)
+    args = parser.parse_args()
+
+    conjugations = load_conjugations()
+    legacy = LegacyVerbalConjugationValidator()
+    current = VerbalConjugationValidator()
+
+    # legacy implementation read garbage when a tense was missing instead
+    # of reporting it (e.g. model references of variation-sample-common.xlsx)
+    # they are excluded from the timings (rejecting them is cheaper)
+    same = []
+    for value, x, y in zip(conjugations, run(legacy, conjugations), run(current, conjugations)):
+        if x == y:
+            same.append(value)
+        else:
+            print("Different result (now rejected: %s): %s..." % (y[0], value[:40]))
+    conjugations = same
+
+    print("Verbal conjugations: %d, iterations: %d" % (len(conjugations), args.iterations))
+    # repeats of both implementations are interleaved so load changes of
+    # the machine affect both of them
+    validators = [('legacy', legacy), ('tokenizer', current)]
+    timings = {name: float('inf') for name, _ in validators}
+    for _ in range(args.repeat):
+        for name, validator in validators:
+            timing = timeit.timeit(lambda: run(validator, conjugations), number=args.iterations)
+            timings[name] = min(timings[name], timing)
+    for name, _ in validators:
+        per_verb = timings[name] / (args.iterations * len(conjugations)) * 1e6
+        print("%-10s %8.3f s  (%.1f µs/verb)" % (name, timings[name], per_verb))
+    print("speedup    %8.2fx" % (timings['legacy'] / timings['tokenizer']))
+
+
+if __name__ == '__main__':
+    main()
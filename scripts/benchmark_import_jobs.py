@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the validation of importdata with several processes
+(`--jobs`) over a synthetic input of `--words` words (a third of them
+verbs with conjugation). It reports the wall time of the validation and
+the size and (un)pickling time of the results returned by the workers.
+
+    python scripts/benchmark_import_jobs.py --settings tests.settings_sqlite --words 20000 --jobs 1 4
+
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(BASE_DIR, 'tests', 'fixtures')
+sys.path.insert(0, BASE_DIR)
+
+CONJUGATION = (
+    "Conjug.: IND. pres. adubo, adubes, adube, adubimos, adubiz, aduben; pret. imp. adubiba, adubibas, "
+    "adubiba, adubíbanos, adubíbaz, adubiban; pret. indef. adubié, adubiés, adubió, adubiemos, adubiez, "
+    "adubioron/adubión; fut. adubiré, adubirás, adubirá, adubiremos, adubirez, adubirán; cond. adubirba, "
+    "adubirbas, adubirba, adubírbanos, adubírbaz, adubirban; SUBJ. pres. aduba, adubas, aduba, adubamos, "
+    "adubaz, aduban; pret. imp. adubise, adubises, adubise, adubísenos, adubísez, adubisen; IMP. adube, "
+    "adubiz; INF. adubir; GER. adubindo; PART. adubito/a."
+)
+
+
+def build_rows(count):
+    rows = []
+    for i in range(count):
+        if i % 3 == 0:
+            rows.append((i, 'verbo{}'.format(i), 'v. tr.', 'adubir{0} // abastar{0}'.format(i),
+                         '', 'ejemplo {} //'.format(i), CONJUGATION))
+        else:
+            rows.append((i, 'palabra{}'.format(i), 's. m.', 'parola{0} // bocable{0}'.format(i),
+                         '', 'ejemplo {}'.format(i), ''))
+    return rows
+
+
+def measure(lexicon, rows, jobs):
+    from linguatec_lexicon.importers import DataImporter
+
+    importer = DataImporter(lexicon, jobs=jobs)
+    start = time.perf_counter()
+    errors = list(importer.validate(rows))
+    elapsed = time.perf_counter() - start
+    assert not errors, errors[:3]
+    return elapsed
+
+
+def measure_shard_result(lexicon, rows):
+    """Size and pickling time of a worker result (validating every row)."""
+    from linguatec_lexicon.importers import DataImporter
+
+    importer = DataImporter(lexicon)
+    _, result = importer.validate_shard(rows)
+    start = time.perf_counter()
+    data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.loads(data)
+    return len(data), time.perf_counter() - start
+
+
+def main(options):
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    import runtests
+
+    runtests.setup(0, [], 1)
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        from linguatec_lexicon.models import Lexicon
+
+        call_command('importgramcat', os.path.join(FIXTURES_DIR, 'gramcat-es-ar.csv'), verbosity=0)
+        lexicon = Lexicon.objects.create(name='es-ar', src_language='es', dst_language='ar')
+        rows = build_rows(options.words)
+
+        size, pickle_time = measure_shard_result(lexicon, rows)
+        print('worker results of {} words: {:.1f} MB, pickle + unpickle {:.2f} s'.format(
+            options.words, size / 2 ** 20, pickle_time))
+        for jobs in options.jobs:
+            print('validate --jobs {}: {:.2f} s'.format(jobs, measure(lexicon, rows, jobs)))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default='tests.settings_sqlite')
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2])
+    options = parser.parse_args()
+    os.environ['DJANGO_SETTINGS_MODULE'] = options.settings
+    main(options)
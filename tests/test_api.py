@@ -1,7 +1,30 @@
+import contextlib
+import os
+import tempfile
 import unittest
-
-from django.db import connection
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from linguatec_lexicon import cache, jobs
+from linguatec_lexicon.models import Entry, ImportJob, Lexicon, NearQuerySet, Word, WordManager
+from linguatec_lexicon.views import DefaultLimitOffsetPagination
+
+# applications used by the API requests of TransactionTestCases
+TRANSACTION_TEST_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'rest_framework',
+    'linguatec_lexicon',
+    'tests',
+]
 
 
 class ApiTestCase(TestCase):
@@ -15,6 +38,53 @@ class ApiTestCase(TestCase):
         resp = self.client.get('/api/words/1/')
         self.assertEqual(200, resp.status_code)
 
+    def test_word_list_number_of_queries(self):
+        # count + words + entries (joined with conjugation and variation) + gramcats + examples
+        for limit in [1, 2, 4]:
+            with self.assertNumQueries(5):
+                resp = self.client.get('/api/words/?limit={}'.format(limit))
+            self.assertEqual(limit, len(resp.json()["results"]))
+
+    def test_word_list_cursor(self):
+        expected = [x["term"] for x in self.client.get('/api/words/').json()["results"]]
+
+        terms = []
+        url = '/api/words/?cursor=&limit=3'
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(200, resp.status_code)
+            resp_json = resp.json()
+            self.assertNotIn("count", resp_json)
+            terms.extend(x["term"] for x in resp_json["results"])
+            url = resp_json["next"]
+
+        self.assertEqual(expected, terms)
+
+    def test_word_list_cursor_count(self):
+        resp = self.client.get('/api/words/?cursor=&limit=1&count=true')
+        resp_json = resp.json()
+        self.assertEqual(4, resp_json["count"])
+        self.assertIn("cursor=", resp_json["next"])
+
+    def test_word_list_cursor_number_of_queries(self):
+        # words + entries (joined with conjugation and variation) + gramcats + examples
+        resp = self.client.get('/api/words/?cursor=&limit=2')
+        with self.assertNumQueries(4):
+            self.client.get(resp.json()["next"])
+
+    def test_word_list_invalid_cursor(self):
+        resp = self.client.get('/api/words/?cursor=foo')
+        self.assertEqual(404, resp.status_code)
+
+    def test_word_search_number_of_queries(self):
+        # count + words + entries + gramcats + examples
+        # (lexicons are loaded once and kept in memory)
+        Lexicon.objects.get_by_code('es-ar')
+        cache.bump_data_version()
+        with self.assertNumQueries(5):
+            resp = self.client.get('/api/words/search/?q=echar&l=es-ar')
+        self.assertEqual(1, len(resp.json()["results"]))
+
     def test_word_search_with_results(self):
         resp = self.client.get('/api/words/search/?q=echar&l=es-ar')
         self.assertEqual(200, resp.status_code)
@@ -30,6 +100,414 @@ class ApiTestCase(TestCase):
         self.assertEqual(0, resp_json["count"])
 
 
+    def test_word_fulltext(self):
+        resp = self.client.get('/api/words/fulltext/?q=tiempo&l=es-ar')
+        self.assertEqual(200, resp.status_code)
+
+        resp_json = resp.json()
+        self.assertEqual(1, resp_json["count"])
+        self.assertEqual("edad", resp_json["results"][0]["term"])
+
+    def test_word_fulltext_lexicon_not_found(self):
+        resp = self.client.get('/api/words/fulltext/?q=tiempo&l=xx-yy')
+        self.assertEqual(404, resp.status_code)
+
+
+class WordFieldsTestCase(TestCase):
+    fixtures = ['lexicon-sample.json']
+
+    def test_fields(self):
+        resp = self.client.get('/api/words/2/?fields=term,entries')
+        resp_json = resp.json()
+        self.assertEqual(["entries", "term"], sorted(resp_json))
+        self.assertIn("conjugation", resp_json["entries"][0])
+
+    def test_expand(self):
+        resp = self.client.get('/api/words/2/?expand=gramcats')
+        entry = resp.json()["entries"][0]
+        self.assertEqual(["gramcats", "id", "translation"], sorted(entry))
+
+    def test_compact(self):
+        resp = self.client.get('/api/words/search/?q=echar&l=es-ar&fields=term,entries&expand=')
+        word = resp.json()["results"][0]
+        self.assertEqual(["entries", "term"], sorted(word))
+        self.assertEqual(["id", "translation"], sorted(word["entries"][0]))
+
+    def test_compact_number_of_queries(self):
+        # words + entries
+        with self.assertNumQueries(2):
+            self.client.get('/api/words/?count=none&fields=term,entries&expand=')
+
+    def test_gramcats_without_entries_number_of_queries(self):
+        # words + entries + gramcats
+        with self.assertNumQueries(3):
+            resp = self.client.get('/api/words/?count=none&fields=term,gramcats')
+        self.assertEqual(["gramcats", "term"], sorted(resp.json()["results"][0]))
+
+    def test_term_only_number_of_queries(self):
+        with self.assertNumQueries(1):
+            self.client.get('/api/words/?count=none&fields=term')
+
+
+class LookupTestCase(TestCase):
+    fixtures = ['lexicon-sample.json']
+
+    def test_lookup_get(self):
+        resp = self.client.get('/api/words/lookup/?q=echar&q=EDAD&q=foo&l=es-ar')
+        self.assertEqual(200, resp.status_code)
+
+        resp_json = resp.json()
+        self.assertEqual(["echar", "EDAD", "foo"], [x["q"] for x in resp_json])
+        self.assertEqual(["echar"], [w["term"] for w in resp_json[0]["results"]])
+        self.assertEqual(["edad"], [w["term"] for w in resp_json[1]["results"]])
+        self.assertEqual([], resp_json[2]["results"])
+        self.assertEqual(4, len(resp_json[0]["results"][0]["entries"]))
+
+    def test_lookup_post(self):
+        resp = self.client.post('/api/words/lookup/', {'q': ['ebrio', 'édad'], 'l': 'es-ar'},
+                                content_type='application/json')
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual([["ebrio"], ["edad"]], [[w["term"] for w in x["results"]] for x in resp.json()])
+
+    def test_lookup_number_of_queries(self):
+        # words + entries (joined with conjugation and variation) + gramcats + examples
+        Lexicon.objects.get_by_code('es-ar')
+        with self.assertNumQueries(4):
+            self.client.get('/api/words/lookup/?q=echar&q=edad&q=ebrio&q=eclipsar&l=es-ar')
+
+    @override_settings(LINGUATEC_LEXICON_LOOKUP_MAX_TERMS=2)
+    def test_lookup_max_terms(self):
+        resp = self.client.get('/api/words/lookup/?q=echar&q=edad&q=ebrio&l=es-ar')
+        self.assertEqual(400, resp.status_code)
+
+    def test_lookup_invalid_terms(self):
+        resp = self.client.post('/api/words/lookup/', {'q': {'echar': 1}, 'l': 'es-ar'},
+                                content_type='application/json')
+        self.assertEqual(400, resp.status_code)
+
+    def test_lookup_invalid_lexicon(self):
+        for lex in [['es-ar'], 1, {'code': 'es-ar'}]:
+            resp = self.client.post('/api/words/lookup/', {'q': ['echar'], 'l': lex},
+                                    content_type='application/json')
+            self.assertEqual(400, resp.status_code)
+
+    def test_lookup_lexicon_not_found(self):
+        resp = self.client.get('/api/words/lookup/?q=echar&l=xx-yy')
+        self.assertEqual(404, resp.status_code)
+
+
+class SearchCacheTestCase(TestCase):
+    fixtures = ['lexicon-sample.json']
+
+    def setUp(self):
+        cache.bump_data_version()
+        cache.reset_stats()
+
+    def test_search_is_cached(self):
+        resp = self.client.get('/api/words/search/?q=echar&l=es-ar')
+        self.assertEqual('MISS', resp['X-Cache'])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/words/search/?q=Echar &l=es-ar')
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(resp.json(), cached.json())
+
+    def test_near_hit_skips_similarity_threshold(self):
+        # trigram lookup requires PostgreSQL: evaluate a NearQuerySet without it
+        queryset = NearQuerySet(Word).filter(term="echar")
+        with mock.patch.object(WordManager, 'search_near', return_value=queryset), \
+                mock.patch.object(WordManager, 'near_similarity_threshold',
+                                  side_effect=contextlib.nullcontext) as threshold:
+            resp = self.client.get('/api/words/near/?q=echar&l=es-ar')
+            self.assertEqual('MISS', resp['X-Cache'])
+            self.assertTrue(threshold.called)
+
+            threshold.reset_mock()
+            with self.assertNumQueries(0):
+                cached = self.client.get('/api/words/near/?q=echar&l=es-ar')
+            self.assertEqual('HIT', cached['X-Cache'])
+            self.assertFalse(threshold.called)
+
+    def test_key_includes_pagination(self):
+        self.client.get('/api/words/search/?q=echar&l=es-ar')
+        resp = self.client.get('/api/words/search/?q=echar&l=es-ar&limit=1&offset=1')
+        self.assertEqual('MISS', resp['X-Cache'])
+        self.assertEqual(0, len(resp.json()["results"]))
+
+    def test_key_includes_scheme_and_host(self):
+        self.client.get('/api/words/search/?q=echar&l=es-ar')
+        resp = self.client.get('/api/words/search/?q=echar&l=es-ar', secure=True)
+        self.assertEqual('MISS', resp['X-Cache'])
+        self.assertTrue(resp.json()["results"][0]["url"].startswith('https://testserver/'))
+
+        with self.settings(ALLOWED_HOSTS=['api.example.com']):
+            resp = self.client.get('/api/words/search/?q=echar&l=es-ar', HTTP_HOST='api.example.com')
+        self.assertEqual('MISS', resp['X-Cache'])
+        self.assertTrue(resp.json()["results"][0]["url"].startswith('http://api.example.com/'))
+
+    def test_import_invalidates_cache(self):
+        version = cache.get_data_version()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('abbreviation,title\nfoo.,foo\n')
+            f.flush()
+            call_command('importgramcat', f.name, verbosity=0)
+        self.assertGreater(cache.get_data_version(), version)
+
+    def test_stats(self):
+        self.client.get('/api/words/search/?q=echar&l=es-ar')
+        self.client.get('/api/words/search/?q=echar&l=es-ar')
+        self.client.get('/api/words/search/?q=foo&l=es-ar')
+
+        resp = self.client.get('/api/words/cache-stats/')
+        self.assertEqual(200, resp.status_code)
+        stats = resp.json()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+        self.assertEqual(cache.get_data_version(), stats["data_version"])
+
+
+class SearchCacheInvalidationTestCase(TransactionTestCase):
+    # data version is bumped when transactions are committed
+    available_apps = TRANSACTION_TEST_APPS
+    fixtures = ['lexicon-sample.json']
+
+    def setUp(self):
+        cache.bump_data_version()
+
+    def test_save_invalidates_cache(self):
+        self.client.get('/api/words/search/?q=echar&l=es-ar')
+        word = Word.objects.get(term='echar')
+        word.term = 'echar de menos'
+        word.save()
+
+        resp = self.client.get('/api/words/search/?q=echar&l=es-ar')
+        self.assertEqual('MISS', resp['X-Cache'])
+        self.assertEqual('echar de menos', resp.json()["results"][0]["term"])
+
+    def test_bumped_once_per_transaction(self):
+        version = cache.get_data_version()
+        with transaction.atomic():
+            for word in Word.objects.all():
+                word.save()
+            self.assertEqual(version, cache.get_data_version())
+        self.assertEqual(version + 1, cache.get_data_version())
+
+    def test_not_bumped_on_rollback(self):
+        version = cache.get_data_version()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Word.objects.first().save()
+                raise ValueError
+        self.assertEqual(version, cache.get_data_version())
+
+        Word.objects.first().save()
+        self.assertEqual(version + 1, cache.get_data_version())
+
+    def test_delete_word_invalidates_cache(self):
+        version = cache.get_data_version()
+        word = Word.objects.get(term='echar')
+        entries = list(word.entries.values_list('pk', flat=True))
+        self.assertTrue(entries)
+        word.delete()
+
+        self.assertEqual(version + 1, cache.get_data_version())
+        self.assertFalse(Entry.objects.filter(pk__in=entries).exists())
+
+
+@override_settings(LINGUATEC_LEXICON_JOB_WORKERS=0)
+class ValidatorJobTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lexicon = Lexicon.objects.create(name='es-ar', src_language='es', dst_language='ar')
+        call_command('importgramcat', cls.get_fixture_path('gramcat-es-ar.csv'), verbosity=0)
+
+    @classmethod
+    def get_fixture_path(cls, name):
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', name)
+
+    def validate(self, url, name):
+        with open(self.get_fixture_path(name), 'rb') as f:
+            return self.client.post(url, {'lexicon': self.lexicon.pk, 'input_file': f})
+
+    def test_validate(self):
+        resp = self.validate('/api/validator/', 'invalid-gramcat-unknown.xlsx')
+
+        job = ImportJob.objects.get()
+        self.assertRedirects(resp, '/api/validator/jobs/{}/'.format(job.pk))
+        self.assertEqual(ImportJob.STATUS_FINISHED, job.status)
+        self.assertFalse(os.path.exists(job.input_file))
+        self.assertEqual(0, Word.objects.count())
+
+        resp = self.client.get('/api/jobs/{}/'.format(job.pk))
+        self.assertEqual(200, resp.status_code)
+        data = resp.json()
+        self.assertEqual('finished', data["status"])
+        self.assertEqual('invalid-gramcat-unknown.xlsx', data["input_name"])
+        self.assertLess(0, data["progress"])
+        self.assertEqual(1, len(data["errors"]))
+        self.assertEqual("B", data["errors"][0]["column"])
+
+        resp = self.client.get('/api/validator/jobs/{}/'.format(job.pk))
+        self.assertContains(resp, 'Found 1 errors.')
+
+    def test_validate_variation(self):
+        resp = self.validate('/api/validator-diatopic-variation/', 'variation-word-not-found.xlsx')
+
+        job = ImportJob.objects.get()
+        self.assertRedirects(resp, '/api/validator/jobs/{}/'.format(job.pk))
+        self.assertEqual('importvariation', job.command)
+        self.assertEqual(ImportJob.STATUS_FINISHED, job.status)
+        self.assertNotEqual([], job.errors)
+
+    def test_failed_job(self):
+        job = ImportJob.objects.create(command='importdata', lexicon=self.lexicon, input_file='/nonexistent.xlsx')
+        with self.assertLogs('linguatec_lexicon.jobs', 'ERROR'):
+            jobs.submit(job)
+
+        job.refresh_from_db()
+        self.assertEqual(ImportJob.STATUS_FAILED, job.status)
+        self.assertNotEqual('', job.message)
+
+        resp = self.client.get('/api/validator/jobs/{}/'.format(job.pk))
+        self.assertContains(resp, 'failed')
+
+    def test_job_not_found(self):
+        resp = self.client.get('/api/jobs/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(404, resp.status_code)
+
+
+class ImportJobCleanupTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lexicon = Lexicon.objects.create(name='es-ar', src_language='es', dst_language='ar')
+
+    def create_job(self, status, **dates):
+        tmp_fd, tmp_file = tempfile.mkstemp(suffix='.xlsx')
+        os.close(tmp_fd)
+        job = ImportJob.objects.create(command='importdata', lexicon=self.lexicon, input_file=tmp_file,
+                                       status=status)
+        ImportJob.objects.filter(pk=job.pk).update(**dates)
+        self.addCleanup(jobs.remove_input_file, tmp_file)
+        return job
+
+    def test_cleanup(self):
+        now = timezone.now()
+        lost_running = self.create_job(ImportJob.STATUS_RUNNING, started=now - timedelta(hours=2))
+        lost_pending = self.create_job(ImportJob.STATUS_PENDING, created=now - timedelta(hours=2))
+        running = self.create_job(ImportJob.STATUS_RUNNING, started=now)
+        old = self.create_job(ImportJob.STATUS_FINISHED, finished=now - timedelta(days=8))
+        recent = self.create_job(ImportJob.STATUS_FINISHED, finished=now - timedelta(days=1))
+
+        self.assertEqual((2, 1), jobs.cleanup())
+
+        for job in [lost_running, lost_pending]:
+            job.refresh_from_db()
+            self.assertEqual(ImportJob.STATUS_FAILED, job.status)
+            self.assertNotEqual('', job.message)
+            self.assertFalse(os.path.exists(job.input_file))
+        running.refresh_from_db()
+        self.assertEqual(ImportJob.STATUS_RUNNING, running.status)
+        self.assertTrue(os.path.exists(running.input_file))
+        self.assertFalse(ImportJob.objects.filter(pk=old.pk).exists())
+        self.assertTrue(ImportJob.objects.filter(pk=recent.pk).exists())
+
+    def test_failed_when_result_not_saved(self):
+        job = self.create_job(ImportJob.STATUS_PENDING)
+        save_result = jobs.save_result
+
+        def fail_once(*args):
+            if not mocked.call_count > 1:
+                raise DatabaseError('gone')
+            save_result(*args)
+
+        with self.assertLogs('linguatec_lexicon.jobs', 'ERROR'), \
+                mock.patch.object(jobs, 'save_result', side_effect=fail_once) as mocked:
+            self.assertTrue(jobs.run(job.pk))
+
+        job.refresh_from_db()
+        self.assertEqual(ImportJob.STATUS_FAILED, job.status)
+        self.assertIn("couldn't be saved", job.message)
+        self.assertFalse(os.path.exists(job.input_file))
+
+    def test_not_run_twice(self):
+        job = self.create_job(ImportJob.STATUS_RUNNING, started=timezone.now())
+        self.assertFalse(jobs.run(job.pk))
+
+
+@override_settings(LINGUATEC_LEXICON_JOB_WORKERS=None)
+class RunImportJobsCommandTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lexicon = Lexicon.objects.create(name='es-ar', src_language='es', dst_language='ar')
+        call_command('importgramcat', ValidatorJobTestCase.get_fixture_path('gramcat-es-ar.csv'), verbosity=0)
+
+    def test_run_pending_jobs(self):
+        with open(ValidatorJobTestCase.get_fixture_path('invalid-gramcat-unknown.xlsx'), 'rb') as f:
+            self.client.post('/api/validator/', {'lexicon': self.lexicon.pk, 'input_file': f})
+        job = ImportJob.objects.get()
+        self.assertEqual(ImportJob.STATUS_PENDING, job.status)
+
+        out = StringIO()
+        call_command('runimportjobs', once=True, stdout=out)
+
+        self.assertIn('Run 1 jobs', out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(ImportJob.STATUS_FINISHED, job.status)
+        self.assertEqual(1, len(job.errors))
+        self.assertFalse(os.path.exists(job.input_file))
+
+
+@override_settings(LINGUATEC_LEXICON_JOB_WORKERS=2)
+class ValidatorJobThreadTestCase(TransactionTestCase):
+    """Jobs run by the pool of threads once the request is committed."""
+    available_apps = TRANSACTION_TEST_APPS
+
+    def setUp(self):
+        self.lexicon = Lexicon.objects.create(name='es-ar', src_language='es', dst_language='ar')
+        call_command('importgramcat', ValidatorJobTestCase.get_fixture_path('gramcat-es-ar.csv'), verbosity=0)
+
+    def tearDown(self):
+        jobs.shutdown()
+
+    def test_validate(self):
+        with open(ValidatorJobTestCase.get_fixture_path('invalid-gramcat-unknown.xlsx'), 'rb') as f:
+            resp = self.client.post('/api/validator/', {'lexicon': self.lexicon.pk, 'input_file': f})
+        # wait for the submitted jobs
+        jobs.shutdown(wait=True)
+
+        job = ImportJob.objects.get()
+        self.assertRedirects(resp, '/api/validator/jobs/{}/'.format(job.pk))
+        self.assertEqual(ImportJob.STATUS_FINISHED, job.status)
+        self.assertEqual(1, len(job.errors))
+        self.assertFalse(os.path.exists(job.input_file))
+
+    def test_failed_job_logged(self):
+        job = ImportJob.objects.create(command='importdata', lexicon=self.lexicon, input_file='/nonexistent.xlsx')
+        with self.assertLogs('linguatec_lexicon.jobs', 'ERROR'), \
+                mock.patch.object(jobs, 'get_importer', side_effect=RuntimeError('boom')):
+            jobs.submit(job)
+            jobs.shutdown(wait=True)
+
+        job.refresh_from_db()
+        self.assertEqual(ImportJob.STATUS_FAILED, job.status)
+        self.assertEqual('boom', job.message)
+
+    def test_not_submitted_on_rollback(self):
+        with mock.patch.object(jobs, 'run_in_thread') as run_in_thread:
+            with transaction.atomic():
+                job = ImportJob.objects.create(command='importdata', lexicon=self.lexicon,
+                                               input_file='/nonexistent.xlsx')
+                jobs.submit(job)
+                transaction.set_rollback(True)
+            jobs.shutdown(wait=True)
+
+        run_in_thread.assert_not_called()
+        self.assertFalse(ImportJob.objects.exists())
+
+
 class LexiconAPITestCase(TestCase):
     fixtures = ['lexicon-sample.json']
 
@@ -70,6 +548,11 @@ class GramaticalCategoryAPITestCase(TestCase):
 class VerbsAPITestCase(TestCase):
     fixtures = ['verbal-conjugation.json']
 
+    @classmethod
+    def setUpTestData(cls):
+        # link conjugations loaded from the fixture to their model word
+        call_command('updateconjugations', stdout=StringIO())
+
     def test_word_verb_is_conjugation_model(self):
         response = self.client.get('/api/words/8/').json()
         for entry in response['entries']:
@@ -84,6 +567,11 @@ class VerbsAPITestCase(TestCase):
                 self.assertIn('model_word_id', entry['conjugation'])
                 self.assertEqual(entry['conjugation']['model_word_id'], 4434)
 
+    def test_word_verb_number_of_queries(self):
+        # word + entries (joined with conjugation and variation) + gramcats + examples
+        with self.assertNumQueries(4):
+            self.client.get('/api/words/8546/')
+
 
 class SearchTestCase(TestCase):
     fixtures = ['lexicons.json',
@@ -147,6 +635,113 @@ class SearchTestCase(TestCase):
         self.do_and_check_query(query, expected_results)
 
 
+class SearchCountModeTestCase(TestCase):
+    fixtures = ['lexicons.json',
+                'gramcatical-categories.json', 'words-search.json']
+
+    def setUp(self):
+        cache.bump_data_version()
+
+    def search(self, **params):
+        resp = self.client.get('/api/words/search/', dict(q='echar', l='es-ar', **params))
+        self.assertEqual(200, resp.status_code)
+        return resp.json()
+
+    def test_exact_count(self):
+        resp_json = self.search(limit=2)
+        self.assertEqual(6, resp_json["count"])
+
+    def test_no_count(self):
+        resp_json = self.search(limit=2, count='none')
+        self.assertIsNone(resp_json["count"])
+        self.assertEqual(2, len(resp_json["results"]))
+        self.assertIn("offset=2", resp_json["next"])
+
+    def test_no_count_last_page(self):
+        resp_json = self.search(limit=2, offset=4, count='none')
+        self.assertEqual(6, resp_json["count"])
+        self.assertIsNone(resp_json["next"])
+
+    def test_no_count_number_of_queries(self):
+        # words + entries (without count, these words have no gramcats neither examples)
+        Lexicon.objects.get_by_code('es-ar')
+        with self.assertNumQueries(2):
+            self.search(limit=2, count='none')
+
+    @mock.patch.object(DefaultLimitOffsetPagination, 'count_cap', 3)
+    def test_capped_count(self):
+        resp_json = self.search(limit=1, count='capped')
+        self.assertEqual(3, resp_json["count"])
+        self.assertIsNotNone(resp_json["next"])
+
+        resp_json = self.search(limit=2, offset=2, count='capped')
+        self.assertEqual(5, resp_json["count"])
+
+    @unittest.skipIf(connection.vendor == 'postgresql', "estimate is capped count on other backends")
+    @mock.patch.object(DefaultLimitOffsetPagination, 'count_cap', 3)
+    def test_estimate_count_fallback(self):
+        resp_json = self.search(limit=1, count='estimate')
+        self.assertEqual(3, resp_json["count"])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL backend")
+    def test_estimate_count(self):
+        resp_json = self.search(limit=1, count='estimate')
+        self.assertGreaterEqual(resp_json["count"], 2)
+
+
+class AutocompleteTestCase(TestCase):
+    fixtures = ['lexicons.json',
+                'gramcatical-categories.json', 'words-search.json']
+
+    def autocomplete(self, query, **params):
+        params.setdefault('l', 'es-ar')
+        resp = self.client.get('/api/words/autocomplete/', dict(q=query, **params))
+        self.assertEqual(200, resp.status_code)
+        return [x['term'] for x in resp.json()]
+
+    def test_prefix(self):
+        self.assertEqual(["echar", "echar a", "echar a perder", "echar a voleo",
+                          "echar de menos", "echar hojas"], self.autocomplete("echar"))
+
+    def test_ignore_case_and_accents(self):
+        self.assertIn("atención", self.autocomplete("ATENCION"))
+
+    def test_limit(self):
+        self.assertEqual(["echar", "echar a"], self.autocomplete("ech", limit=2))
+
+    def test_no_results(self):
+        self.assertEqual([], self.autocomplete("zzz"))
+        self.assertEqual([], self.autocomplete(""))
+
+    def test_lexicon_not_found(self):
+        resp = self.client.get('/api/words/autocomplete/', {'q': 'ech', 'l': 'xx-yy'})
+        self.assertEqual(404, resp.status_code)
+
+    def test_no_queries_once_loaded(self):
+        self.autocomplete("e")
+        with self.assertNumQueries(0):
+            self.autocomplete("ech")
+
+
+
+class AutocompleteReloadTestCase(TransactionTestCase):
+    available_apps = TRANSACTION_TEST_APPS
+    fixtures = ['lexicons.json',
+                'gramcatical-categories.json', 'words-search.json']
+
+    def autocomplete(self, query):
+        resp = self.client.get('/api/words/autocomplete/', {'q': query, 'l': 'es-ar'})
+        return [x['term'] for x in resp.json()]
+
+    def test_reloaded_when_data_changes(self):
+        self.autocomplete("ech")
+        word = Word.objects.get(term="echar hojas")
+        word.term = "echarse"
+        word.save()
+
+        self.assertIn("echarse", self.autocomplete("ech"))
+
+
 @unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL backend")
 class NearWordTestCase(TestCase):
     fixtures = ['lexicons.json',
@@ -1,10 +1,14 @@
+import math
 import os
 import io
 import tempfile
 from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from linguatec_lexicon.models import (DiatopicVariation, Lexicon, Region)
+from linguatec_lexicon.models import (
+    DiatopicVariation, Entry, GramaticalCategory, Lexicon, Region, Word)
 
 
 class ExporterDataTestCase(TestCase):
@@ -38,6 +42,25 @@ class ExporterDataTestCase(TestCase):
                 list(io.open(sample_path)),
                 list(io.open(tmpdirname + '/test-output-data-file.csv')))
 
+    def test_export_data_queries_by_batch(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/sample-input.xlsx')
+        call_command('importdata', sample_path, self.LEXICON_NAME)
+        batch_size = 3
+        number_of_batches = math.ceil(Word.objects.count() / batch_size)
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            output_file = tmpdirname + '/test-output-data-file.csv'
+            Lexicon.objects.clear_cache()
+            with CaptureQueriesContext(connection) as context:
+                call_command('exportdata', self.LEXICON_CODE, output_file, batch_size=batch_size)
+
+            # lexicons + (words + entries + gramcats + examples) per batch + last empty batch
+            self.assertEqual(1 + 4 * number_of_batches + 1, len(context.captured_queries))
+
+            sample_path = os.path.join(base_path, 'fixtures/export_test_files/export_data_expected_result.csv')
+            self.assertListEqual(list(io.open(sample_path)), list(io.open(output_file)))
+
 
 class ExporterVariationTestCase(TestCase):
 
@@ -85,3 +108,24 @@ class ExporterVariationTestCase(TestCase):
             self.assertListEqual(
                 list(io.open(sample_path)),
                 list(io.open(tmpdirname + '/test-output-data-file.csv')))
+
+    def test_export_variation_scoped_to_lexicon(self):
+        # same term on another lexicon shouldn't be mixed with the exported one
+        variation = DiatopicVariation.objects.get(name='benasqués')
+        gramcat = GramaticalCategory.objects.get(abbreviation='s. m.')
+        for src, dst in [('es', 'ar'), ('ar', 'es')]:
+            lexicon = Lexicon.objects.get_or_create(
+                src_language=src, dst_language=dst, defaults={'name': src + '-' + dst})[0]
+            word = Word.objects.get_or_create(lexicon=lexicon, term='zzz')[0]
+            entry = Entry.objects.create(word=word, variation=variation, translation='zzz ' + src)
+            entry.gramcats.add(gramcat)
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            output_file = tmpdirname + '/test-output-data-file.csv'
+            Lexicon.objects.clear_cache()
+            with CaptureQueriesContext(connection) as context:
+                call_command('exportvariation', self.LEXICON_CODE, 'benasqués', output_file, batch_size=1)
+
+            # lexicons + variation + (words + entries + gramcats) + last empty batch
+            self.assertEqual(1 + 1 + 3 + 1, len(context.captured_queries))
+            self.assertListEqual(['zzz;s. m.;zzz es\n'], list(io.open(output_file)))
@@ -1,9 +1,15 @@
 import os
+import tempfile
 from io import StringIO
+from unittest import mock
+
+import openpyxl
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 
+from linguatec_lexicon.importers import DataImporter, ImporterError, VariationImporter, trigrams
 from linguatec_lexicon.models import (DiatopicVariation, Entry, Example,
                                       GramaticalCategory, Lexicon, Region,
                                       VerbalConjugation, Word)
@@ -57,6 +63,22 @@ class ImporterTestCase(TestCase):
         # call_command('dumpdata', 'linguatec_lexicon', indent=4, output='/tmp/test-output.json')
         # and fixtures/sample-output.json
 
+    def test_import_small_batch_size(self):
+        out = StringIO()
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/verbal-conjugation.xlsx')
+        call_command('importdata', sample_path, self.LEXICON_CODE, batch_size=1, stdout=out)
+
+        self.assertIn('rows/s', out.getvalue())
+
+        # check that related objects are linked to the proper entry
+        word = Word.objects.get(term="abarcar")
+        entry = word.entries.get(translation__contains="adubir")
+        self.assertIsNotNone(entry.conjugation)
+        self.assertTrue(word.entries.filter(gramcats__isnull=False).exists())
+        for entry in Entry.objects.all():
+            self.assertNotEqual(0, entry.gramcats.count())
+
     def test_missing_letters_as_sheets(self):
         NUMBER_OF_WORDS = 4
 
@@ -66,6 +88,100 @@ class ImporterTestCase(TestCase):
 
         self.assertEqual(NUMBER_OF_WORDS, Word.objects.count())
 
+    def test_stream_rows_match_dataframe(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        for name in ['abcd.xlsx', 'sample-input.xlsx', 'verbal-conjugation.xlsx', 'invalid-gramcat-empty.xlsx']:
+            importer = DataImporter(Lexicon.objects.get_by_code(self.LEXICON_CODE))
+            input_file = os.path.join(base_path, 'fixtures', name)
+
+            stream_rows = [row[1:] for row in importer.read_rows(input_file) if row[1]]
+            # sheets with less columns are padded with blank cells
+            df_rows = [row[1:] + ('',) * (7 - len(row))
+                       for row in importer.read_rows(input_file, stream=False) if row[1]]
+            self.assertEqual(df_rows, stream_rows, name)
+
+    def test_validate_rows(self):
+        importer = DataImporter(Lexicon.objects.get_by_code(self.LEXICON_CODE))
+        rows = [
+            (0, 'baba', 's. f.', 'baba', '', '', ''),
+            (1, '', '', '', '', '', ''),
+            (2, 'foo', 'foo.', 'foo', '', '', ''),
+            (3, 'foo', '', 'bar', '', 'example // other', ''),
+        ]
+
+        errors = importer.validate(rows)
+
+        self.assertEqual([(2, 'B'), (3, 'B')], [(error.row, error.column) for error in errors])
+        self.assertEqual(['baba', 'foo'], list(importer.cleaned_data))
+        self.assertEqual({"word": "foo", "column": "B", "message": "missing gramatical category"},
+                         importer.errors[1].as_dict())
+        self.assertEqual(0, Word.objects.count())
+
+    def test_importer_requires_gramcats(self):
+        GramaticalCategory.objects.all().delete()
+        with self.assertRaises(ImporterError):
+            DataImporter(Lexicon.objects.get_by_code(self.LEXICON_CODE))
+
+    def test_no_stream(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/sample-input.xlsx')
+        call_command('importdata', sample_path, self.LEXICON_CODE, stream=False)
+
+        self.assertEqual(12, Word.objects.count())
+        self.assertEqual(16, Entry.objects.count())
+
+    def test_parallel_validation_same_results(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        for name in ['invalid-gramcat-unknown.xlsx', 'verbal-conjugation.xlsx', 'sample-input.xlsx']:
+            sample_path = os.path.join(base_path, 'fixtures', name)
+            serial_out = StringIO()
+            call_command('importdata', sample_path, self.LEXICON_CODE, dry_run=True,
+                         verbosity=2, no_color=True, stdout=serial_out)
+            parallel_out = StringIO()
+            call_command('importdata', sample_path, self.LEXICON_CODE, dry_run=True,
+                         verbosity=2, no_color=True, jobs=3, stdout=parallel_out)
+
+            self.assertEqual(serial_out.getvalue(), parallel_out.getvalue(), name)
+
+    def test_parallel_import(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/sample-input.xlsx')
+        call_command('importdata', sample_path, self.LEXICON_CODE, jobs=2)
+
+        self.assertEqual(12, Word.objects.count())
+        self.assertEqual(16, Entry.objects.count())
+        self.assertEqual(2, Example.objects.count())
+
+    def test_invalid_jobs(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/sample-input.xlsx')
+        with self.assertRaises(CommandError):
+            call_command('importdata', sample_path, self.LEXICON_CODE, jobs=0)
+
+    def test_parallel_import_conjugations(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/verbal-conjugation.xlsx')
+        call_command('importdata', sample_path, self.LEXICON_CODE, jobs=2, verbosity=0)
+        parallel = list(VerbalConjugation.objects.order_by('raw').values_list('raw', 'parsed', 'model_word_ref'))
+
+        VerbalConjugation.objects.all().delete()
+        Word.objects.all().delete()
+        call_command('importdata', sample_path, self.LEXICON_CODE, verbosity=0)
+        serial = list(VerbalConjugation.objects.order_by('raw').values_list('raw', 'parsed'))
+
+        self.assertTrue(parallel)
+        self.assertEqual(serial, [(raw, parsed) for raw, parsed, _ in parallel])
+
+    @mock.patch('linguatec_lexicon.importers.can_fork', return_value=False)
+    def test_jobs_without_fork(self, can_fork):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/sample-input.xlsx')
+        out = StringIO()
+        call_command('importdata', sample_path, self.LEXICON_CODE, jobs=2, stdout=out)
+
+        self.assertIn("single process", out.getvalue())
+        self.assertEqual(12, Word.objects.count())
+
     def test_dry_run(self):
         lexicon_initial = Lexicon.objects.count()
 
@@ -78,6 +194,14 @@ class ImporterTestCase(TestCase):
         self.assertEqual(0, Entry.objects.count())
         self.assertEqual(0, Example.objects.count())
 
+    def test_dry_run_gramcats_single_query(self):
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/sample-input.xlsx')
+        # load Lexicon registry + load GramaticalCategory registry
+        Lexicon.objects.clear_cache()
+        with self.assertNumQueries(2):
+            call_command('importdata', sample_path, self.LEXICON_CODE, dry_run=True)
+
     def test_invalid_gramcat_unkown(self):
         out = StringIO()
         base_path = os.path.dirname(os.path.abspath(__file__))
@@ -145,6 +269,11 @@ class ImporterTestCase(TestCase):
         self.assertEqual(NUMBER_OF_CONJUGATIONS,
                          VerbalConjugation.objects.count())
 
+        # partial conjugations are kept as intro
+        conjugation = VerbalConjugation.objects.get(entry__word__term='acertar')
+        self.assertIsNone(conjugation.conjugation)
+        self.assertEqual(conjugation.raw, conjugation.intro)
+
     def test_import_data_to_a_previous_lexicon(self):
         another_lexicon = Lexicon.objects.create(
             name='ar-es',
@@ -184,6 +313,99 @@ class ImporterTestCase(TestCase):
         self.assertEqual(2, Lexicon.objects.count())
 
 
+class IncrementalImportTestCase(TestCase):
+    ROWS = [
+        ('a', 'prep.', 'a // ta', '', 'a casa // ta casa'),
+        ('baba', 's. f.', 'baba'),
+        ('caballería', 's. f.', 'abrío'),
+        ('dadivoso/a', 'adj.', 'dadoso/a'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lexicon = Lexicon.objects.create(name='es-ar', src_language='es', dst_language='ar')
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        call_command('importgramcat', os.path.join(base_path, 'fixtures/gramcat-es-ar.csv'), verbosity=0)
+
+    def import_rows(self, rows, **options):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            path = os.path.join(tmpdirname, 'input.xlsx')
+            workbook = openpyxl.Workbook()
+            for row in rows:
+                workbook.active.append(row)
+            workbook.save(path)
+            call_command('importdata', path, self.lexicon.code, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_unchanged(self):
+        self.import_rows(self.ROWS)
+        pks = list(Entry.objects.order_by('pk').values_list('pk', flat=True))
+
+        out = self.import_rows(self.ROWS, incremental=True)
+
+        self.assertIn('0 words added, 0 updated, 0 deleted, 0 emptied, 4 unchanged', out)
+        self.assertIn('Inserted 0 rows and deleted 0 rows', out)
+        self.assertEqual(pks, list(Entry.objects.order_by('pk').values_list('pk', flat=True)))
+
+    def test_import_changes(self):
+        self.import_rows(self.ROWS)
+        word_a = Word.objects.get(term='a')
+        word_baba = Word.objects.get(term='baba')
+        entry_dadivoso = Entry.objects.get(word__term='dadivoso/a')
+
+        rows = [
+            self.ROWS[0],
+            ('baba', 's. f.', 'baba // babeta'),
+            self.ROWS[3],
+            ('ebrio', 'adj.', 'capino/a'),
+        ]
+        out = self.import_rows(rows, incremental=True)
+
+        self.assertIn('1 words added, 1 updated, 1 deleted, 0 emptied, 2 unchanged', out)
+        self.assertEqual(['a', 'baba', 'dadivoso/a', 'ebrio'],
+                         list(Word.objects.order_by('term').values_list('term', flat=True)))
+        # unchanged words are not rewritten
+        self.assertEqual(2, word_a.entries.count())
+        self.assertEqual(2, Example.objects.filter(entry__word=word_a).count())
+        self.assertTrue(Entry.objects.filter(pk=entry_dadivoso.pk).exists())
+        # updated words keep their pk
+        self.assertEqual(['baba', 'babeta'],
+                         list(word_baba.entries.order_by('pk').values_list('translation', flat=True)))
+        self.assertTrue(all(entry.gramcats.exists() for entry in word_baba.entries.all()))
+
+    def test_import_keep_variation_entries(self):
+        self.import_rows(self.ROWS)
+        region = Region.objects.create(name="Ribagorza")
+        variation = DiatopicVariation.objects.create(name="benasqués", abbreviation="Benas.", region=region)
+        word = Word.objects.get(term='caballería')
+        Entry.objects.create(word=word, translation='caballeria', variation=variation)
+
+        out = self.import_rows(self.ROWS[:2], incremental=True)
+
+        self.assertIn('0 words added, 0 updated, 1 deleted, 1 emptied, 2 unchanged', out)
+        self.assertFalse(Word.objects.filter(term='dadivoso/a').exists())
+        # word is kept because it has entries of a diatopic variation
+        self.assertEqual(['caballeria'], [entry.translation for entry in word.entries.all()])
+
+
+    def test_import_dry_run(self):
+        self.import_rows(self.ROWS)
+        pks = list(Entry.objects.order_by('pk').values_list('pk', flat=True))
+        rows = [
+            self.ROWS[0],
+            ('baba', 's. f.', 'baba // babeta'),
+            ('ebrio', 'adj.', 'capino/a'),
+        ]
+
+        out = self.import_rows(rows, incremental=True, dry_run=True)
+
+        self.assertIn('Incremental import (dry run): 1 words added, 1 updated, 2 deleted, 0 emptied, 1 unchanged',
+                      out)
+        self.assertNotIn('Inserted', out)
+        self.assertEqual(pks, list(Entry.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertFalse(Word.objects.filter(term='ebrio').exists())
+
 class ImportGramCatTestCase(TestCase):
     NUMBER_OF_GRAMCATS = 72
 
@@ -270,6 +492,49 @@ class ImportVariationTestCase(TestCase):
             'word__id').order_by('word__id').distinct('word__id')
         self.assertEqual(FIXTURE_NUMBER_OF_ENTRIES, qs.count())
 
+    def test_parallel_validation_same_results(self):
+        for name in ['variation-word-not-found.xlsx', 'variation-unkown-gramcat.xlsx',
+                     'variation-missing-gramcat.xlsx', 'variation-sample-benasques.xlsx']:
+            sample_path = self.get_fixture_path(name)
+            serial_out = StringIO()
+            call_command('importvariation', sample_path, 'es-ar', dry_run=True,
+                         verbosity=3, no_color=True, stdout=serial_out)
+            parallel_out = StringIO()
+            call_command('importvariation', sample_path, 'es-ar', dry_run=True,
+                         verbosity=3, no_color=True, jobs=3, stdout=parallel_out)
+
+            self.assertEqual(serial_out.getvalue(), parallel_out.getvalue(), name)
+
+    def test_parallel_import(self):
+        sample_path = self.get_fixture_path('variation-sample-benasques.xlsx')
+        call_command('importvariation', sample_path, 'es-ar', variation='benasqués', jobs=2, verbosity=0)
+
+        entries = Entry.objects.filter(variation__name='benasqués')
+        self.assertTrue(entries.exists())
+        self.assertFalse(entries.filter(gramcats__isnull=True).exists())
+
+    def test_retrieve_word_ignore_case_and_accents(self):
+        importer = VariationImporter(Lexicon.objects.get_by_code('es-ar'))
+
+        self.assertEqual("aberración", importer.retrieve_word(1, "Aberracion").term)
+        self.assertEqual("abogado/a", importer.retrieve_word(2, "abogado").term)
+        self.assertIsNone(importer.retrieve_word(3, "aberraciones"))
+        self.assertEqual(1, len(importer.errors))
+
+    def test_validate_rows(self):
+        importer = VariationImporter(Lexicon.objects.get_by_code('es-ar'))
+        rows = [
+            (0, 'A', 1, 'aberración', 's. f.', 'aberrazión'),
+            (1, 'A', 2, 'aberraciones', 's. f.', 'aberrazions'),
+            (2, 'A', 3, 'abogado', 'foo.', 'abogau/ada'),
+        ]
+
+        errors = list(importer.validate(rows))
+
+        self.assertEqual([(1, 'A'), (2, 'A!B')], [(error.row, error.column) for error in errors])
+        self.assertEqual('not_found', errors[0].code)
+        self.assertEqual(['aberración'], [word.term for word in importer.cleaned_data])
+
     def test_import_variation_optional_on_dry_run(self):
         sample_path = self.get_fixture_path('variation-sample-benasques.xlsx')
         call_command('importvariation', sample_path, 'es-ar', dry_run=True, verbosity=4)
@@ -306,6 +571,45 @@ class ImportVariationTestCase(TestCase):
             list(variation_entry.gramcats.values_list('abbreviation', flat=True))
         )
 
+    def test_default_gramcats_same_as_word_gramcats(self):
+        # entries of variations provide default gramcats too
+        word = Word.objects.get(term='abarrancar')
+        entry = Entry.objects.create(word=word, variation=DiatopicVariation.objects.get(name='benasqués'),
+                                     translation='abarrancar')
+        entry.gramcats.add(GramaticalCategory.objects.get(abbreviation='s. m.'))
+
+        importer = VariationImporter(Lexicon.objects.get_by_code('es-ar'))
+        self.assertIn('s. m.', importer.get_default_gramcats(word))
+        self.assertEqual(word.gramcats(), importer.get_default_gramcats(word))
+
+    def test_import_word_not_found_suggestions(self):
+        out = StringIO()
+        sample_path = self.get_fixture_path('variation-word-not-found.xlsx')
+        call_command('importvariation', sample_path, 'es-ar',
+                     dry_run=True, verbosity=3, stdout=out)
+
+        self.assertIn('Word \\"causa\\" not found in the database. Did you mean: a causa de?', out.getvalue())
+
+    def test_suggest_words(self):
+        importer = VariationImporter(Lexicon.objects.get_by_code('es-ar'))
+        errors = list(importer.validate([(0, 'A', 1, '¿Causa?', 's. f.', 'causa')]))
+
+        self.assertEqual('a causa de', errors[0].suggestions)
+
+    def test_trigrams_split_words_like_pg_trgm(self):
+        # pg_trgm words are sequences of alphanumeric characters
+        self.assertEqual(trigrams('foo bar'), trigrams('foo_bar'))
+        self.assertIn('  ñ', trigrams('Ñu'))
+
+    def test_import_dry_run_number_of_queries(self):
+        sample_path = self.get_fixture_path('variation-word-not-found.xlsx')
+        # load Lexicon registry + load GramaticalCategory registry + load words
+        # of the lexicon + load default gramcats (only once for all the rows)
+        Lexicon.objects.clear_cache()
+        with self.assertNumQueries(4):
+            call_command('importvariation', sample_path, 'es-ar',
+                         dry_run=True, verbosity=3, stdout=StringIO())
+
     def test_import_invalid_missing_translation(self):
         out = StringIO()
         sample_path = self.get_fixture_path('variation-missing-translation.xlsx')
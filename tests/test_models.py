@@ -1,12 +1,64 @@
+import contextlib
 import os
 import unittest
+from io import StringIO
+from unittest import mock
 
+from django.apps import apps
+from django.core.exceptions import ValidationError
 from django.core.management import call_command
 from django.db import connection, IntegrityError
+from django.db.models import CharField
 from django.test import TestCase
 
 from linguatec_lexicon.models import (
-    Entry, GramaticalCategory, Lexicon, VerbalConjugation, Word, Region, DiatopicVariation)
+    Entry, GramaticalCategory, Lexicon, NearQuerySet, TrigramNear, VerbalConjugation, Word, WordManager, Region,
+    DiatopicVariation, create_fulltext_triggers)
+
+
+class LexiconRegistryTestCase(TestCase):
+    def setUp(self):
+        Lexicon.objects.create(name="es-ar", src_language="es", dst_language="ar")
+
+    def test_get_by_code_single_query(self):
+        Lexicon.objects.clear_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual("es-ar", Lexicon.objects.get_by_code("es-ar").code)
+            self.assertEqual("es-ar", Lexicon.objects.get_by_code("es-ar").code)
+
+    def test_get_by_code_not_found(self):
+        with self.assertRaises(Lexicon.DoesNotExist):
+            Lexicon.objects.get_by_code("ar-es")
+
+    def test_get_by_code_not_found_reloads_once(self):
+        Lexicon.objects.clear_cache()
+        with self.assertNumQueries(2):
+            # load + reload of the registry
+            with self.assertRaises(Lexicon.DoesNotExist):
+                Lexicon.objects.get_by_code("xx-yy")
+        with self.assertNumQueries(0):
+            with self.assertRaises(Lexicon.DoesNotExist):
+                Lexicon.objects.get_by_code("zz-yy")
+
+        with self.settings(LINGUATEC_LEXICON_REGISTRY_RELOAD_INTERVAL=0):
+            with self.assertNumQueries(1):
+                with self.assertRaises(Lexicon.DoesNotExist):
+                    Lexicon.objects.get_by_code("xx-yy")
+
+    def test_cache_invalidated_on_save_and_delete(self):
+        Lexicon.objects.get_registry()
+        lexicon = Lexicon.objects.create(name="ar-es", src_language="ar", dst_language="es")
+        self.assertEqual(lexicon.pk, Lexicon.objects.get_by_code("ar-es").pk)
+
+        lexicon.delete()
+        with self.assertRaises(Lexicon.DoesNotExist):
+            Lexicon.objects.get_by_code("ar-es")
+
+    def test_created_by_another_process(self):
+        Lexicon.objects.get_registry()
+        # bulk_create doesn't send post_save signal
+        Lexicon.objects.bulk_create([Lexicon(name="ar-es", src_language="ar", dst_language="es")])
+        self.assertEqual("ar-es", Lexicon.objects.get_by_code("ar-es").code)
 
 
 class GramCatTestCase(TestCase):
@@ -20,6 +72,32 @@ class GramCatTestCase(TestCase):
         self.assertEqual(abbr, gramcat.abbreviation)
 
 
+class GramCatRegistryTestCase(TestCase):
+    def setUp(self):
+        GramaticalCategory.objects.create(abbreviation="adj.", title="adjetivo")
+        GramaticalCategory.objects.create(abbreviation="s.", title="sustantivo")
+
+    def test_get_by_abbreviation_single_query(self):
+        GramaticalCategory.objects.clear_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual("adj.", GramaticalCategory.objects.get_by_abbreviation("adj.").abbreviation)
+            self.assertEqual("s.", GramaticalCategory.objects.get_by_abbreviation("s.").abbreviation)
+            with self.assertRaises(GramaticalCategory.DoesNotExist):
+                GramaticalCategory.objects.get_by_abbreviation("foo.")
+
+    def test_cache_invalidated_on_save(self):
+        GramaticalCategory.objects.get_registry()
+        GramaticalCategory.objects.create(abbreviation="v.", title="verbo")
+        self.assertEqual("v.", GramaticalCategory.objects.get_by_abbreviation("v.").abbreviation)
+
+    def test_cache_invalidated_on_importgramcat(self):
+        GramaticalCategory.objects.get_registry()
+        base_path = os.path.dirname(os.path.abspath(__file__))
+        sample_path = os.path.join(base_path, 'fixtures/gramcat-es-ar.csv')
+        call_command('importgramcat', sample_path, purge=True, verbosity=0)
+        self.assertEqual("v. tr.", GramaticalCategory.objects.get_by_abbreviation("v. tr.").abbreviation)
+
+
 class MultipleGramCatsTestCase(TestCase):
     """
     Tests of issue #42 - add support to multiple gramatical categories
@@ -132,6 +210,67 @@ class VerbalConjugationModelTestCase(TestCase):
         self.assertIn("model", parsed_conjugation)
         self.assertIn("trobar", parsed_conjugation["model"])
 
+    def test_model_word_ref_dangling_and_update(self):
+        word = Word.objects.get(term="zambullir", lexicon=self.lexicon)
+        conjugation = word.entries.get(translation__contains="capuzar").conjugation
+        # "hallar" isn't included on the imported file
+        self.assertIsNone(conjugation.model_word_id)
+
+        out = StringIO()
+        call_command('updateconjugations', stdout=out)
+        self.assertIn('1 dangling references', out.getvalue())
+        self.assertIn('hallar', out.getvalue())
+
+        hallar = Word.objects.create(term="hallar", lexicon=self.lexicon)
+        call_command('updateconjugations', stdout=StringIO())
+        conjugation.refresh_from_db()
+        self.assertEqual(hallar.pk, conjugation.model_word_id)
+
+    def test_parsed_stored_on_import(self):
+        word = Word.objects.get(term="abarcar", lexicon=self.lexicon)
+        entry = word.entries.get(translation__contains="adubir")
+        conjugation = VerbalConjugation.objects.get(entry=entry)
+        self.assertIsNotNone(conjugation.parsed)
+        self.assertEqual(conjugation.parse(), conjugation.parsed)
+
+    def test_parsed_updated_on_save(self):
+        word = Word.objects.get(term="zambullir", lexicon=self.lexicon)
+        conjugation = word.entries.get(translation__contains="capuzar").conjugation
+        conjugation.raw = 'atrebuyir modelo. conjug. muyir (ordeñar)'
+        conjugation.save()
+
+        conjugation = VerbalConjugation.objects.get(pk=conjugation.pk)
+        self.assertEqual("muyir", conjugation.model)
+        self.assertEqual("ordeñar", conjugation.model_word)
+
+    def test_model_word_ref_updated_on_save(self):
+        ordenar = Word.objects.create(term="ordeñar", lexicon=self.lexicon)
+        word = Word.objects.get(term="zambullir", lexicon=self.lexicon)
+        conjugation = word.entries.get(translation__contains="capuzar").conjugation
+        conjugation.raw = 'atrebuyir modelo. conjug. muyir (ordeñar)'
+        conjugation.save()
+        self.assertEqual(ordenar.pk, VerbalConjugation.objects.get(pk=conjugation.pk).model_word_id)
+
+        conjugation.raw = 'Lorem ipsum.'
+        conjugation.save()
+        self.assertIsNone(VerbalConjugation.objects.get(pk=conjugation.pk).model_word_id)
+
+    def test_save_unformated_verbal_model(self):
+        word = Word.objects.get(term="zambullir", lexicon=self.lexicon)
+        conjugation = word.entries.get(translation__contains="capuzar").conjugation
+        conjugation.raw = 'atrebuyir modelo. conjug. muyir'
+        conjugation.save()
+
+        conjugation = VerbalConjugation.objects.get(pk=conjugation.pk)
+        self.assertEqual('atrebuyir modelo. conjug. muyir', conjugation.raw)
+        self.assertEqual({"intro": conjugation.raw}, conjugation.parsed)
+        self.assertIsNone(conjugation.model_word_id)
+
+    def test_parsed_backfill(self):
+        VerbalConjugation.objects.update(parsed=None)
+        call_command('updateconjugations', '--batch-size', '1', stdout=StringIO())
+        self.assertFalse(VerbalConjugation.objects.filter(parsed__isnull=True).exists())
+
     def test_extract_verbal_model_2(self):
         v = VerbalConjugation(raw='atrebuyir modelo. conjug. muyir (ordeñar)')
         parsed_conjugation = v.parse_raw
@@ -144,6 +283,21 @@ class VerbalConjugationModelTestCase(TestCase):
         self.assertIn("intro", parsed_conjugation)
         self.assertEqual(v.raw, parsed_conjugation["intro"])
 
+    def test_unformated_verbal_model(self):
+        v = VerbalConjugation(raw='atrebuyir modelo. conjug. muyir')
+        with self.assertRaises(ValidationError):
+            v.parse()
+        with self.assertRaises(ValidationError):
+            v.full_clean(exclude=['entry'])
+        # kept as intro by partial imports
+        self.assertEqual({"intro": v.raw}, v.parse_partial())
+
+    def test_strict_parse(self):
+        with self.assertRaises(ValidationError):
+            VerbalConjugation(raw='Lorem ipsum.').parse(strict=True)
+        with self.assertRaises(ValidationError):
+            VerbalConjugation(raw='enzertar conjug. IND. pres. enzierto').parse(strict=True)
+
     def test_partial_verbal_conjugation(self):
         """Related to issue #66"""
         value = """
@@ -173,7 +327,6 @@ class WordManagerTestCase(TestCase):
         result = Word.objects.search(None, "es-ar")
         self.assertEqual(0, result.count())
 
-    @unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL backend")
     def test_search_sorted(self):
         Word.objects.bulk_create([
             Word(lexicon_id=1, term="hacer acopio"),
@@ -183,6 +336,126 @@ class WordManagerTestCase(TestCase):
         result = Word.objects.search("hacer", "es-ar")
         self.assertEqual(result[0].term, "hacer")
 
+    def test_search_whole_words(self):
+        Word.objects.bulk_create([
+            Word(lexicon_id=1, term="hacer acopio"),
+            Word(lexicon_id=1, term="deshacer"),
+            Word(lexicon_id=1, term="no hacer caso"),
+            Word(lexicon_id=1, term="hacerse"),
+        ])
+        result = Word.objects.search("hacer", "es-ar")
+        self.assertEqual(["hacer acopio", "no hacer caso"], sorted(word.term for word in result))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL backend")
+    def test_term_normalized_pattern_ops_index(self):
+        # LIKE 'query%' of search() is resolved by the index Django
+        # creates for db_index CharFields (varchar_pattern_ops)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Word._meta.db_table)
+        self.assertTrue(any(
+            name.endswith('_like') and constraint['columns'] == ['term_normalized']
+            for name, constraint in constraints.items()
+        ))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL backend")
+    def test_term_trigram_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Word._meta.db_table)
+        self.assertIn('linguatec_lexicon_word_term_normalized_trgm', constraints)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL backend")
+    def test_search_near_uses_trigram_operator(self):
+        result = Word.objects.search_near("edat", "es-ar")
+        self.assertIn(" % ", str(result.query))
+        self.assertIn("edad", [word.term for word in result])
+        self.assertTrue(result.exists())
+        self.assertEqual(len(result), result.count())
+
+    def test_near_queryset_evaluated_with_similarity_threshold(self):
+        queryset = NearQuerySet(Word).filter(term="edad")
+        with mock.patch.object(WordManager, 'near_similarity_threshold',
+                               side_effect=contextlib.nullcontext) as threshold:
+            self.assertIsInstance(queryset.order_by()[:1], NearQuerySet)
+            self.assertEqual(1, queryset.count())
+            self.assertTrue(queryset.exists())
+            self.assertEqual(["edad"], [word.term for word in queryset.iterator()])
+            self.assertEqual(["edad"], [word.term for word in queryset])
+            self.assertEqual(4, threshold.call_count)
+
+            # results already fetched
+            self.assertEqual(1, queryset.count())
+            self.assertEqual(4, threshold.call_count)
+
+    def test_trigram_similar_lookup_not_replaced(self):
+        lookups = CharField.get_lookups()
+        self.assertIs(TrigramNear, lookups['trigram_near'])
+        self.assertIsNot(TrigramNear, lookups.get('trigram_similar'))
+
+    def test_term_normalized(self):
+        self.assertEqual("edad", Word.objects.get(term="edad").term_normalized)
+
+        word = Word.objects.create(lexicon_id=1, term="Árbol")
+        self.assertEqual("arbol", word.term_normalized)
+
+        Word.objects.bulk_create([Word(lexicon_id=1, term="cabeza de pájaro")])
+        self.assertEqual("cabeza de pajaro", Word.objects.get(term="cabeza de pájaro").term_normalized)
+
+        word = Word.objects.create(lexicon_id=1, term="año")
+        self.assertEqual("año", word.term_normalized)
+
+    def test_search_ignore_accents(self):
+        Word.objects.create(lexicon_id=1, term="árbol")
+        result = Word.objects.search("ARBOL", "es-ar")
+        self.assertEqual(["árbol"], [word.term for word in result])
+
+        result = Word.objects.search("édad", "es-ar")
+        self.assertEqual(["edad"], [word.term for word in result])
+
+    def test_search_fulltext_translation(self):
+        result = Word.objects.search_fulltext("chitar", "es-ar")
+        self.assertEqual(["echar"], [word.term for word in result])
+
+    def test_search_fulltext_example(self):
+        result = Word.objects.search_fulltext("luna", "es-ar")
+        self.assertEqual(["eclipsar"], [word.term for word in result])
+
+    def test_search_fulltext_ignore_accents_and_operators(self):
+        result = Word.objects.search_fulltext("FONETICA", "es-ar")
+        self.assertEqual(["echar", "eclipsar"], sorted(word.term for word in result))
+
+        result = Word.objects.search_fulltext('"clis" OR', "es-ar")
+        self.assertEqual(0, result.count())
+
+    def test_search_fulltext_ranked(self):
+        # translation matches are ranked higher than example matches
+        entry = Entry.objects.create(word=Word.objects.get(term="ebrio"), translation="luna")
+        result = Word.objects.search_fulltext("luna", "es-ar")
+        self.assertEqual(["ebrio", "eclipsar"], [word.term for word in result])
+
+        entry.translation = "sol"
+        entry.save()
+        self.assertEqual(1, Word.objects.search_fulltext("luna", "es-ar").count())
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "requires SQLite backend")
+    def test_fulltext_triggers_recreated_after_migrate(self):
+        # e.g. an AlterField of Entry rebuilds the table dropping its triggers
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER linguatec_lexicon_entry_fts_update")
+        entry = Entry.objects.get(word__term="ebrio")
+        entry.translation = "luna"
+        entry.save()
+
+        create_fulltext_triggers(sender=None, app_config=apps.get_app_config('linguatec_lexicon'))
+
+        self.assertIn("ebrio", [word.term for word in Word.objects.search_fulltext("luna", "es-ar")])
+        entry.translation = "sol"
+        entry.save()
+        self.assertNotIn("ebrio", [word.term for word in Word.objects.search_fulltext("luna", "es-ar")])
+
+    def test_search_fulltext_empty_query(self):
+        self.assertEqual(0, Word.objects.search_fulltext(" ¿? ", "es-ar").count())
+        self.assertEqual(0, Word.objects.search_fulltext(None, "es-ar").count())
+
     def test_search_query_unbalanced_parenthesis(self):
         result = Word.objects.search("largo(a", "es-ar")
         self.assertEqual(0, result.count())
@@ -221,3 +221,42 @@ class VerbalConjugationValidatorTestCase(TestCase):
         value = self.INPUT3
         verbal_validator = VerbalConjugationValidator()
         self.assertRaises(ValidationError, verbal_validator, value)
+
+    def test_invalid_input_missing_tense(self):
+        value = self.INPUT.replace("pret. indef.", "")
+        verbal_validator = VerbalConjugationValidator()
+        self.assertRaises(ValidationError, verbal_validator, value)
+
+    def test_invalid_input_missing_tenses_of_partial_conjugation(self):
+        # value of fixtures/variation-sample-common.xlsx: the previous
+        # implementation read garbage for the missing tenses (e.g. 'ierto'
+        # as 'pret. imp.') instead of rejecting it
+        value = (
+            "enzertar (irreg.) IND. pres. enzierto, enziertas, enzierta, enzertamos, enzertaz, enziertan; "
+            "SUBJ. pres. enzierte, enziertes, enzierte, enzertemos, enzertez, enzierten; "
+            "IMP. enzierta, enzertaz; INF. enzertar; GER. enzertando; PART. enzertato/a. "
+            "resto de tiempos verbales regulares modelo. conjug. trobar (encontrar)"
+        )
+        verbal_validator = VerbalConjugationValidator()
+        with self.assertRaisesMessage(ValidationError, 'IND. - pret. imp.'):
+            verbal_validator(value)
+
+        # it is imported as a reference to a model verb (not validated as conjugation)
+        cleaned_data = validate_column_verb_conjugation(value)
+        self.assertEqual(('trobar', 'encontrar'), (cleaned_data['model'], cleaned_data['model_word']))
+
+    def test_mood_prefix_is_not_stripped_from_conjugation(self):
+        # mood was removed using str.lstrip which removes characters (not a prefix)
+        value = self.INPUT.replace("GER. adubindo", "GER.Gerundio")
+        verbal_validator = VerbalConjugationValidator()
+        clean_data = verbal_validator(value)
+        self.assertEqual(["Gerundio"], clean_data[verbal_validator.GERUND][''])
+
+    def test_tokenize(self):
+        verbal_validator = VerbalConjugationValidator()
+        slots = verbal_validator.tokenize(self.INPUT)
+        self.assertEqual(
+            len(verbal_validator.MOODS) + sum(len(tenses) for tenses in verbal_validator.MOOD_TENSES.values()
+                                              if tenses != ['']),
+            len(slots))
+        self.assertEqual("adubir;", slots[(verbal_validator.INFINITIVE, '')].strip())